@@ -1,8 +1,9 @@
 """
 AI Knowledge Base Service
-- Extracts text from PDF / DOCX files
-- Chunks text into manageable pieces
+- Extracts text from PDF / DOCX files page by page
+- Chunks the text stream into manageable pieces
 - Generates embeddings via OpenAI text-embedding-3-small
+  (the upload pipeline using these runs in ingestion.py's worker processes)
 - Answers questions using RAG with strict guardrails
 """
 
@@ -10,19 +11,28 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-import uuid
-import io
 import logging
-import httpx
-from typing import List, Optional
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Iterator, List, Optional
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from PyPDF2 import PdfReader
 from docx import Document as DocxDocument
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
-from models import KnowledgeEntry, KnowledgeDocument, DocumentChunk
+from provider_clients import ProviderClientManager
+from knowledge_snapshot import KnowledgeSnapshot, get_knowledge_snapshot
+from embedding_cache import embedding_cache, cache_key
+from semantic_cache import semantic_cache, SEMANTIC_CACHE_ENABLED
+from vector_index import search_sql, use_ann, apply_search_settings
+from vector_engine import vector_engine
+from intent_classifier import intent_classifier
+from context_builder import build_context, count_message_tokens, prompt_stats
+from lexical_search import (
+    RETRIEVAL_MODE, LEXICAL_SHORTCUT, LEXICAL_CANDIDATES,
+    lexical_terms, lexical_search, is_literal_lookup, is_confident, is_relevant, rrf_fuse,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -44,56 +54,60 @@ TOP_K = 5              # number of chunks to retrieve
 EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
 
 
-def _get_client() -> OpenAI:
-    # Use a custom httpx client with trust_env=False to avoid "proxies" error in some environments
-    http_client = httpx.Client(trust_env=False, timeout=60.0)
+# Shared, pooled clients — one per provider for the whole process.
+# Ollama often doesn't need an API key, so we use a dummy one.
+provider_clients = ProviderClientManager({
+    "openai": {"api_key": OPENAI_API_KEY},
+    "ollama": {"base_url": OLLAMA_BASE_URL, "api_key": "ollama"},
+})
+
 
+def _check_provider_config():
     if AI_PROVIDER == "openai":
         if not OPENAI_API_KEY or OPENAI_API_KEY == "your-openai-api-key-here":
             raise ValueError("OPENAI_API_KEY is not set. Please update your .env file.")
-        return OpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
-    else:
-        # Ollama / Local provider
-        # Ollama often doesn't need an API key, so we use a dummy one
-        return OpenAI(
-            base_url=OLLAMA_BASE_URL,
-            api_key="ollama", # dummy key
-            http_client=http_client
-        )
+
+
+def _get_client() -> OpenAI:
+    _check_provider_config()
+    return provider_clients.get("openai" if AI_PROVIDER == "openai" else "ollama")
+
+
+def _get_async_client() -> AsyncOpenAI:
+    """Async counterpart of _get_client() for the widget chat path."""
+    _check_provider_config()
+    return provider_clients.get_async("openai" if AI_PROVIDER == "openai" else "ollama")
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  TEXT EXTRACTION
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
-    """Extract all text from a PDF file."""
-    reader = PdfReader(io.BytesIO(file_bytes))
-    text_parts = []
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text_parts.append(page_text)
-    return "\n\n".join(text_parts)
-
-
-def extract_text_from_docx(file_bytes: bytes) -> str:
-    """Extract all text from a Word (.docx) file."""
-    doc = DocxDocument(io.BytesIO(file_bytes))
-    text_parts = []
+def iter_pdf_text(path: str) -> Iterator[str]:
+    """Yield the text of a PDF file page by page, reading it from disk as needed."""
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                yield page_text
+
+
+def iter_docx_text(path: str) -> Iterator[str]:
+    """Yield the non-empty paragraphs of a Word (.docx) file."""
+    doc = DocxDocument(path)
     for para in doc.paragraphs:
         if para.text.strip():
-            text_parts.append(para.text)
-    return "\n\n".join(text_parts)
+            yield para.text
 
 
-def extract_text(file_bytes: bytes, filename: str) -> str:
+def iter_text(path: str, filename: str) -> Iterator[str]:
     """Route to the correct extractor based on file extension."""
     ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
     if ext == "pdf":
-        return extract_text_from_pdf(file_bytes)
+        return iter_pdf_text(path)
     elif ext in ("docx", "doc"):
-        return extract_text_from_docx(file_bytes)
+        return iter_docx_text(path)
     else:
         raise ValueError(f"Unsupported file type: .{ext}")
 
@@ -102,22 +116,21 @@ def extract_text(file_bytes: bytes, filename: str) -> str:
 #  CHUNKING
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-def chunk_text(full_text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
-    """Split text into overlapping chunks by word count."""
-    words = full_text.split()
-    if not words:
-        return []
-
-    chunks = []
-    start = 0
-    while start < len(words):
-        end = start + chunk_size
-        chunk = " ".join(words[start:end])
-        if chunk.strip():
-            chunks.append(chunk.strip())
-        start = end - overlap
-
-    return chunks
+def iter_chunks(pieces: Iterable[str], chunk_size: int = CHUNK_SIZE,
+                overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Split a stream of text pieces (pages, lines) into overlapping chunks by
+    word count, holding at most one chunk plus one piece of words at a time.
+    """
+    window: List[str] = []
+    for piece in pieces:
+        window.extend(piece.split())
+        while len(window) >= chunk_size:
+            yield " ".join(window[:chunk_size])
+            window = window[chunk_size - overlap:]
+    while window:
+        yield " ".join(window[:chunk_size])
+        window = window[chunk_size - overlap:]
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -141,128 +154,70 @@ def generate_embeddings(texts: List[str]) -> List[List[float]]:
     return all_embeddings
 
 
-def generate_single_embedding(text_input: str) -> List[float]:
-    """Generate embedding for a single text."""
-    client = _get_client()
-    response = client.embeddings.create(
+async def generate_single_embedding(text_input: str) -> List[float]:
+    """Generate embedding for a single text, served from the cache when possible."""
+    key = cache_key(text_input, EMBEDDING_MODEL)
+    cached = await embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
+    client = _get_async_client()
+    response = await client.embeddings.create(
         model=EMBEDDING_MODEL,
         input=text_input
     )
-    return response.data[0].embedding
-
-
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-#  DOCUMENT PROCESSING PIPELINE
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-def process_document(
-    db: Session,
-    chatbot_id: str,
-    document_id: str,
-    file_bytes: bytes,
-    filename: str
-):
-    """
-    Full pipeline: extract text → chunk → embed → store in DB.
-    Updates the document status throughout the process.
-    """
-    doc = db.query(KnowledgeDocument).filter(KnowledgeDocument.id == document_id).first()
-    if not doc:
-        return
-
-    try:
-        # Step 1: Extract text
-        print(f"Extracting text from {filename}...")
-        full_text = extract_text(file_bytes, filename)
-        if not full_text.strip():
-            print("Error: Extracted text is empty.")
-            doc.status = "error"
-            db.commit()
-            return
-
-        # Step 2: Chunk the text
-        print(f"Chunking text... ({len(full_text)} characters)")
-        chunks = chunk_text(full_text)
-        if not chunks:
-            print("Error: No chunks created.")
-            doc.status = "error"
-            db.commit()
-            return
-
-        # Step 3: Generate embeddings
-        print(f"Generating embeddings for {len(chunks)} chunks using {EMBEDDING_MODEL}...")
-        embeddings = generate_embeddings(chunks)
-        print(f"Generated {len(embeddings)} embeddings successfully.")
-
-        # Step 4: Store chunks with embeddings
-        for idx, (chunk_text_content, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk = DocumentChunk(
-                id=str(uuid.uuid4()),
-                document_id=document_id,
-                chatbot_id=chatbot_id,
-                content=chunk_text_content,
-                chunk_index=idx,
-                embedding=embedding
-            )
-            db.add(chunk)
-
-        doc.chunk_count = len(chunks)
-        doc.status = "ready"
-        db.commit()
-        logger.info(f"Document {filename} processed: {len(chunks)} chunks created")
-
-    except Exception as e:
-        import traceback
-        db.rollback()
-        error_msg = str(e)
-        logger.error(f"Error processing document {filename}: {error_msg}")
-        traceback.print_exc()
-        print(f"Error processing document: {error_msg}")
-        try:
-            # Re-fetch the document within a fresh transaction if possible
-            doc = db.query(KnowledgeDocument).filter(KnowledgeDocument.id == document_id).first()
-            if doc:
-                doc.status = "error"
-                doc.error_message = error_msg
-                db.commit()
-        except:
-            db.rollback()
+    embedding = response.data[0].embedding
+    await embedding_cache.put(key, EMBEDDING_MODEL, embedding)
+    return embedding
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  SEMANTIC SEARCH (VECTOR SIMILARITY)
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-def search_similar_chunks(
-    db: Session,
+async def search_similar_chunks(
+    db: AsyncSession,
     chatbot_id: str,
     query: str,
-    top_k: int = TOP_K
+    top_k: int = TOP_K,
+    query_embedding: Optional[List[float]] = None,
+    snapshot: Optional[KnowledgeSnapshot] = None
 ) -> List[dict]:
     """
     Search for the most similar document chunks using cosine similarity.
     Returns the top_k most relevant chunks.
+    Pass query_embedding when the caller has already embedded the query.
+    With the bot's knowledge snapshot, small corpora are searched in
+    process (vector_engine.py) or exactly; otherwise the ANN index is used.
     """
-    query_embedding = generate_single_embedding(query)
+    if query_embedding is None:
+        query_embedding = await generate_single_embedding(query)
+
+    exact = False
+    if snapshot is not None:
+        if vector_engine.handles(snapshot.chunk_count):
+            return await vector_engine.search(
+                db, chatbot_id, snapshot.document_chunks, query_embedding, top_k
+            )
+        exact = not use_ann(snapshot.chunk_count)
+    if not exact:
+        await apply_search_settings(db, top_k)
 
     # Use pgvector's cosine distance operator <=>
-    # NOTE: Use CAST(...AS vector) instead of ::vector to avoid psycopg2
-    # misinterpreting :: after the named parameter colon.
-    results = db.execute(
-        text(f"""
-            SELECT id, content, chunk_index, document_id,
-                   1 - (embedding <=> CAST(:query_embedding AS vector({EMBEDDING_DIM}))) AS similarity
-            FROM document_chunks
-            WHERE chatbot_id = :chatbot_id
-            ORDER BY embedding <=> CAST(:query_embedding AS vector({EMBEDDING_DIM}))
-            LIMIT :top_k
-        """),
-        {
-            "query_embedding": str(query_embedding),
-            "chatbot_id": chatbot_id,
-            "top_k": top_k
-        }
-    ).fetchall()
+    # The asyncpg connection has the pgvector codec registered (see
+    # database.py), so the embedding is bound as a binary vector.
+    params = {
+        "query_embedding": query_embedding,
+        "chatbot_id": chatbot_id,
+        "top_k": top_k
+    }
+    results = (await db.execute(text(search_sql(exact)), params)).fetchall()
+    if not exact and len(results) < top_k and (snapshot is None or snapshot.chunk_count > len(results)):
+        # The index scan runs before the chatbot_id filter, so a bot with a small
+        # share of all chunks can come back short: answer it exactly instead
+        results = (await db.execute(text(search_sql(True)), params)).fetchall()
+    # relaxed_order iterative scans may return rows slightly out of order
+    results = sorted(results, key=lambda row: row[4] if row[4] is not None else float("inf"))
 
     return [
         {
@@ -270,7 +225,7 @@ def search_similar_chunks(
             "content": row[1],
             "chunk_index": row[2],
             "document_id": row[3],
-            "similarity": float(row[4]) if row[4] else 0.0,
+            "similarity": 1.0 - float(row[4]) if row[4] is not None else 0.0,
         }
         for row in results
     ]
@@ -300,107 +255,241 @@ CUSTOM Q&A RESPONSES (these take priority if matched exactly):
 """
 
 
-def generate_ai_response(
-    db: Session,
+@dataclass
+class PreparedRequest:
+    """Outcome of the retrieval half of the RAG pipeline."""
+    reply: Optional[str] = None               # answered without the LLM (Q&A or cache hit)
+    messages: Optional[List[dict]] = None     # chat messages for the completion call
+    query_embedding: Optional[List[float]] = None
+    knowledge_version: int = 0                # knowledge snapshot version used
+    prompt_tokens: int = 0                    # tokens sent to the chat model
+
+
+async def prepare_ai_request(
+    db: AsyncSession,
     chatbot_id: str,
     user_message: str,
-    bot_name: str
-) -> Optional[str]:
+    bot_name: str,
+    welcome_message: Optional[str] = None
+) -> PreparedRequest:
     """
-    Generate an AI response using RAG:
-    1. First check custom Q&A entries (exact/contains match)
-    2. If no match, search vector DB for relevant chunks
-    3. Use OpenAI to generate a response strictly based on context
+    Run everything that happens before the LLM call:
+    1. Check custom Q&A entries (exact/contains match), then small talk
+    2. Full-text search; a confident literal hit skips the embedding
+    3. Check the semantic answer cache for a near-duplicate question
+    4. If no match, search vector DB and fuse with the lexical hits
+    5. Build the chat messages for the completion request
+
+    The result carries a direct reply, the messages to send to the LLM,
+    or neither when the bot has no knowledge to answer from.
     """
 
+    # Entries, chunk counts and prompt fragments come from the cached snapshot
+    snapshot = await get_knowledge_snapshot(db, chatbot_id)
+
     # ── Step 1: Check custom Q&A entries (highest priority) ──
-    lower_msg = user_message.lower().strip()
-
-    # Check exact matches
-    exact_entries = db.query(KnowledgeEntry).filter(
-        KnowledgeEntry.chatbot_id == chatbot_id,
-        KnowledgeEntry.is_exact_match == True,
-    ).all()
-    for entry in exact_entries:
-        if entry.trigger.lower().strip() == lower_msg:
-            return entry.response
-
-    # Check contains matches
-    contains_entries = db.query(KnowledgeEntry).filter(
-        KnowledgeEntry.chatbot_id == chatbot_id,
-        KnowledgeEntry.is_exact_match == False,
-    ).all()
-    for entry in contains_entries:
-        if entry.trigger.lower().strip() in lower_msg:
-            return entry.response
-
-    # ── Step 2: Check if we have any vector knowledge ──
-    chunk_count = db.execute(
-        text("SELECT COUNT(*) FROM document_chunks WHERE chatbot_id = :cid"),
-        {"cid": chatbot_id}
-    ).scalar()
-
-    # Also gather custom Q&A for context
-    all_entries = db.query(KnowledgeEntry).filter(
-        KnowledgeEntry.chatbot_id == chatbot_id
-    ).all()
-
-    custom_responses_text = ""
-    if all_entries:
-        custom_responses_text = "\n".join([
-            f"Q: {e.trigger}\nA: {e.response}"
-            for e in all_entries
-        ])
-
-    if chunk_count == 0 and not all_entries:
+    # Exact triggers are a hash lookup, contains triggers one Aho–Corasick pass
+    canned = snapshot.matcher.match(user_message)
+    if canned is not None:
+        return PreparedRequest(reply=canned)
+
+    # ── Step 1b: Greetings, thanks and goodbyes get a templated reply ──
+    small_talk = intent_classifier.reply(user_message, bot_name, welcome_message)
+    if small_talk is not None:
+        return PreparedRequest(reply=small_talk)
+
+    # ── Step 2: Check if we have any knowledge ──
+    if not snapshot.has_knowledge:
         # No knowledge at all — fallback
-        return None
+        return PreparedRequest()
+    chunk_count = snapshot.chunk_count
+
+    prepared = PreparedRequest(knowledge_version=snapshot.version)
+
+    # ── Step 3: Lexical search (keyword-heavy questions) ──
+    lexical_hits: List[dict] = []
+    similar_chunks: Optional[List[dict]] = None
+    if chunk_count > 0 and RETRIEVAL_MODE == "hybrid":
+        terms = lexical_terms(user_message)
+        try:
+            lexical_hits = await lexical_search(db, chatbot_id, terms, LEXICAL_CANDIDATES)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Lexical search failed: {e}")
+        if LEXICAL_SHORTCUT and is_literal_lookup(user_message, terms) and is_confident(lexical_hits):
+            # Confident literal hit: no embedding call, no vector scan
+            similar_chunks = lexical_hits[:TOP_K]
+
+    # ── Step 4: Semantic answer cache ──
+    if SEMANTIC_CACHE_ENABLED and similar_chunks is None:
+        try:
+            prepared.query_embedding = await generate_single_embedding(user_message)
+            cached_reply = semantic_cache.lookup(chatbot_id, prepared.query_embedding, snapshot.version)
+            if cached_reply is not None:
+                prepared.reply = cached_reply
+                return prepared
+        except Exception as e:
+            logger.error(f"Semantic cache lookup failed: {e}")
 
-    # ── Step 3: Semantic search for relevant document chunks ──
-    context_text = ""
+    # ── Step 5: Semantic search for relevant document chunks ──
+    relevant_chunks: List[dict] = []
     if chunk_count > 0:
         try:
-            similar_chunks = search_similar_chunks(db, chatbot_id, user_message)
+            if similar_chunks is None:
+                vector_hits = await search_similar_chunks(
+                    db, chatbot_id, user_message, query_embedding=prepared.query_embedding,
+                    top_k=LEXICAL_CANDIDATES if lexical_hits else TOP_K,
+                    snapshot=snapshot
+                )
+                # Reciprocal-rank fusion with the lexical hits
+                similar_chunks = rrf_fuse(vector_hits, lexical_hits, TOP_K) if lexical_hits else vector_hits
             if similar_chunks:
-                context_parts = []
-                for i, chunk in enumerate(similar_chunks, 1):
-                    if chunk["similarity"] > 0.3:  # Only include reasonably similar chunks
-                        context_parts.append(f"[Source {i}]: {chunk['content']}")
-                context_text = "\n\n".join(context_parts)
+                # Only include reasonably similar chunks
+                relevant_chunks = [chunk for chunk in similar_chunks if is_relevant(chunk)]
         except Exception as e:
-            import traceback
-            db.rollback()
-            logger.error(f"Error searching chunks: {e}")
-            traceback.print_exc()
-            print(f"Vector search error: {e}")
+            await db.rollback()
+            logger.error(f"Error searching chunks: {e}", exc_info=True)
+
+    if not relevant_chunks and not snapshot.qa_fragments:
+        return prepared
+
+    # ── Step 6: Build the prompt within the bot's token budget ──
+    # Merges adjacent chunks and keeps only the Q&A entries relevant to the question
+    built = build_context(snapshot, user_message, relevant_chunks, CHAT_MODEL, CHUNK_OVERLAP)
+    system_message = SYSTEM_PROMPT.format(
+        context=built.context_text if built.context_text else "No document context available.",
+        custom_responses=built.custom_responses_text if built.custom_responses_text else "No custom Q&A responses configured."
+    )
+    prepared.messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message}
+    ]
+    prepared.prompt_tokens = count_message_tokens(prepared.messages, CHAT_MODEL)
+    prompt_stats.record(prepared.prompt_tokens, built.truncated)
+    logger.info(
+        f"Prompt for bot {chatbot_id}: {prepared.prompt_tokens} tokens "
+        f"({built.passages} passages, {built.qa_entries}/{len(snapshot.qa_fragments)} Q&A entries, "
+        f"context {built.context_tokens} tokens)"
+    )
+    return prepared
 
-    if not context_text and not custom_responses_text:
-        return None
 
-    # ── Step 4: Generate response with OpenAI ──
+def _remember_answer(chatbot_id: str, prepared: PreparedRequest, answer: str):
+    if SEMANTIC_CACHE_ENABLED and prepared.query_embedding is not None:
+        semantic_cache.store(chatbot_id, prepared.query_embedding, answer, prepared.knowledge_version)
+
+
+async def complete_ai_request(chatbot_id: str, prepared: PreparedRequest) -> Optional[str]:
+    """
+    The LLM half of the pipeline: the completion for prepared.messages, or
+    None when the provider fails. Needs no database session, so callers can
+    run it under admission control after retrieval.
+    """
     try:
-        client = _get_client()
+        client = _get_async_client()
 
-        system_message = SYSTEM_PROMPT.format(
-            context=context_text if context_text else "No document context available.",
-            custom_responses=custom_responses_text if custom_responses_text else "No custom Q&A responses configured."
+        response = await client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=prepared.messages,
+            temperature=0.3,       # Low temperature for factual answers
+            max_tokens=500,
+            top_p=0.9,
         )
 
-        response = client.chat.completions.create(
+        answer = response.choices[0].message.content.strip()
+        _remember_answer(chatbot_id, prepared, answer)
+        return answer
+
+    except Exception as e:
+        import traceback
+        logger.error(f"OpenAI API error: {e}")
+        traceback.print_exc()
+        return None
+
+
+async def stream_ai_request(chatbot_id: str, prepared: PreparedRequest) -> AsyncIterator[str]:
+    """
+    Streaming variant of complete_ai_request(): yields text deltas as the
+    provider emits them, and nothing if it fails before the first token.
+    """
+    try:
+        client = _get_async_client()
+
+        stream = await client.chat.completions.create(
             model=CHAT_MODEL,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
+            messages=prepared.messages,
             temperature=0.3,       # Low temperature for factual answers
             max_tokens=500,
             top_p=0.9,
+            stream=True,
         )
 
-        return response.choices[0].message.content.strip()
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+
+        _remember_answer(chatbot_id, prepared, "".join(parts).strip())
 
     except Exception as e:
         import traceback
         logger.error(f"OpenAI API error: {e}")
         traceback.print_exc()
-        return None
+
+
+async def generate_ai_response(
+    db: AsyncSession,
+    chatbot_id: str,
+    user_message: str,
+    bot_name: str,
+    welcome_message: Optional[str] = None
+) -> Optional[str]:
+    """
+    Generate an AI response using RAG:
+    1. First check custom Q&A entries (exact/contains match) and small talk
+    2. Reuse a cached answer for a near-duplicate question
+    3. If no match, search relevant chunks (full-text + vector)
+    4. Use OpenAI to generate a response strictly based on context
+    """
+    prepared = await prepare_ai_request(db, chatbot_id, user_message, bot_name, welcome_message)
+    if prepared.reply is not None or prepared.messages is None:
+        return prepared.reply
+
+    # End the read transaction so the pooled connection is not held
+    # for the whole provider round-trip.
+    await db.commit()
+
+    # ── Step 6: Generate response with OpenAI ──
+    return await complete_ai_request(chatbot_id, prepared)
+
+
+async def stream_ai_response(
+    db: AsyncSession,
+    chatbot_id: str,
+    user_message: str,
+    bot_name: str,
+    welcome_message: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of generate_ai_response().
+    Yields text deltas as the provider emits them. A custom Q&A match or
+    cached answer is yielded as a single delta; nothing is yielded when
+    there is no knowledge to answer from or the provider fails before the
+    first token, so callers should fall back exactly as they do for a
+    None reply.
+    """
+    prepared = await prepare_ai_request(db, chatbot_id, user_message, bot_name, welcome_message)
+    if prepared.reply is not None:
+        yield prepared.reply
+        return
+    if prepared.messages is None:
+        return
+
+    await db.commit()
+
+    async for delta in stream_ai_request(chatbot_id, prepared):
+        yield delta
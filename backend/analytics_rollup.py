@@ -0,0 +1,164 @@
+"""
+Daily Analytics Rollups
+- daily_stats holds one row per (chatbot_id, UTC day) with visit, message,
+  usage and conversation counts, so the dashboard and chart read a few
+  rows per bot instead of scanning raw events
+- Counters are incremented in the same transaction that writes the events
+  (conversation_store.py for messages/conversations, telemetry.py for
+  visits/usage), so they never drift from the raw tables
+- backfill() recomputes days from the raw tables and overwrites them; it is
+  idempotent and runs on startup when daily_stats is empty, or manually:
+      python analytics_rollup.py backfill [days]
+  A transaction-level advisory lock lets one worker backfill at a time; the
+  others wait, then find daily_stats filled and skip it
+- Scripts that insert events directly (the seed scripts) add their counts
+  with RollupDelta.apply_sync() in the same transaction
+"""
+
+import sys
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("visits", "messages", "usage", "conversations")
+
+# Arbitrary app-wide key for pg_advisory_xact_lock
+BACKFILL_LOCK_KEY = 727_412_004
+
+INCREMENT_SQL = text("""
+    INSERT INTO daily_stats AS d (chatbot_id, day, visits, messages, usage, conversations)
+    VALUES (:chatbot_id, :day, :visits, :messages, :usage, :conversations)
+    ON CONFLICT (chatbot_id, day) DO UPDATE SET
+        visits = d.visits + EXCLUDED.visits,
+        messages = d.messages + EXCLUDED.messages,
+        usage = d.usage + EXCLUDED.usage,
+        conversations = d.conversations + EXCLUDED.conversations
+""")
+
+# Recount [:start, :end) from the raw tables; days without events are reset to 0
+BACKFILL_SQL = text("""
+    WITH counts AS (
+        SELECT chatbot_id, created_at::date AS day, count(*) AS visits,
+               0 AS messages, 0 AS usage, 0 AS conversations
+        FROM visits WHERE created_at >= :start AND created_at < :end
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT c.chatbot_id, m.created_at::date, 0, count(*), 0, 0
+        FROM messages m JOIN conversations c ON c.id = m.conversation_id
+        WHERE m.created_at >= :start AND m.created_at < :end
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT chatbot_id, created_at::date, 0, 0, count(*), 0
+        FROM usage_stats WHERE created_at >= :start AND created_at < :end
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT chatbot_id, started_at::date, 0, 0, 0, count(*)
+        FROM conversations WHERE started_at >= :start AND started_at < :end
+        GROUP BY 1, 2
+    ), totals AS (
+        SELECT chatbot_id, day, sum(visits) AS visits, sum(messages) AS messages,
+               sum(usage) AS usage, sum(conversations) AS conversations
+        FROM counts GROUP BY 1, 2
+    ), reset AS (
+        UPDATE daily_stats SET visits = 0, messages = 0, usage = 0, conversations = 0
+        WHERE day >= CAST(:start AS date) AND day < CAST(:end AS date)
+          AND (chatbot_id, day) NOT IN (SELECT chatbot_id, day FROM totals)
+    )
+    INSERT INTO daily_stats (chatbot_id, day, visits, messages, usage, conversations)
+    SELECT chatbot_id, day, visits, messages, usage, conversations FROM totals
+    ON CONFLICT (chatbot_id, day) DO UPDATE SET
+        visits = EXCLUDED.visits,
+        messages = EXCLUDED.messages,
+        usage = EXCLUDED.usage,
+        conversations = EXCLUDED.conversations
+""")
+
+
+def utc_day(moment: Optional[datetime] = None) -> date:
+    moment = moment or datetime.now(timezone.utc)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+class RollupDelta:
+    """Counter increments collected while building a batch of writes."""
+
+    def __init__(self):
+        self._counts: Dict[Tuple[str, date], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+    def add(self, chatbot_id: str, moment: datetime, counter: str, amount: int = 1):
+        self._counts[(chatbot_id, utc_day(moment))][counter] += amount
+
+    def add_rows(self, rows: Iterable[dict], counter: str, time_key: str = "created_at"):
+        for row in rows:
+            self.add(row["chatbot_id"], row[time_key], counter)
+
+    def params(self) -> list:
+        # Sorted so concurrent batches lock rows in the same order
+        return [{"chatbot_id": bot_id, "day": day, **counts}
+                for (bot_id, day), counts in sorted(self._counts.items())]
+
+    async def apply(self, db: AsyncSession):
+        """Add the counts to daily_stats inside the caller's transaction."""
+        params = self.params()
+        if params:
+            await db.execute(INCREMENT_SQL, params)
+
+    def apply_sync(self, db):
+        """apply() for a sync Session or Connection."""
+        params = self.params()
+        if params:
+            db.execute(INCREMENT_SQL, params)
+
+
+def _lock(conn):
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": BACKFILL_LOCK_KEY})
+
+
+def _backfill(conn, days: Optional[int]) -> int:
+    end = utc_day() + timedelta(days=1)
+    if days is None:
+        first = conn.execute(text(
+            "SELECT least((SELECT min(created_at) FROM visits), (SELECT min(created_at) FROM messages),"
+            " (SELECT min(created_at) FROM usage_stats), (SELECT min(started_at) FROM conversations))"
+        )).scalar()
+        if first is None:
+            return 0
+        start = utc_day(first)
+    else:
+        start = end - timedelta(days=days)
+    written = conn.execute(BACKFILL_SQL, {"start": start, "end": end}).rowcount
+    logger.info(f"Backfilled daily_stats {start}..{end - timedelta(days=1)} ({written} rows)")
+    return written
+
+
+def backfill(engine, days: Optional[int] = None) -> int:
+    """Recompute the last `days` UTC days (all history when None). Returns the rows written."""
+    with engine.begin() as conn:
+        _lock(conn)
+        return _backfill(conn, days)
+
+
+def backfill_if_empty(engine):
+    """Startup backfill; every worker calls it, the lock makes only the first one do the work."""
+    with engine.begin() as conn:
+        _lock(conn)
+        if conn.execute(text("SELECT NOT EXISTS (SELECT 1 FROM daily_stats)")).scalar():
+            _backfill(conn, None)
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print("usage: python analytics_rollup.py backfill [days]")
+        sys.exit(1)
+    backfill(engine, int(sys.argv[2]) if len(sys.argv) > 2 else None)
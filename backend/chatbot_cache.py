@@ -0,0 +1,107 @@
+"""
+Chatbot Config Cache
+- Read-through cache of Chatbot.to_dict() keyed by bot id, used by the
+  public widget endpoints (config, chat, review)
+- Unknown bot ids are cached negatively for a shorter time so junk embed
+  ids cannot hammer Postgres
+- Invalidated when an owner edits, re-brands or deletes the bot
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Chatbot
+
+CHATBOT_CACHE_TTL = float(os.getenv("CHATBOT_CACHE_TTL", "300"))
+CHATBOT_NEGATIVE_TTL = float(os.getenv("CHATBOT_NEGATIVE_TTL", "30"))
+CHATBOT_CACHE_SIZE = int(os.getenv("CHATBOT_CACHE_SIZE", "10000"))
+
+_MISSING = object()
+
+
+class ChatbotConfigCache:
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        # bot_id -> (config dict or None, expires_at); most recently used last
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Bumped on invalidation so a load that raced with an edit is not cached
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def _lookup(self, bot_id: str):
+        with self._lock:
+            entry = self._entries.get(bot_id)
+            if entry is None:
+                self.misses += 1
+                return _MISSING, self._generations.get(bot_id, 0)
+            config, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[bot_id]
+                self.misses += 1
+                return _MISSING, self._generations.get(bot_id, 0)
+            self._entries.move_to_end(bot_id)
+            if config is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return config, None
+
+    def _store(self, bot_id: str, config: Optional[dict], generation: int):
+        with self._lock:
+            if self._generations.get(bot_id, 0) != generation:
+                return
+            ttl = self.ttl if config is not None else self.negative_ttl
+            self._entries[bot_id] = (config, time.monotonic() + ttl)
+            self._entries.move_to_end(bot_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_sync(self, db: Session, bot_id: str) -> Optional[dict]:
+        """Return the bot's config dict, or None if no such bot exists."""
+        config, generation = self._lookup(bot_id)
+        if config is not _MISSING:
+            return config
+        bot = db.query(Chatbot).filter(Chatbot.id == bot_id).first()
+        config = bot.to_dict() if bot else None
+        self._store(bot_id, config, generation)
+        return config
+
+    async def get(self, db: AsyncSession, bot_id: str) -> Optional[dict]:
+        """Async counterpart of get_sync() for the widget chat path."""
+        config, generation = self._lookup(bot_id)
+        if config is not _MISSING:
+            return config
+        bot = (await db.execute(select(Chatbot).where(Chatbot.id == bot_id))).scalars().first()
+        config = bot.to_dict() if bot else None
+        self._store(bot_id, config, generation)
+        return config
+
+    def invalidate(self, bot_id: str):
+        with self._lock:
+            self._generations[bot_id] = self._generations.get(bot_id, 0) + 1
+            self._entries.pop(bot_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+chatbot_cache = ChatbotConfigCache(CHATBOT_CACHE_TTL, CHATBOT_NEGATIVE_TTL, CHATBOT_CACHE_SIZE)
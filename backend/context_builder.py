@@ -0,0 +1,232 @@
+"""
+Token-Budgeted Prompt Context
+- Counts tokens with tiktoken (falls back to a ~4 chars/token estimate when
+  the encoding cannot be loaded, e.g. offline)
+- Keeps only the Q&A entries that share terms with the question once the
+  bot's FAQ no longer fits its share of the budget
+- Merges retrieved chunks that are adjacent in the same document, dropping
+  the CHUNK_OVERLAP words they repeat
+- Fills a per-bot budget (Chatbot.max_context_tokens or CONTEXT_TOKEN_BUDGET)
+"""
+
+import os
+import logging
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import tiktoken
+
+from knowledge_snapshot import KnowledgeSnapshot
+from lexical_search import lexical_terms
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_QA_SHARE = float(os.getenv("CONTEXT_QA_SHARE", "0.4"))
+MIN_PASSAGE_TOKENS = 64     # don't bother adding a truncated passage shorter than this
+MESSAGE_OVERHEAD_TOKENS = 4  # per chat message framing
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        # Non-OpenAI models (Ollama): cl100k_base is a close enough estimate
+        name = "cl100k_base"
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(value: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(value) + 3) // 4
+    return len(encoding.encode(value, disallowed_special=()))
+
+
+def truncate_to_tokens(value: str, max_tokens: int, model: str) -> str:
+    encoding = _encoding(model)
+    if encoding is None:
+        return value[:max_tokens * 4]
+    tokens = encoding.encode(value, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens])
+
+
+def count_message_tokens(messages: List[dict], model: str) -> int:
+    return sum(count_tokens(m["content"], model) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+@dataclass
+class BuiltContext:
+    context_text: str = ""
+    custom_responses_text: str = ""
+    context_tokens: int = 0
+    qa_entries: int = 0
+    passages: int = 0
+    truncated: bool = False
+
+
+@dataclass
+class _QAIndex:
+    tokens: List[int]
+    trigger_terms: List[set]
+    response_terms: List[set]
+    total_tokens: int = 0
+
+
+_qa_indexes: Dict[Tuple[str, int, float], _QAIndex] = {}
+
+
+def _qa_index(snapshot: KnowledgeSnapshot, model: str) -> _QAIndex:
+    """Token counts and term sets of the bot's Q&A fragments, computed once per snapshot."""
+    key = (snapshot.chatbot_id, snapshot.version, snapshot.loaded_at)
+    index = _qa_indexes.get(key)
+    if index is None:
+        tokens = [count_tokens(f, model) for f in snapshot.qa_fragments]
+        index = _QAIndex(
+            tokens=tokens,
+            trigger_terms=[set(lexical_terms(t)) for t, _ in snapshot.entries],
+            response_terms=[set(lexical_terms(r)) for _, r in snapshot.entries],
+            total_tokens=sum(tokens),
+        )
+        # One index per bot: drop the ones built from older snapshots
+        for stale in [k for k in _qa_indexes if k[0] == snapshot.chatbot_id]:
+            _qa_indexes.pop(stale, None)
+        _qa_indexes[key] = index
+    return index
+
+
+def select_qa(snapshot: KnowledgeSnapshot, user_message: str, budget: int, model: str) -> Tuple[List[str], int]:
+    """Q&A fragments to include: all of them if they fit, else the best term matches."""
+    if not snapshot.qa_fragments or budget <= 0:
+        return [], 0
+    index = _qa_index(snapshot, model)
+    if index.total_tokens <= budget:
+        return list(snapshot.qa_fragments), index.total_tokens
+
+    terms = set(lexical_terms(user_message))
+    scored = []
+    for i in range(len(snapshot.qa_fragments)):
+        score = 2 * len(terms & index.trigger_terms[i]) + len(terms & index.response_terms[i])
+        if score:
+            scored.append((-score, i))
+    scored.sort()
+
+    selected, used = [], 0
+    for _, i in scored:
+        if used + index.tokens[i] <= budget:
+            selected.append(snapshot.qa_fragments[i])
+            used += index.tokens[i]
+    return selected, used
+
+
+def merge_passages(chunks: List[dict], overlap: int) -> List[str]:
+    """
+    Join chunks that are consecutive in the same document into one passage,
+    dropping the overlap words the second one repeats. Passages keep the rank
+    of their best chunk.
+    """
+    by_document: Dict[str, List[Tuple[int, int, dict]]] = {}
+    for rank, chunk in enumerate(chunks):
+        by_document.setdefault(chunk["document_id"], []).append((chunk["chunk_index"] or 0, rank, chunk))
+
+    passages: List[Tuple[int, str]] = []
+    for members in by_document.values():
+        members.sort(key=lambda m: m[0])
+        words = members[0][2]["content"].split()
+        best_rank, last_index = members[0][1], members[0][0]
+        for chunk_index, rank, chunk in members[1:]:
+            next_words = chunk["content"].split()
+            if chunk_index == last_index + 1:
+                if overlap and words[-overlap:] == next_words[:overlap]:
+                    next_words = next_words[overlap:]
+                words.extend(next_words)
+                best_rank = min(best_rank, rank)
+            elif chunk_index != last_index:
+                passages.append((best_rank, " ".join(words)))
+                words, best_rank = next_words, rank
+            last_index = chunk_index
+        passages.append((best_rank, " ".join(words)))
+
+    passages.sort(key=lambda p: p[0])
+    return [text for _, text in passages]
+
+
+def build_context(
+    snapshot: KnowledgeSnapshot,
+    user_message: str,
+    chunks: List[dict],
+    model: str,
+    chunk_overlap: int,
+    budget: Optional[int] = None
+) -> BuiltContext:
+    """Assemble the document context and Q&A text within the token budget."""
+    budget = budget or snapshot.max_context_tokens or CONTEXT_TOKEN_BUDGET
+    passages = merge_passages(chunks, chunk_overlap)
+    built = BuiltContext()
+
+    qa_budget = int(budget * CONTEXT_QA_SHARE) if passages else budget
+    qa_selected, qa_tokens = select_qa(snapshot, user_message, qa_budget, model)
+
+    remaining = budget - qa_tokens
+    parts = []
+    for passage in passages:
+        label = f"[Source {len(parts) + 1}]: "
+        tokens = count_tokens(label + passage, model)
+        if tokens > remaining:
+            if remaining >= MIN_PASSAGE_TOKENS:
+                parts.append(label + truncate_to_tokens(passage, remaining - count_tokens(label, model), model))
+                remaining = 0
+            built.truncated = True
+            break
+        parts.append(label + passage)
+        remaining -= tokens
+
+    chunk_tokens = budget - qa_tokens - remaining
+    if remaining > 0 and len(qa_selected) < len(snapshot.qa_fragments):
+        # Documents left room: give it back to the Q&A entries
+        qa_selected, qa_tokens = select_qa(snapshot, user_message, budget - chunk_tokens, model)
+
+    built.context_text = "\n\n".join(parts)
+    built.custom_responses_text = "\n".join(qa_selected)
+    built.passages = len(parts)
+    built.qa_entries = len(qa_selected)
+    built.context_tokens = chunk_tokens + qa_tokens
+    return built
+
+
+class PromptStats:
+    """Running totals of prompt sizes sent to the chat model."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.truncated = 0
+
+    def record(self, prompt_tokens: int, truncated: bool):
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens += prompt_tokens
+            self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+            if truncated:
+                self.truncated += 1
+
+    def stats(self) -> dict:
+        return {
+            "default_budget": CONTEXT_TOKEN_BUDGET,
+            "turns": self.turns,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.turns, 1) if self.turns else 0.0,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "truncated_turns": self.truncated,
+        }
+
+
+prompt_stats = PromptStats()
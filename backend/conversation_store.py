@@ -0,0 +1,278 @@
+"""
+Conversation Write Path
+- Caches widget session -> active conversation id, so a chat turn does not
+  look the conversation up again on every message
+- A turn (new conversation if any, user message, bot message, and the
+  conversation's message_count / last_message_preview / last_message_at /
+  updated_at) is written in a single transaction: one commit per turn
+- With MESSAGE_WRITE_BEHIND enabled, turns are queued and a background
+  writer batch-inserts many of them per commit (fewer fsyncs under load,
+  at the cost of losing the last MESSAGE_FLUSH_INTERVAL of messages on a crash)
+"""
+
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update, insert, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Conversation, Message, utc_now
+from analytics_rollup import RollupDelta
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "50000"))
+CONVERSATION_CACHE_TTL = float(os.getenv("CONVERSATION_CACHE_TTL", "3600"))
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+MESSAGE_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_SIZE", "200"))
+MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "0.2"))
+CONVERSATION_PREVIEW_CHARS = 200
+
+
+def message_preview(content: str) -> str:
+    """Shortened message for Conversation.last_message_preview."""
+    if len(content) <= CONVERSATION_PREVIEW_CHARS:
+        return content
+    return content[:CONVERSATION_PREVIEW_CHARS - 1].rstrip() + "…"
+
+
+@dataclass
+class Turn:
+    """One chat exchange, persisted together."""
+    conversation_id: str
+    chatbot_id: str
+    session_id: str
+    visitor_name: str
+    is_new: bool                        # conversation row not written yet
+    user_message: str
+    user_at: datetime = field(default_factory=utc_now)
+    reply: Optional[str] = None
+    reply_at: Optional[datetime] = None
+
+
+class ConversationStore:
+    def __init__(self, max_size: int, ttl: float, write_behind: bool):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.write_behind = write_behind
+        # (chatbot_id, session_id) -> (conversation_id, expires_at); most recently used last
+        self._sessions: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Conversation ids handed out by begin_turn whose row is not committed yet
+        self._unwritten: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+        self._closing = False
+        self.hits = 0
+        self.misses = 0
+        self.turns = 0
+        self.batches = 0
+
+    # ── Session -> conversation cache ──
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            self._sessions.move_to_end(key)
+            return entry[0]
+
+    def _remember(self, key: Tuple[str, str], conversation_id: str):
+        with self._lock:
+            self._sessions[key] = (conversation_id, time.monotonic() + self.ttl)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def drop_bot(self, chatbot_id: str):
+        """Forget the sessions of a deleted bot (its conversations are gone)."""
+        with self._lock:
+            for key in [k for k in self._sessions if k[0] == chatbot_id]:
+                del self._sessions[key]
+
+    async def begin_turn(self, db: AsyncSession, chatbot_id: str, session_id: str,
+                         visitor_name: str, user_message: str) -> Turn:
+        """
+        Resolve the session's active conversation without writing anything.
+        A new conversation gets its id here and is inserted with the turn.
+        """
+        key = (chatbot_id, session_id)
+        conversation_id = self._cached(key)
+        is_new = False
+        if conversation_id is not None:
+            self.hits += 1
+            with self._lock:
+                # An earlier turn created it and may not have committed yet
+                is_new = conversation_id in self._unwritten
+        else:
+            self.misses += 1
+            conversation_id = (await db.execute(
+                select(Conversation.id).where(
+                    Conversation.chatbot_id == chatbot_id,
+                    Conversation.session_id == session_id,
+                    Conversation.status == "active",
+                )
+            )).scalars().first()
+            if conversation_id is None:
+                conversation_id = str(uuid.uuid4())
+                is_new = True
+                with self._lock:
+                    self._unwritten.add(conversation_id)
+            # Remembered right away, so a concurrent turn of the session reuses the id
+            self._remember(key, conversation_id)
+        return Turn(conversation_id, chatbot_id, session_id, visitor_name, is_new, user_message)
+
+    # ── Persistence ──
+
+    async def finish_turn(self, turn: Turn, reply: str):
+        """Persist the turn: queued in write-behind mode, otherwise one transaction."""
+        turn.reply = reply
+        turn.reply_at = utc_now()
+        self.turns += 1
+        if self.write_behind and self._queue is not None:
+            self._queue.put_nowait(turn)
+            return
+        await self._write([turn])
+
+    def finish_turn_later(self, turn: Turn, reply: str):
+        """finish_turn() that survives the caller being cancelled (client disconnect)."""
+        task = asyncio.ensure_future(self.finish_turn(turn, reply))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _write(self, turns: List[Turn]):
+        conversations: Dict[str, dict] = {}
+        messages: List[dict] = []
+        # Summary columns of existing conversations: id -> (messages added, last at, preview)
+        summaries: Dict[str, Tuple[int, datetime, str]] = {}
+        for turn in turns:
+            preview = message_preview(turn.reply)
+            if turn.is_new and turn.conversation_id not in conversations:
+                conversations[turn.conversation_id] = {
+                    "id": turn.conversation_id,
+                    "chatbot_id": turn.chatbot_id,
+                    "session_id": turn.session_id,
+                    "visitor_name": turn.visitor_name,
+                    "status": "active",
+                    "started_at": turn.user_at,
+                    "updated_at": turn.reply_at,
+                    "message_count": 2,
+                    "last_message_preview": preview,
+                    "last_message_at": turn.reply_at,
+                }
+            else:
+                added, _, _ = summaries.get(turn.conversation_id, (0, None, None))
+                summaries[turn.conversation_id] = (added + 2, turn.reply_at, preview)
+            messages.append({"id": str(uuid.uuid4()), "conversation_id": turn.conversation_id,
+                             "sender": "user", "content": turn.user_message, "created_at": turn.user_at})
+            messages.append({"id": str(uuid.uuid4()), "conversation_id": turn.conversation_id,
+                             "sender": "bot", "content": turn.reply, "created_at": turn.reply_at})
+
+        rollup = RollupDelta()
+        for turn in turns:
+            rollup.add(turn.chatbot_id, turn.user_at, "messages")
+            rollup.add(turn.chatbot_id, turn.reply_at, "messages")
+
+        async with AsyncSessionLocal() as db:
+            if conversations:
+                # Two turns of a new session written concurrently both carry the
+                # conversation row: the second one adds to it instead
+                stmt = pg_insert(Conversation).values(list(conversations.values()))
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[Conversation.id],
+                    set_={
+                        "message_count": Conversation.message_count + stmt.excluded.message_count,
+                        "last_message_preview": stmt.excluded.last_message_preview,
+                        "last_message_at": stmt.excluded.last_message_at,
+                        "updated_at": stmt.excluded.updated_at,
+                    },
+                ).returning(Conversation.id, literal_column("xmax = 0"))
+                inserted = {row[0] for row in (await db.execute(stmt)).all() if row[1]}
+                rollup.add_rows([c for c in conversations.values() if c["id"] in inserted],
+                                "conversations", time_key="started_at")
+            await db.execute(insert(Message), messages)
+            await rollup.apply(db)
+            for conversation_id, (added, last_at, preview) in summaries.items():
+                await db.execute(
+                    update(Conversation).where(Conversation.id == conversation_id)
+                                        .values(message_count=Conversation.message_count + added,
+                                                last_message_preview=preview,
+                                                last_message_at=last_at,
+                                                updated_at=last_at)
+                )
+            await db.commit()
+
+        with self._lock:
+            self._unwritten.difference_update(conversations)
+
+    # ── Write-behind ──
+
+    def start(self):
+        if self.write_behind and self._writer is None:
+            self._queue = asyncio.Queue()
+            self._closing = False
+            self._writer = asyncio.create_task(self._run_writer())
+
+    async def stop(self):
+        """Flush queued turns and stop the writer (called on shutdown)."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._writer is None:
+            return
+        self._closing = True
+        self._queue.put_nowait(None)            # wakes the writer if it is idle
+        await self._writer
+        self._writer = None
+
+    def _drain(self) -> List[Turn]:
+        turns = []
+        while not self._queue.empty() and len(turns) < MESSAGE_BATCH_SIZE:
+            turn = self._queue.get_nowait()
+            if turn is not None:
+                turns.append(turn)
+        return turns
+
+    async def _run_writer(self):
+        while not self._closing:
+            turn = await self._queue.get()
+            if not self._closing:
+                await asyncio.sleep(MESSAGE_FLUSH_INTERVAL)   # let concurrent turns pile up
+            turns = ([turn] if turn is not None else []) + self._drain()
+            await self._flush(turns)
+        while not self._queue.empty():
+            await self._flush(self._drain())
+
+    async def _flush(self, turns: List[Turn]):
+        if not turns:
+            return
+        try:
+            await self._write(turns)
+            self.batches += 1
+        except Exception as e:
+            logger.error(f"Write-behind flush of {len(turns)} turns failed: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "turns": self.turns,
+            "write_behind": self.write_behind,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+        }
+
+
+conversation_store = ConversationStore(CONVERSATION_CACHE_SIZE, CONVERSATION_CACHE_TTL, MESSAGE_WRITE_BEHIND)
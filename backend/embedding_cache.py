@@ -0,0 +1,122 @@
+"""
+Query Embedding Cache
+- Keyed by normalized query text + embedding model
+- In-memory LRU tier with size and TTL eviction
+- Optional Postgres tier (query_embeddings table) that survives restarts
+- Hit / miss counters for monitoring
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "5000"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+
+
+def normalize_query(value: str) -> str:
+    """Lowercase and collapse whitespace so trivial variations share a key."""
+    return " ".join(value.lower().split())
+
+
+def cache_key(value: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_query(value)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, max_size: int, ttl: float, persist: bool):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist = persist
+        # key -> (float32 vector, expires_at); most recently used last
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending_writes = set()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._entries[key] = (vector, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[List[float]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            vector, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return vector.tolist()
+            del self._entries[key]
+
+        if self.persist:
+            try:
+                async with AsyncSessionLocal() as db:
+                    row = (await db.execute(
+                        text("SELECT embedding FROM query_embeddings WHERE key = :key"),
+                        {"key": key}
+                    )).first()
+                if row is not None:
+                    vector = np.asarray(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.persistent_hits += 1
+                    return vector.tolist()
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed: {e}")
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, model: str, embedding: List[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        self._remember(key, vector)
+        if self.persist:
+            # Written in the background so the chat turn does not wait on it
+            task = asyncio.create_task(self._persist(key, model, vector))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
+
+    async def _persist(self, key: str, model: str, vector: np.ndarray):
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    text(f"""
+                        INSERT INTO query_embeddings (key, model, embedding, created_at)
+                        VALUES (:key, :model, CAST(:embedding AS vector({EMBEDDING_DIM})), now())
+                        ON CONFLICT (key) DO NOTHING
+                    """),
+                    {"key": key, "model": model, "embedding": vector}
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "persistent": self.persist,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_ratio": round((lookups - self.misses) / lookups, 3) if lookups else 0.0,
+        }
+
+
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_PERSIST)
@@ -0,0 +1,530 @@
+"""
+Document Ingestion Queue
+- upload_document spools the file under INGESTION_SPOOL_DIR and adds an
+  ingestion_jobs row in the same commit as the document, so an accepted
+  upload survives restarts
+- Jobs are processed by a pool of INGESTION_WORKERS separate processes
+  (run with `python ingestion.py worker`, or started by a single-process app
+  with INGESTION_IN_APP=true)
+  that claim them with SELECT ... FOR UPDATE SKIP LOCKED; extraction and
+  embedding never run in a web worker, and the bot with the fewest running
+  jobs is served first so one large upload batch does not hold up others
+- Uploads are streamed to disk, text is extracted page by page into a
+  checkpoint file, and chunks are produced from that file as a stream and
+  embedded INGESTION_EMBED_BATCH at a time, so a worker's memory does not
+  grow with the document size
+- Every stage leaves a checkpoint (extracted text file, then chunks staged
+  with their embeddings batch by batch), so a retried job resumes where it
+  stopped
+- Failures are retried with exponential backoff up to INGESTION_MAX_ATTEMPTS;
+  a worker that dies is noticed by its stale heartbeat and its job reclaimed
+- Publishing bumps the bot's knowledge version; every web worker's poll
+  picks that up and drops the affected bots' knowledge caches
+
+Run the worker pool next to the web app:
+    python ingestion.py worker [count]
+"""
+
+import os
+import sys
+import glob
+import uuid
+import random
+import signal
+import socket
+import asyncio
+import logging
+import subprocess
+import multiprocessing
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import BinaryIO, Dict, Optional
+
+from sqlalchemy import insert, text, update
+from sqlalchemy.orm import Session
+
+from database import engine, AsyncSessionLocal
+from models import KnowledgeDocument, IngestionJob, IngestionChunk
+from ai_service import iter_text, iter_chunks, generate_embeddings
+from knowledge_snapshot import bump_knowledge_version, sync_knowledge_versions
+
+logger = logging.getLogger(__name__)
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+# Only for a single-process app: every web worker would start its own pool
+INGESTION_IN_APP = os.getenv("INGESTION_IN_APP", "false").lower() in ("1", "true", "yes")
+INGESTION_SPOOL_DIR = os.getenv(
+    "INGESTION_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_spool")
+)
+INGESTION_POLL_INTERVAL = float(os.getenv("INGESTION_POLL_INTERVAL", "2"))
+INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "5"))
+INGESTION_RETRY_BASE = float(os.getenv("INGESTION_RETRY_BASE", "30"))      # seconds, doubled per attempt
+INGESTION_RETRY_MAX = float(os.getenv("INGESTION_RETRY_MAX", "3600"))
+INGESTION_LOCK_TIMEOUT = float(os.getenv("INGESTION_LOCK_TIMEOUT", "600"))  # heartbeat age of a dead worker
+INGESTION_EMBED_BATCH = int(os.getenv("INGESTION_EMBED_BATCH", "100"))      # chunks per embedding checkpoint
+INGESTION_HEARTBEAT_PAGES = int(os.getenv("INGESTION_HEARTBEAT_PAGES", "20"))  # pages extracted per heartbeat
+INGESTION_NICE = int(os.getenv("INGESTION_NICE", "10"))                     # CPU priority below the web workers
+INGESTION_SHUTDOWN_TIMEOUT = float(os.getenv("INGESTION_SHUTDOWN_TIMEOUT", "30"))
+
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+# Completions are re-read this far behind the watermark: a job can commit
+# after a later-stamped one was already seen
+POLL_OVERLAP = 60.0
+
+UTC_NOW = "(now() AT TIME ZONE 'utc')"
+
+# Oldest runnable job of the bot with the fewest running jobs; a running
+# job whose heartbeat is older than the lock timeout belongs to a dead worker
+CLAIM_SQL = text(f"""
+    UPDATE ingestion_jobs SET status = 'running', attempts = attempts + 1,
+        locked_by = :worker, locked_at = {UTC_NOW}
+    WHERE id = (
+        SELECT j.id FROM ingestion_jobs j
+        WHERE (j.status = 'queued' AND j.run_after <= {UTC_NOW})
+           OR (j.status = 'running' AND j.locked_at < {UTC_NOW} - make_interval(secs => :lock_timeout))
+        ORDER BY (SELECT count(*) FROM ingestion_jobs r
+                  WHERE r.chatbot_id = j.chatbot_id AND r.status = 'running'),
+                 j.run_after
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, document_id, chatbot_id, filename, stage, attempts
+""")
+
+HEARTBEAT_SQL = text(f"""
+    UPDATE ingestion_jobs SET locked_at = {UTC_NOW}, stage = coalesce(:stage, stage)
+    WHERE id = :job_id AND locked_by = :worker
+""")
+
+PUBLISH_SQL = text("""
+    INSERT INTO document_chunks (id, document_id, chatbot_id, content, chunk_index, embedding)
+    SELECT chunk_id, :document_id, :chatbot_id, content, chunk_index, embedding
+    FROM ingestion_chunks WHERE job_id = :job_id
+""")
+
+
+class UnprocessableDocument(Exception):
+    """The file itself is the problem (unreadable, unsupported, no text): not retried."""
+
+
+class _Interrupted(Exception):
+    """Shutdown was requested while the job was running."""
+
+
+class _LostJob(Exception):
+    """The job was deleted with its document, or reclaimed by another worker."""
+
+
+def spool_paths(document_id: str):
+    """(uploaded file, extracted text checkpoint) of a document."""
+    base = os.path.join(INGESTION_SPOOL_DIR, document_id)
+    return base + ".upload", base + ".txt"
+
+
+def discard_spool(document_id: str):
+    for path in spool_paths(document_id):
+        # Temp files carry a per-attempt suffix (see IngestionWorker._extract)
+        for candidate in [path] + glob.glob(glob.escape(path) + "*.tmp"):
+            try:
+                os.remove(candidate)
+            except OSError:
+                pass
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, so a provider outage is not retried in lockstep."""
+    delay = min(INGESTION_RETRY_MAX, INGESTION_RETRY_BASE * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+# ─── Worker (runs in the pool processes) ────────────────
+
+class IngestionWorker:
+    def __init__(self, name: str, stop_event):
+        self.name = name
+        self.stop_event = stop_event
+
+    def _stopping(self) -> bool:
+        # The pool process may be killed outright (e.g. TerminateProcess on Windows)
+        parent = multiprocessing.parent_process()
+        return self.stop_event.is_set() or (parent is not None and not parent.is_alive())
+
+    def run(self):
+        logger.info(f"Ingestion worker {self.name} started")
+        while not self._stopping():
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error(f"Ingestion worker {self.name} could not claim a job: {e}")
+                job = None
+            if job is None:
+                self.stop_event.wait(INGESTION_POLL_INTERVAL)
+                continue
+            self._run_job(job)
+
+    def _claim(self) -> Optional[dict]:
+        with engine.begin() as conn:
+            row = conn.execute(CLAIM_SQL, {"worker": self.name, "lock_timeout": INGESTION_LOCK_TIMEOUT}).mappings().first()
+        return dict(row) if row else None
+
+    def _run_job(self, job: dict):
+        logger.info(f"Ingesting {job['filename']} (attempt {job['attempts']}, checkpoint {job['stage'] or 'none'})")
+        try:
+            self._process(job)
+        except _Interrupted:
+            self._release(job)
+        except _LostJob:
+            logger.info(f"Ingestion of {job['filename']} abandoned: job deleted or reclaimed")
+        except UnprocessableDocument as e:
+            self._fail(job, str(e), permanent=True)
+        except Exception as e:
+            logger.exception(f"Ingestion of {job['filename']} failed")
+            self._fail(job, str(e), permanent=False)
+
+    def _heartbeat(self, conn, job: dict, stage: Optional[str] = None):
+        """Refresh the lock (and record a checkpoint); fails if the job is no longer ours."""
+        result = conn.execute(HEARTBEAT_SQL, {"job_id": job["id"], "worker": self.name, "stage": stage})
+        if result.rowcount == 0:
+            raise _LostJob()
+
+    def _check_stop(self):
+        if self._stopping():
+            raise _Interrupted()
+
+    # ── Stages ──
+
+    def _process(self, job: dict):
+        upload_path, text_path = spool_paths(job["document_id"])
+        if job["stage"] is None:
+            self._extract(job, upload_path, text_path)
+        if job["stage"] != "embedded":
+            self._chunk_and_embed(job, text_path)
+        self._publish(job)
+        discard_spool(job["document_id"])
+
+    def _extract(self, job: dict, upload_path: str, text_path: str):
+        """
+        Stream the document's text page by page into the text checkpoint
+        file, refreshing the lock every INGESTION_HEARTBEAT_PAGES pages so a
+        long extraction is not reclaimed by another worker.
+        """
+        # Per attempt, so a worker that lost the job never writes into the new owner's file
+        tmp_path = f"{text_path}.{os.getpid()}.{job['attempts']}.tmp"
+        found_text = False
+        try:
+            try:
+                pieces = iter_text(upload_path, job["filename"])
+            except Exception as e:
+                raise UnprocessableDocument(f"Text extraction failed: {e}")
+            with open(tmp_path, "w", encoding="utf-8") as out:
+                page = 0
+                while True:
+                    try:
+                        piece = next(pieces, None)
+                    except Exception as e:
+                        raise UnprocessableDocument(f"Text extraction failed: {e}")
+                    if piece is None:
+                        break
+                    found_text = found_text or bool(piece.strip())
+                    out.write(piece)
+                    out.write("\n\n")
+                    page += 1
+                    if page % INGESTION_HEARTBEAT_PAGES == 0:
+                        with engine.begin() as conn:
+                            self._heartbeat(conn, job)
+                        self._check_stop()
+            if not found_text:
+                raise UnprocessableDocument("Extracted text is empty.")
+            os.replace(tmp_path, text_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        with engine.begin() as conn:
+            self._heartbeat(conn, job, "extracted")
+        job["stage"] = "extracted"
+        self._check_stop()
+
+    def _chunk_and_embed(self, job: dict, text_path: str):
+        """
+        Chunk the text file as a stream and stage the chunks with their
+        embeddings, INGESTION_EMBED_BATCH per commit; a resumed job skips the
+        chunks already staged.
+        """
+        params = {"job_id": job["id"]}
+        with engine.begin() as conn:
+            self._heartbeat(conn, job)
+            # Rows without an embedding can only be left by an older, two-pass version
+            conn.execute(text("DELETE FROM ingestion_chunks WHERE job_id = :job_id AND embedding IS NULL"), params)
+            staged = conn.execute(text(
+                "SELECT coalesce(max(chunk_index) + 1, 0) FROM ingestion_chunks WHERE job_id = :job_id"
+            ), params).scalar()
+
+        with open(text_path, encoding="utf-8") as lines:
+            chunks = islice(iter_chunks(lines), staged, None)
+            index = staged
+            while True:
+                self._check_stop()
+                batch = list(islice(chunks, INGESTION_EMBED_BATCH))
+                if not batch:
+                    break
+                embeddings = generate_embeddings(batch)
+                rows = [
+                    {"job_id": job["id"], "chunk_index": index + offset, "chunk_id": str(uuid.uuid4()),
+                     "content": content, "embedding": embedding}
+                    for offset, (content, embedding) in enumerate(zip(batch, embeddings))
+                ]
+                with engine.begin() as conn:
+                    self._heartbeat(conn, job)
+                    conn.execute(insert(IngestionChunk), rows)
+                index += len(rows)
+        if index == 0:
+            raise UnprocessableDocument("No chunks created.")
+        with engine.begin() as conn:
+            self._heartbeat(conn, job, "embedded")
+        job["stage"] = "embedded"
+
+    def _publish(self, job: dict):
+        """Move the staged chunks to document_chunks and mark the document ready, in one transaction."""
+        params = {"job_id": job["id"], "document_id": job["document_id"], "chatbot_id": job["chatbot_id"]}
+        with engine.begin() as conn:
+            # Also row-locks the job, so a concurrent document delete waits for this commit
+            self._heartbeat(conn, job)
+            conn.execute(text("DELETE FROM document_chunks WHERE document_id = :document_id"), params)
+            count = conn.execute(PUBLISH_SQL, params).rowcount
+            conn.execute(
+                update(KnowledgeDocument).where(KnowledgeDocument.id == job["document_id"])
+                .values(status="ready", chunk_count=count, error_message=None)
+            )
+            bump_knowledge_version(conn, job["chatbot_id"])
+            conn.execute(text("DELETE FROM ingestion_chunks WHERE job_id = :job_id"), params)
+            # Last statement, with the wall clock rather than the transaction start,
+            # so finished_at is close to the commit the poller sees
+            conn.execute(text(
+                "UPDATE ingestion_jobs SET status = 'done', stage = 'embedded', last_error = NULL, "
+                "locked_by = NULL, finished_at = clock_timestamp() AT TIME ZONE 'utc' WHERE id = :job_id"
+            ), params)
+        logger.info(f"Document {job['filename']} processed: {count} chunks created")
+
+    # ── Outcomes ──
+
+    def _release(self, job: dict):
+        """Hand an interrupted job back without counting the attempt."""
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"UPDATE ingestion_jobs SET status = 'queued', attempts = greatest(attempts - 1, 0), "
+                    f"locked_by = NULL, locked_at = NULL, run_after = {UTC_NOW} "
+                    f"WHERE id = :job_id AND locked_by = :worker"
+                ), {"job_id": job["id"], "worker": self.name})
+        except Exception as e:
+            logger.error(f"Releasing job {job['id']} failed, it is reclaimed after the lock timeout: {e}")
+
+    def _fail(self, job: dict, error: str, permanent: bool):
+        final = permanent or job["attempts"] >= INGESTION_MAX_ATTEMPTS
+        params = {"job_id": job["id"], "worker": self.name, "error": error}
+        try:
+            with engine.begin() as conn:
+                if final:
+                    failed = conn.execute(text(
+                        f"UPDATE ingestion_jobs SET status = 'failed', last_error = :error, "
+                        f"locked_by = NULL, finished_at = {UTC_NOW} WHERE id = :job_id AND locked_by = :worker"
+                    ), params).rowcount
+                    if failed:
+                        conn.execute(
+                            update(KnowledgeDocument).where(KnowledgeDocument.id == job["document_id"])
+                            .values(status="error", error_message=error)
+                        )
+                        conn.execute(text("DELETE FROM ingestion_chunks WHERE job_id = :job_id"), params)
+                else:
+                    conn.execute(text(
+                        f"UPDATE ingestion_jobs SET status = 'queued', last_error = :error, "
+                        f"locked_by = NULL, locked_at = NULL, "
+                        f"run_after = {UTC_NOW} + make_interval(secs => :delay) "
+                        f"WHERE id = :job_id AND locked_by = :worker"
+                    ), {**params, "delay": retry_delay(job["attempts"])})
+        except Exception as e:
+            logger.error(f"Recording the failure of job {job['id']} failed: {e}")
+            return
+        if final:
+            discard_spool(job["document_id"])
+            logger.error(f"Ingestion of {job['filename']} failed for good: {error}")
+
+
+def run_worker(stop_event):
+    """Entry point of one pool process."""
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)     # the pool stops us through stop_event
+    if INGESTION_NICE and hasattr(os, "nice"):
+        os.nice(INGESTION_NICE)
+    IngestionWorker(f"{socket.gethostname()}:{os.getpid()}", stop_event).run()
+
+
+def run_pool(workers: int):
+    """Keep `workers` worker processes running until SIGTERM / SIGINT."""
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop_event.set())
+
+    processes: Dict[int, multiprocessing.Process] = {}
+    while not stop_event.is_set():
+        for slot in range(workers):
+            process = processes.get(slot)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                logger.warning(f"Ingestion worker {process.pid} exited ({process.exitcode}), restarting")
+            processes[slot] = context.Process(target=run_worker, args=(stop_event,), daemon=True)
+            processes[slot].start()
+        stop_event.wait(INGESTION_POLL_INTERVAL)
+
+    for process in processes.values():
+        process.join(INGESTION_SHUTDOWN_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
+
+
+# ─── Web process side ───────────────────────────────────
+
+class IngestionQueue:
+    def __init__(self, workers: int, in_app: bool, poll_interval: float):
+        self.workers = workers
+        self.in_app = in_app
+        self.poll_interval = poll_interval
+        self._pool: Optional[subprocess.Popen] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._closing = False
+        self._since = None                  # finished_at of the last completion seen
+        self._seen: Dict[str, datetime] = {}  # completions inside the overlap window
+        self.enqueued = 0
+        self.completed = 0
+        self.pool_restarts = 0
+        self.backlog: Dict[str, int] = {}
+
+    def enqueue(self, db: Session, document: KnowledgeDocument, source: BinaryIO) -> int:
+        """
+        Stream the upload to the spool and add its job to the caller's
+        transaction (the caller commits). Returns the file size in bytes.
+        """
+        if document.id is None:
+            db.flush()
+        os.makedirs(INGESTION_SPOOL_DIR, exist_ok=True)
+        upload_path, _ = spool_paths(document.id)
+        size = 0
+        with open(upload_path + ".tmp", "wb") as out:
+            while True:
+                block = source.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                out.write(block)
+                size += len(block)
+        os.replace(upload_path + ".tmp", upload_path)
+        db.add(IngestionJob(document_id=document.id, chatbot_id=document.chatbot_id,
+                            filename=document.filename))
+        self.enqueued += 1
+        return size
+
+    def discard(self, document_id: str):
+        """Remove the spooled files of a deleted document."""
+        discard_spool(document_id)
+
+    # ── Worker pool ──
+
+    def _start_pool(self):
+        self._pool = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "worker", str(self.workers)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+
+    async def _stop_pool(self):
+        if self._pool is None:
+            return
+        self._pool.terminate()
+        try:
+            await asyncio.to_thread(self._pool.wait, INGESTION_SHUTDOWN_TIMEOUT + 5)
+        except subprocess.TimeoutExpired:
+            self._pool.kill()
+        self._pool = None
+
+    # ── Completion watcher ──
+
+    async def poll(self):
+        """
+        Drop knowledge caches of bots changed by any process (a finished job
+        bumps its bot's knowledge version) and count completed jobs.
+        """
+        async with AsyncSessionLocal() as db:
+            await sync_knowledge_versions(db)
+            if self._since is None:
+                self._since = (await db.execute(text(
+                    f"SELECT coalesce(max(finished_at), {UTC_NOW}) FROM ingestion_jobs WHERE status = 'done'"
+                ))).scalar()
+            finished = (await db.execute(text(
+                "SELECT id, finished_at FROM ingestion_jobs "
+                "WHERE status = 'done' AND finished_at > :since"
+            ), {"since": self._since - timedelta(seconds=POLL_OVERLAP)})).all()
+            backlog = (await db.execute(text(
+                "SELECT status, count(*) FROM ingestion_jobs "
+                "WHERE status IN ('queued', 'running') GROUP BY status"
+            ))).all()
+        for job_id, finished_at in finished:
+            if job_id not in self._seen:
+                self._seen[job_id] = finished_at
+                self.completed += 1
+            self._since = max(self._since, finished_at)
+        horizon = self._since - timedelta(seconds=POLL_OVERLAP)
+        self._seen = {job_id: at for job_id, at in self._seen.items() if at > horizon}
+        self.backlog = {status: count for status, count in backlog}
+
+    async def _watch(self):
+        while not self._closing:
+            await asyncio.sleep(self.poll_interval)
+            if self._pool is not None and self._pool.poll() is not None and not self._closing:
+                logger.warning(f"Ingestion worker pool exited ({self._pool.returncode}), restarting")
+                self.pool_restarts += 1
+                self._start_pool()
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Ingestion completion poll failed: {e}")
+
+    def start(self):
+        if self._watcher is None:
+            self._closing = False
+            if self.in_app and self.workers > 0:
+                self._start_pool()
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """Stop the watcher and the worker pool; running jobs are handed back to the queue."""
+        if self._watcher is None:
+            return
+        self._closing = True
+        self._watcher.cancel()
+        self._watcher = None
+        await self._stop_pool()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers if self._pool is not None and self._pool.poll() is None else 0,
+            "queued": self.backlog.get("queued", 0),
+            "running": self.backlog.get("running", 0),
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "pool_restarts": self.pool_restarts,
+        }
+
+
+ingestion_queue = IngestionQueue(INGESTION_WORKERS, INGESTION_IN_APP, INGESTION_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "worker":
+        print("usage: python ingestion.py worker [count]")
+        sys.exit(1)
+    run_pool(int(sys.argv[2]) if len(sys.argv) > 2 else INGESTION_WORKERS)
@@ -0,0 +1,108 @@
+"""
+Small-Talk Intent Classifier
+- Rule-based routes recognizing greetings, thanks and goodbyes
+- A matched message gets a templated reply ({bot_name}, {welcome_message})
+  without retrieval, embeddings or an LLM call
+- Only short messages that consist entirely of small talk match, so
+  "hi, what are your opening hours?" still goes through RAG
+- More routes can be added with intent_classifier.register()
+"""
+
+import os
+import re
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Pattern
+
+INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() in ("1", "true", "yes")
+INTENT_MAX_WORDS = int(os.getenv("INTENT_MAX_WORDS", "6"))
+
+DEFAULT_WELCOME = "Hi! How can I help you today?"
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s']+")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and emoji, collapse whitespace."""
+    return " ".join(_PUNCTUATION_RE.sub(" ", message.lower()).split())
+
+
+@dataclass
+class IntentRoute:
+    name: str
+    pattern: Pattern
+    replies: List[str]                 # str.format templates, one picked at random
+
+    def render(self, bot_name: str, welcome_message: Optional[str]) -> str:
+        template = random.choice(self.replies)
+        return template.format(bot_name=bot_name, welcome_message=welcome_message or DEFAULT_WELCOME)
+
+
+def route(name: str, pattern: str, replies: List[str]) -> IntentRoute:
+    """Build a route whose pattern must match the whole normalized message."""
+    return IntentRoute(name, re.compile(rf"(?:{pattern})"), replies)
+
+
+DEFAULT_ROUTES = [
+    route(
+        "greeting",
+        r"(?:hi+|hello+|hey+|hiya|howdy|hola|yo|greetings|good (?:morning|afternoon|evening|day))"
+        r"(?: there| everyone| all| team)?",
+        ["{welcome_message}"],
+    ),
+    route(
+        "thanks",
+        r"(?:ok(?:ay)? )?(?:thanks?|thank you|thankyou|thx|ty|cheers|much appreciated)"
+        r"(?: (?:so|very) much| a lot| a bunch| again)?(?: for (?:the|your) help)?",
+        ["You're welcome! Is there anything else I can help you with?"],
+    ),
+    route(
+        "goodbye",
+        r"(?:ok(?:ay)? )?(?:bye+|goodbye|bye bye|see (?:you|ya)(?: later| soon)?|cya|later"
+        r"|have a (?:good|nice|great) (?:day|one|evening|night))",
+        ["Goodbye! Thanks for chatting with {bot_name}."],
+    ),
+]
+
+
+class IntentClassifier:
+    def __init__(self, routes: List[IntentRoute], max_words: int):
+        self.routes: List[IntentRoute] = list(routes)
+        self.max_words = max_words
+        self.matches: Dict[str, int] = {}
+
+    def register(self, intent_route: IntentRoute, first: bool = False):
+        """Add a route; first=True gives it priority over the existing ones."""
+        if first:
+            self.routes.insert(0, intent_route)
+        else:
+            self.routes.append(intent_route)
+
+    def classify(self, message: str) -> Optional[IntentRoute]:
+        normalized = normalize_message(message)
+        if not normalized or len(normalized.split()) > self.max_words:
+            return None
+        for intent_route in self.routes:
+            if intent_route.pattern.fullmatch(normalized):
+                self.matches[intent_route.name] = self.matches.get(intent_route.name, 0) + 1
+                return intent_route
+        return None
+
+    def reply(self, message: str, bot_name: str, welcome_message: Optional[str]) -> Optional[str]:
+        """Templated reply for a small-talk message, or None to continue with RAG."""
+        if not INTENT_CLASSIFIER_ENABLED:
+            return None
+        intent_route = self.classify(message)
+        if intent_route is None:
+            return None
+        return intent_route.render(bot_name, welcome_message)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": INTENT_CLASSIFIER_ENABLED,
+            "routes": [r.name for r in self.routes],
+            "matches": dict(self.matches),
+        }
+
+
+intent_classifier = IntentClassifier(DEFAULT_ROUTES, INTENT_MAX_WORDS)
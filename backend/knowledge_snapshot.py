@@ -0,0 +1,160 @@
+"""
+Per-Chatbot Knowledge Snapshot
+- Everything the chat path needs to know about a bot's knowledge, loaded once:
+  compiled Q&A matcher, entries, chunk counts and preformatted prompt fragments
+- Tagged with chatbots.knowledge_version, which every Q&A or document change
+  bumps in its own transaction, so caches derived from the knowledge
+  (semantic answers, in-flight requests, vector matrices) can key on it
+- Each worker compares the versions of the bots it caches against Postgres
+  every poll (sync_knowledge_versions, run by the ingestion watcher), so an
+  edit or delete in one worker reaches the others within seconds
+- The chat path runs no metadata queries while the snapshot is current
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Chatbot, KnowledgeEntry
+from trigger_matcher import TriggerMatcher
+from semantic_cache import semantic_cache
+from vector_engine import vector_engine
+
+# Backstop only: changes reach other workers through sync_knowledge_versions()
+KNOWLEDGE_CACHE_TTL = float(os.getenv("KNOWLEDGE_CACHE_TTL", "300"))
+
+BUMP_VERSION_SQL = text(
+    "UPDATE chatbots SET knowledge_version = knowledge_version + 1 WHERE id = :chatbot_id "
+    "RETURNING knowledge_version"
+)
+
+
+@dataclass
+class KnowledgeSnapshot:
+    chatbot_id: str
+    version: int
+    matcher: TriggerMatcher
+    entries: List[Tuple[str, str]]              # (trigger, response), oldest first
+    document_chunks: Dict[str, int]             # document_id -> chunk count
+    qa_fragments: List[str] = field(default_factory=list)
+    max_context_tokens: Optional[int] = None    # per-bot prompt budget (context_builder.py)
+    loaded_at: float = 0.0
+
+    @property
+    def chunk_count(self) -> int:
+        return sum(self.document_chunks.values())
+
+    @property
+    def has_knowledge(self) -> bool:
+        return bool(self.entries) or self.chunk_count > 0
+
+
+_snapshots: Dict[str, KnowledgeSnapshot] = {}
+_versions: Dict[str, int] = {}
+
+
+def knowledge_version(chatbot_id: str) -> int:
+    """Latest knowledge version of a chatbot this process has seen."""
+    return _versions.get(chatbot_id, 0)
+
+
+def bump_knowledge_version(db, chatbot_id: str) -> int:
+    """
+    Bump the bot's version inside the caller's (sync) transaction, alongside
+    the change itself; pass the result to invalidate_knowledge() after commit.
+    """
+    return db.execute(BUMP_VERSION_SQL, {"chatbot_id": chatbot_id}).scalar() or 0
+
+
+def invalidate_knowledge(chatbot_id: str, version: int):
+    """Drop every cache derived from versions of the bot older than version."""
+    if version < knowledge_version(chatbot_id):
+        return
+    _versions[chatbot_id] = version
+    _snapshots.pop(chatbot_id, None)
+    semantic_cache.drop_bot(chatbot_id)
+    vector_engine.forget(chatbot_id)
+
+
+def forget_knowledge(chatbot_id: str):
+    """The bot was deleted: drop everything cached for it."""
+    _versions.pop(chatbot_id, None)
+    _snapshots.pop(chatbot_id, None)
+    semantic_cache.drop_bot(chatbot_id)
+    vector_engine.forget(chatbot_id)
+
+
+async def sync_knowledge_versions(db: AsyncSession) -> List[str]:
+    """
+    Compare the bots cached in this process with chatbots.knowledge_version
+    and invalidate those changed (or deleted) elsewhere. Returns their ids.
+    """
+    tracked = list(set(_versions) | set(_snapshots))
+    if not tracked:
+        return []
+    current = dict((await db.execute(
+        select(Chatbot.id, Chatbot.knowledge_version).where(Chatbot.id.in_(tracked))
+    )).all())
+    changed = []
+    for chatbot_id in tracked:
+        if chatbot_id not in current:
+            forget_knowledge(chatbot_id)
+            changed.append(chatbot_id)
+        elif current[chatbot_id] > knowledge_version(chatbot_id):
+            invalidate_knowledge(chatbot_id, current[chatbot_id])
+            changed.append(chatbot_id)
+    return changed
+
+
+async def get_knowledge_snapshot(db: AsyncSession, chatbot_id: str) -> KnowledgeSnapshot:
+    """Return the bot's snapshot, loading it only when it is missing, stale or expired."""
+    snapshot = _snapshots.get(chatbot_id)
+    if (snapshot and snapshot.version == knowledge_version(chatbot_id)
+            and time.monotonic() - snapshot.loaded_at < KNOWLEDGE_CACHE_TTL):
+        return snapshot
+
+    # Read the version first: the rows below are at least as new as it
+    bot = (await db.execute(
+        select(Chatbot.knowledge_version, Chatbot.max_context_tokens).where(Chatbot.id == chatbot_id)
+    )).first()
+    version, max_context_tokens = (bot[0], bot[1]) if bot else (0, None)
+    if version > knowledge_version(chatbot_id):
+        invalidate_knowledge(chatbot_id, version)
+    _versions.setdefault(chatbot_id, version)     # tracked by sync_knowledge_versions from now on
+
+    rows = (await db.execute(
+        select(KnowledgeEntry.trigger, KnowledgeEntry.response, KnowledgeEntry.is_exact_match)
+        .where(KnowledgeEntry.chatbot_id == chatbot_id)
+        .order_by(KnowledgeEntry.created_at, KnowledgeEntry.id)
+    )).all()
+    entries = [(t, r, bool(e)) for t, r, e in rows]
+
+    chunk_rows = (await db.execute(
+        text("""
+            SELECT document_id, COUNT(*) FROM document_chunks
+            WHERE chatbot_id = :cid
+            GROUP BY document_id
+        """),
+        {"cid": chatbot_id}
+    )).all()
+    document_chunks = {row[0]: int(row[1]) for row in chunk_rows}
+
+    qa_fragments = [f"Q: {t}\nA: {r}" for t, r, _ in entries]
+    snapshot = KnowledgeSnapshot(
+        chatbot_id=chatbot_id,
+        version=version,
+        matcher=TriggerMatcher(entries),
+        entries=[(t, r) for t, r, _ in entries],
+        document_chunks=document_chunks,
+        qa_fragments=qa_fragments,
+        max_context_tokens=max_context_tokens,
+        loaded_at=time.monotonic(),
+    )
+    # Do not cache a snapshot that raced with an edit
+    if knowledge_version(chatbot_id) == version:
+        _snapshots[chatbot_id] = snapshot
+    return snapshot
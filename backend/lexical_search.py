@@ -0,0 +1,124 @@
+"""
+Lexical Chunk Search (Postgres full-text)
+- Ranks a bot's chunks against the query with the GIN-indexed
+  document_chunks.content_tsv column ('simple' config, no stemming, so
+  product codes and names match literally)
+- Reciprocal-rank fusion of lexical and vector result lists
+- Detects literal-lookup questions (SKUs, product codes) whose top
+  lexical hit is confident enough to skip the embedding call
+"""
+
+import os
+import re
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()   # hybrid, vector
+LEXICAL_SHORTCUT = os.getenv("LEXICAL_SHORTCUT", "true").lower() in ("1", "true", "yes")
+LEXICAL_SHORTCUT_MAX_TERMS = int(os.getenv("LEXICAL_SHORTCUT_MAX_TERMS", "6"))
+LEXICAL_CANDIDATES = int(os.getenv("LEXICAL_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+MAX_QUERY_TERMS = 16
+
+# Question words and fillers that would otherwise match almost every chunk
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "please",
+    "tell", "that", "the", "there", "this", "to", "was", "we", "what", "when",
+    "where", "which", "who", "why", "will", "with", "you", "your",
+}
+
+_TERM_RE = re.compile(r"\w+")
+# A token mixing letters and digits (AB-1234, X200, SKU42); plain words,
+# acronyms ("USA") and bare numbers ("2024") do not count
+_CODE_RE = re.compile(r"(?<![\w-])(?=[\w-]*[A-Za-z])(?=[\w-]*\d)[A-Za-z0-9][\w-]{2,}")
+
+
+def lexical_terms(query: str) -> List[str]:
+    """Distinct lowercase search terms, safe to join into a to_tsquery() string."""
+    terms: List[str] = []
+    for term in _TERM_RE.findall(query.lower()):
+        term = term.strip("_")
+        if term and term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def is_literal_lookup(query: str, terms: List[str]) -> bool:
+    """
+    A short query naming a code or SKU rarely needs semantic matching. Short
+    plain-word queries ("refund policy") still go through vector search,
+    since a chunk containing the words is not necessarily the answer.
+    """
+    return bool(_CODE_RE.search(query)) and len(terms) <= LEXICAL_SHORTCUT_MAX_TERMS
+
+
+async def lexical_search(db: AsyncSession, chatbot_id: str, terms: List[str], limit: int) -> List[dict]:
+    """
+    Chunks containing any of the terms, best ts_rank_cd first.
+    full_match is true when a chunk contains every term.
+    """
+    if not terms:
+        return []
+    result = await db.execute(
+        text("""
+            SELECT id, content, chunk_index, document_id,
+                   ts_rank_cd(content_tsv, any_terms) AS rank,
+                   content_tsv @@ to_tsquery('simple', :all_terms) AS full_match
+            FROM document_chunks, to_tsquery('simple', :any_terms) AS any_terms
+            WHERE chatbot_id = :chatbot_id
+              AND content_tsv @@ any_terms
+            ORDER BY rank DESC
+            LIMIT :limit
+        """),
+        {
+            "chatbot_id": chatbot_id,
+            "any_terms": " | ".join(terms),
+            "all_terms": " & ".join(terms),
+            "limit": limit,
+        }
+    )
+    return [
+        {
+            "id": row[0],
+            "content": row[1],
+            "chunk_index": row[2],
+            "document_id": row[3],
+            "similarity": None,
+            "lexical_rank": float(row[4]),
+            "full_match": bool(row[5]),
+        }
+        for row in result.fetchall()
+    ]
+
+
+def is_confident(hits: List[dict]) -> bool:
+    """The best lexical hit contains every query term."""
+    return bool(hits) and hits[0]["full_match"]
+
+
+def is_relevant(chunk: dict) -> bool:
+    """Vector hits need a reasonable similarity; lexical hits must contain every term."""
+    if chunk.get("full_match"):
+        return True
+    return chunk.get("similarity") is not None and chunk["similarity"] > 0.3
+
+
+def rrf_fuse(vector_hits: List[dict], lexical_hits: List[dict], top_k: int) -> List[dict]:
+    """Reciprocal-rank fusion: score = sum of 1 / (RRF_K + rank) over both lists."""
+    fused: Dict[str, dict] = {}
+    scores: Dict[str, float] = {}
+    for hits in (vector_hits, lexical_hits):
+        for rank, hit in enumerate(hits, 1):
+            chunk = fused.setdefault(hit["id"], dict(hit))
+            if hit.get("similarity") is not None:
+                chunk["similarity"] = hit["similarity"]
+            if hit.get("lexical_rank") is not None:
+                chunk["lexical_rank"] = hit["lexical_rank"]
+                chunk["full_match"] = hit["full_match"]
+            scores[hit["id"]] = scores.get(hit["id"], 0.0) + 1.0 / (RRF_K + rank)
+    ranked = sorted(fused.values(), key=lambda c: scores[c["id"]], reverse=True)
+    return ranked[:top_k]
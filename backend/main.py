@@ -1,34 +1,62 @@
 import os
+import json
+import time
+import asyncio
 import uuid
 import shutil
+import threading
 import logging
-from typing import List, Optional
-from datetime import datetime, timezone, timedelta
+from typing import AsyncIterator, List, Optional
+from contextlib import asynccontextmanager
+from datetime import timedelta
 
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlalchemy import func, cast, Date, text
-from sqlalchemy.orm import Session
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session, noload
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 load_dotenv()
 
-from database import engine, get_db, Base, init_pgvector, SessionLocal
+from database import (
+    engine, async_engine, get_db, get_async_db, Base, init_pgvector,
+)
 from models import (
-    User, Chatbot, KnowledgeEntry, KnowledgeDocument, DocumentChunk,
-    Conversation, Message, Review, Visit, Usage
+    User, Chatbot, KnowledgeEntry, KnowledgeDocument,
+    Conversation, Message, Review, DailyStat, IngestionJob
 )
 from schemas import (
     UserRegister, UserLogin, UserResponse,
     ChatbotCreate, ChatbotUpdate, ChatbotResponse,
     KnowledgeEntryCreate, KnowledgeEntryUpdate, KnowledgeEntryResponse,
     KnowledgeDocumentResponse,
-    ConversationResponse, ConversationDetailResponse,
+    ConversationResponse, ConversationDetailResponse, MessageResponse,
     DashboardStats, BotStats, ChartDataPoint,
     ReviewCreate, ReviewResponse,
 )
-from ai_service import process_document, generate_ai_response
+from ai_service import (
+    PreparedRequest, prepare_ai_request, complete_ai_request, stream_ai_request, provider_clients,
+)
+from knowledge_snapshot import bump_knowledge_version, invalidate_knowledge, forget_knowledge
+from embedding_cache import embedding_cache
+from semantic_cache import semantic_cache
+from chatbot_cache import chatbot_cache
+from vector_index import ensure_vector_index, VECTOR_INDEX_AUTO_CREATE
+from vector_engine import vector_engine
+from context_builder import prompt_stats
+from singleflight import chat_flights, flight_key
+from scheduler import llm_scheduler, AdmissionRejected
+from rate_limit import rate_limiter, RateLimitExceeded
+from intent_classifier import intent_classifier
+from conversation_store import conversation_store
+from telemetry import telemetry, TELEMETRY_MAX_EVENTS
+from analytics_rollup import backfill_if_empty, utc_day
+from migrations import apply_migrations
+from partitions import ensure_partitions, run_maintenance_loop
+from ingestion import ingestion_queue
+from pagination import paginate, page_size, DEFAULT_PAGE_SIZE, MESSAGE_PAGE_SIZE, NEXT_CURSOR_HEADER
 import bcrypt
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,7 +67,28 @@ BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 init_pgvector()
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="WebChat AI API", version="2.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    conversation_store.start()
+    telemetry.start()
+    ingestion_queue.start()
+    maintenance = asyncio.create_task(run_maintenance_loop(engine))
+    if VECTOR_INDEX_AUTO_CREATE:
+        # Build the ANN index on document_chunks.embedding if it is missing, without
+        # holding up startup; a build cut short by shutdown is redone next time
+        threading.Thread(target=ensure_vector_index, args=(engine,), daemon=True,
+                         name="vector-index-build").start()
+    yield
+    maintenance.cancel()
+    await conversation_store.stop()
+    await telemetry.stop()
+    await ingestion_queue.stop()
+    await provider_clients.aclose()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="WebChat AI API", version="2.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -47,47 +96,54 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Overloaded: tell the widget to retry later instead of queueing without bound."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Too many requests ({exc.reason}), please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Rate limit exceeded, please slow down"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 
-def process_document_task(bot_id: str, doc_id: str, file_bytes: bytes, filename: str):
-    """Background task to process document with its own DB session."""
-    with SessionLocal() as db:
-        try:
-            process_document(db, bot_id, doc_id, file_bytes, filename)
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Background processing error: {error_msg}")
-            doc = db.query(KnowledgeDocument).filter(KnowledgeDocument.id == doc_id).first()
-            if doc:
-                doc.status = "error"
-                doc.error_message = error_msg
-                db.commit()
-
-
-# ─── Schema Migration (Simple) ───────────────────────────
-def run_migrations():
-    """Ensure all required columns exist."""
-    # Check for error_message column
-    with engine.connect() as conn:
-        try:
-            conn.execute(text("SELECT error_message FROM knowledge_documents LIMIT 1"))
-        except Exception:
-            # Need to rollback the failed transaction before trying ALTER
-            conn.rollback()
-            logger.info("Adding error_message column to knowledge_documents...")
-            try:
-                conn.execute(text("ALTER TABLE knowledge_documents ADD COLUMN error_message TEXT"))
-                conn.commit()
-            except Exception as e:
-                logger.error(f"Migration error: {e}")
-                conn.rollback()
+# ─── Schema Migrations ───────────────────────────────────
+# Versioned schema changes and indexes (see migrations.py)
+apply_migrations(engine)
+
+# Monthly partitions for the event tables, a few months ahead
+ensure_partitions(engine)
 
-run_migrations()
+# Fill daily_stats from the raw event tables on first start
+backfill_if_empty(engine)
+
+
+# ─── Knowledge Cache Invalidation ────────────────────────
+def _commit_knowledge_change(db: Session, bot_id: str):
+    """
+    Commit a change to the bot's knowledge together with a bump of its
+    shared version, then drop this worker's caches derived from it (other
+    workers see the new version on their next poll).
+    """
+    version = bump_knowledge_version(db, bot_id)
+    db.commit()
+    invalidate_knowledge(bot_id, version)
 
 
 # ─── Auth Logic ──────────────────────────────────────────
@@ -106,6 +162,26 @@ def health():
     return {"status": "ok", "message": "WebChat AI API is running"}
 
 
+@app.get("/api/health/stats")
+def health_stats():
+    """Runtime pool and cache statistics for monitoring."""
+    return {
+        "providers": provider_clients.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "chatbot_cache": chatbot_cache.stats(),
+        "vector_engine": vector_engine.stats(),
+        "prompt": prompt_stats.stats(),
+        "singleflight": chat_flights.stats(),
+        "scheduler": llm_scheduler.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "intents": intent_classifier.stats(),
+        "conversations": conversation_store.stats(),
+        "telemetry": telemetry.stats(),
+        "ingestion": ingestion_queue.stats(),
+    }
+
+
 @app.post("/api/auth/register", response_model=UserResponse)
 def register(payload: UserRegister, db: Session = Depends(get_db)):
     # Check if user exists
@@ -147,10 +223,13 @@ def create_chatbot(payload: ChatbotCreate, db: Session = Depends(get_db)):
         bubble_color=payload.bubble_color,
         text_color=payload.text_color,
         position=payload.position,
+        max_context_tokens=payload.max_context_tokens,
+        retention_days=payload.retention_days,
     )
     db.add(bot)
     db.commit()
     db.refresh(bot)
+    chatbot_cache.invalidate(bot.id)
     return bot
 
 
@@ -167,6 +246,7 @@ def upload_icon(bot_id: str, icon: UploadFile = File(...), db: Session = Depends
     bot.icon_url = f"{BACKEND_URL}/uploads/{filename}"
     db.commit()
     db.refresh(bot)
+    chatbot_cache.invalidate(bot_id)
     return bot
 
 
@@ -191,10 +271,17 @@ def update_chatbot(bot_id: str, payload: ChatbotUpdate, db: Session = Depends(ge
     bot = db.query(Chatbot).filter(Chatbot.id == bot_id).first()
     if not bot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
-    for field, value in payload.model_dump(exclude_unset=True).items():
+    updates = payload.model_dump(exclude_unset=True)
+    for field, value in updates.items():
         setattr(bot, field, value)
-    db.commit()
+    if "max_context_tokens" in updates:
+        # The prompt budget is carried by the knowledge snapshot
+        db.flush()
+        _commit_knowledge_change(db, bot_id)
+    else:
+        db.commit()
     db.refresh(bot)
+    chatbot_cache.invalidate(bot_id)
     return bot
 
 
@@ -203,8 +290,17 @@ def delete_chatbot(bot_id: str, db: Session = Depends(get_db)):
     bot = db.query(Chatbot).filter(Chatbot.id == bot_id).first()
     if not bot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
+    document_ids = [doc_id for (doc_id,) in db.query(KnowledgeDocument.id).filter(
+        KnowledgeDocument.chatbot_id == bot_id
+    )]
     db.delete(bot)
     db.commit()
+    chatbot_cache.invalidate(bot_id)
+    forget_knowledge(bot_id)
+    vector_engine.drop_bot(bot_id)
+    conversation_store.drop_bot(bot_id)
+    for doc_id in document_ids:
+        ingestion_queue.discard(doc_id)
     return {"detail": "Chatbot deleted"}
 
 
@@ -241,7 +337,8 @@ def create_knowledge(bot_id: str, payload: KnowledgeEntryCreate, db: Session = D
         is_exact_match=payload.is_exact_match,
     )
     db.add(entry)
-    db.commit()
+    db.flush()
+    _commit_knowledge_change(db, bot_id)
     db.refresh(entry)
     return entry
 
@@ -256,7 +353,8 @@ def update_knowledge(bot_id: str, entry_id: str, payload: KnowledgeEntryUpdate,
         raise HTTPException(status_code=404, detail="Knowledge entry not found")
     for field, value in payload.model_dump(exclude_unset=True).items():
         setattr(entry, field, value)
-    db.commit()
+    db.flush()
+    _commit_knowledge_change(db, bot_id)
     db.refresh(entry)
     return entry
 
@@ -269,7 +367,8 @@ def delete_knowledge(bot_id: str, entry_id: str, db: Session = Depends(get_db)):
     if not entry:
         raise HTTPException(status_code=404, detail="Knowledge entry not found")
     db.delete(entry)
-    db.commit()
+    db.flush()
+    _commit_knowledge_change(db, bot_id)
     return {"detail": "Knowledge entry deleted"}
 
 
@@ -290,7 +389,6 @@ def list_documents(bot_id: str, db: Session = Depends(get_db)):
 @app.post("/api/chatbots/{bot_id}/documents", response_model=KnowledgeDocumentResponse)
 def upload_document(
     bot_id: str,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
@@ -307,25 +405,20 @@ def upload_document(
             detail="Only PDF and Word (.docx) files are supported."
         )
 
-    # Read file content
-    file_bytes = file.file.read()
-    file_size = len(file_bytes)
-
     # Create document record
     doc = KnowledgeDocument(
         chatbot_id=bot_id,
         filename=filename,
         file_type=ext,
-        file_size=file_size,
         status="processing"
     )
     db.add(doc)
+
+    # Stream the file to the spool and queue it for the ingestion workers in the same commit
+    doc.file_size = ingestion_queue.enqueue(db, doc, file.file)
     db.commit()
     db.refresh(doc)
 
-    # Add processing to background tasks
-    background_tasks.add_task(process_document_task, bot_id, doc.id, file_bytes, filename)
-
     return doc
 
 
@@ -338,7 +431,14 @@ def delete_document(bot_id: str, doc_id: str, db: Session = Depends(get_db)):
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     db.delete(doc)
+    db.flush()
+    version = bump_knowledge_version(db, bot_id)
     db.commit()
+    # Write the smaller matrix for the new signature before the caches are
+    # dropped, so no worker has to reload the bot from SQL
+    vector_engine.remove_document(bot_id, doc_id)
+    invalidate_knowledge(bot_id, version)
+    ingestion_queue.discard(doc_id)
     return {"detail": "Document and all associated chunks deleted"}
 
 
@@ -350,11 +450,16 @@ def document_status(bot_id: str, doc_id: str, db: Session = Depends(get_db)):
     ).first()
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
+    job = db.query(IngestionJob).filter(
+        IngestionJob.document_id == doc_id
+    ).order_by(IngestionJob.created_at.desc()).first()
     return {
         "id": doc.id,
         "status": doc.status,
         "chunk_count": doc.chunk_count,
-        "filename": doc.filename
+        "filename": doc.filename,
+        "stage": job.stage if job else None,
+        "attempts": job.attempts if job else 0,
     }
 
 
@@ -369,135 +474,266 @@ def serve_widget():
     return FileResponse(widget_path, media_type="application/javascript")
 
 
-@app.get("/api/widget/config/{bot_id}")
+@app.get("/api/widget/config/{bot_id}", dependencies=[Depends(rate_limiter.dependency("widget"))])
 def widget_config(bot_id: str, session_id: Optional[str] = None, db: Session = Depends(get_db)):
-    bot = db.query(Chatbot).filter(Chatbot.id == bot_id).first()
-    if not bot:
+    config = chatbot_cache.get_sync(db, bot_id)
+    if not config:
         raise HTTPException(status_code=404, detail="Chatbot not found")
     
-    # Record a visit
-    visit = Visit(chatbot_id=bot_id, session_id=session_id)
-    db.add(visit)
-    db.commit()
-    
-    return bot.to_dict()
+    # Record a visit (buffered; written by the telemetry flusher)
+    telemetry.record_visit(bot_id, session_id)
 
+    return config
 
-@app.post("/api/widget/chat/{bot_id}")
-def widget_chat(bot_id: str, body: dict, db: Session = Depends(get_db)):
-    bot = db.query(Chatbot).filter(Chatbot.id == bot_id).first()
+
+async def _admitted(bot_id: str, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Yield from deltas, giving the scheduler slot back when the reply is done."""
+    started = time.monotonic()
+    try:
+        async for delta in deltas:
+            yield delta
+    finally:
+        llm_scheduler.release(bot_id, time.monotonic() - started)
+
+
+async def _single_reply(reply: Optional[str]) -> AsyncIterator[str]:
+    if reply is not None:
+        yield reply
+
+
+async def _completion_deltas(bot_id: str, prepared: PreparedRequest, stream: bool) -> AsyncIterator[str]:
+    """
+    The model call of one reply. It runs in its own task and may outlive the
+    request that started it (see singleflight.py), so it uses no session.
+    """
+    if stream:
+        async for delta in stream_ai_request(bot_id, prepared):
+            yield delta
+    else:
+        reply = await complete_ai_request(bot_id, prepared)
+        if reply:
+            yield reply
+
+
+async def _reply_stream(db: AsyncSession, bot: dict, user_message: str, stream: bool) -> AsyncIterator[str]:
+    """
+    Deltas of the reply, shared with an identical question already in flight
+    for this bot. Custom Q&A, small talk, cached answers and retrieval run
+    first; only the model call needs a scheduler slot, which raises
+    AdmissionRejected when the bot or the server is overloaded.
+    Every path ends db's transaction, so callers do their reads first and
+    no pooled connection is held idle while the reply is produced.
+    """
+    bot_id = bot["id"]
+    key = flight_key(bot_id, user_message)
+    if chat_flights.in_flight(key):
+        await db.commit()
+        return chat_flights.stream(key, None)
+    try:
+        prepared = await prepare_ai_request(db, bot_id, user_message, bot["name"], bot["welcome_message"])
+        # Do not hold the pooled connection while queued or during the model call
+        await db.commit()
+    except Exception as e:
+        import traceback
+        await db.rollback()
+        logger.error(f"AI response error: {e}")
+        traceback.print_exc()
+        prepared = PreparedRequest()
+    if prepared.reply is not None or prepared.messages is None:
+        return _single_reply(prepared.reply)
+    if chat_flights.in_flight(key):
+        # Started by someone else while we retrieved
+        return chat_flights.stream(key, None)
+    await llm_scheduler.acquire(bot_id)
+    if chat_flights.in_flight(key):
+        # Started by someone else while we waited
+        llm_scheduler.release(bot_id)
+        return chat_flights.stream(key, None)
+    return chat_flights.stream(
+        key, lambda: _admitted(bot_id, _completion_deltas(bot_id, prepared, stream))
+    )
+
+
+async def _collect_reply(deltas: AsyncIterator[str]) -> Optional[str]:
+    parts = []
+    async for delta in deltas:
+        parts.append(delta)
+    return "".join(parts).strip() or None
+
+
+def _fallback_reply(bot_name: str) -> str:
+    return f"Thanks for your message! I'm {bot_name}. I don't have a specific answer for that yet, but feel free to ask me anything else!"
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/widget/chat/{bot_id}", dependencies=[Depends(rate_limiter.dependency("chat"))])
+async def widget_chat(bot_id: str, body: dict, db: AsyncSession = Depends(get_async_db)):
+    bot = await chatbot_cache.get(db, bot_id)
     if not bot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
+    bot_name = bot["name"]
 
     user_message = body.get("message", "")
     session_id = body.get("session_id", str(uuid.uuid4()))
 
-    # ── Find or create conversation ──
-    conversation = db.query(Conversation).filter(
-        Conversation.chatbot_id == bot_id,
-        Conversation.session_id == session_id,
-        Conversation.status == "active",
-    ).first()
-
-    if not conversation:
-        conversation = Conversation(
-            chatbot_id=bot_id,
-            session_id=session_id,
-            visitor_name=body.get("visitor_name", "Visitor"),
-        )
-        db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
-
-    # ── Save user message ──
-    user_msg = Message(
-        conversation_id=conversation.id,
-        sender="user",
-        content=user_message,
+    # ── Resolve the session's conversation (cached; created with the turn if new) ──
+    turn = await conversation_store.begin_turn(
+        db, bot_id, session_id, body.get("visitor_name", "Visitor"), user_message
     )
-    db.add(user_msg)
-    db.commit()
 
-    # ── Generate AI-powered response ──
-    reply = None
-    try:
-        reply = generate_ai_response(db, bot_id, user_message, bot.name)
-    except Exception as e:
-        import traceback
-        logger.error(f"AI response error: {e}")
-        traceback.print_exc()
+    # ── Retrieval, then join an identical in-flight reply or wait for a slot (429 if overloaded) ──
+    # Commits the request session: nothing below reads from it
+    deltas = await _reply_stream(db, bot, user_message, stream=False)
+
+    reply = await _collect_reply(deltas)
 
     # Fallback if AI is not configured or fails
     if not reply:
-        reply = f"Thanks for your message! I'm {bot.name}. I don't have a specific answer for that yet, but feel free to ask me anything else!"
+        reply = _fallback_reply(bot_name)
+
+    # ── Save conversation, user message and bot response in one commit ──
+    await conversation_store.finish_turn(turn, reply)
+
+    return {"reply": reply, "session_id": session_id, "conversation_id": turn.conversation_id}
+
+
+@app.post("/api/widget/chat/{bot_id}/stream", dependencies=[Depends(rate_limiter.dependency("chat"))])
+async def widget_chat_stream(bot_id: str, body: dict, db: AsyncSession = Depends(get_async_db)):
+    """
+    Server-Sent Events variant of widget_chat.
+    Emits `meta` once, a `token` event per text delta and a final `done`
+    event carrying the full reply. The bot Message is stored after the
+    stream completes.
+    """
+    bot = await chatbot_cache.get(db, bot_id)
+    if not bot:
+        raise HTTPException(status_code=404, detail="Chatbot not found")
+    bot_name = bot["name"]
 
-    # ── Save bot response ──
-    bot_msg = Message(
-        conversation_id=conversation.id,
-        sender="bot",
-        content=reply,
+    user_message = body.get("message", "")
+    session_id = body.get("session_id", str(uuid.uuid4()))
+
+    turn = await conversation_store.begin_turn(
+        db, bot_id, session_id, body.get("visitor_name", "Visitor"), user_message
     )
-    db.add(bot_msg)
+    conversation_id = turn.conversation_id
 
-    # Update conversation timestamp
-    conversation.updated_at = datetime.now(timezone.utc)
-    db.commit()
+    # Retrieval and admission happen before the response starts so overload is a plain 429
+    deltas = await _reply_stream(db, bot, user_message, stream=True)
 
-    return {"reply": reply, "session_id": session_id, "conversation_id": conversation.id}
+    async def event_stream():
+        # The request-scoped session is closed once the response starts;
+        # the turn is persisted by conversation_store with its own session.
+        yield _sse_event("meta", {"session_id": session_id, "conversation_id": conversation_id})
 
+        parts = []
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield _sse_event("token", {"delta": delta})
+        except BaseException:
+            # Client went away mid-stream: keep the turn with what was generated so far
+            conversation_store.finish_turn_later(turn, "".join(parts).strip() or _fallback_reply(bot_name))
+            raise
+
+        reply = "".join(parts).strip()
+        if not reply:
+            reply = _fallback_reply(bot_name)
+            yield _sse_event("token", {"delta": reply})
+
+        await conversation_store.finish_turn(turn, reply)
+
+        yield _sse_event("done", {"reply": reply, "session_id": session_id, "conversation_id": conversation_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@app.post("/api/widget/review/{bot_id}")
+
+@app.post("/api/widget/review/{bot_id}", dependencies=[Depends(rate_limiter.dependency("widget"))])
 def submit_review(bot_id: str, payload: ReviewCreate, db: Session = Depends(get_db)):
-    bot = db.query(Chatbot).filter(Chatbot.id == bot_id).first()
-    if not bot:
+    if not chatbot_cache.get_sync(db, bot_id):
         raise HTTPException(status_code=404, detail="Chatbot not found")
     
-    review = Review(
-        chatbot_id=bot_id,
-        rating=payload.rating,
-        comment=payload.comment,
-        session_id=payload.session_id,
-    )
-    db.add(review)
-    db.commit()
-    db.refresh(review)
-    return {"status": "success", "review_id": review.id}
+    review_id = telemetry.record_review(bot_id, payload.rating, payload.comment, payload.session_id)
+    return {"status": "success", "review_id": review_id}
 
 
-@app.post("/api/widget/usage/{bot_id}")
+@app.post("/api/widget/usage/{bot_id}", dependencies=[Depends(rate_limiter.dependency("widget"))])
 def record_usage(bot_id: str, body: dict, db: Session = Depends(get_db)):
-    usage = Usage(
-        chatbot_id=bot_id,
-        session_id=body.get("session_id")
-    )
-    db.add(usage)
-    db.commit()
+    if not chatbot_cache.get_sync(db, bot_id):
+        raise HTTPException(status_code=404, detail="Chatbot not found")
+    telemetry.record_usage(bot_id, body.get("session_id"))
     return {"status": "success"}
 
 
+@app.post("/api/widget/events/{bot_id}", status_code=202,
+          dependencies=[Depends(rate_limiter.dependency("widget"))])
+async def widget_events(bot_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Batched widget telemetry, sent with navigator.sendBeacon (text/plain JSON):
+    {"session_id": "...", "events": [{"type": "usage"}, {"type": "review", "rating": 5, "comment": "..."}]}
+    """
+    try:
+        body = json.loads(await request.body() or b"{}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    events = body.get("events") if isinstance(body, dict) else None
+    if not isinstance(events, list) or len(events) > TELEMETRY_MAX_EVENTS:
+        raise HTTPException(status_code=400, detail="Expected a list of events")
+    if not await chatbot_cache.get(db, bot_id):
+        raise HTTPException(status_code=404, detail="Chatbot not found")
+
+    session_id = body.get("session_id")
+    accepted = 0
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        if event.get("type") == "usage":
+            telemetry.record_usage(bot_id, session_id)
+            accepted += 1
+        elif event.get("type") == "review":
+            try:
+                review = ReviewCreate(rating=event.get("rating"), comment=event.get("comment"),
+                                      session_id=session_id)
+            except ValueError:
+                continue
+            if not 1 <= review.rating <= 5:
+                continue
+            telemetry.record_review(bot_id, review.rating, review.comment, review.session_id)
+            accepted += 1
+    return {"status": "accepted", "events": accepted}
+
+
 @app.get("/api/reviews", response_model=List[ReviewResponse])
-def list_reviews(user_id: Optional[str] = None, bot_id: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(Review)
-    
+def list_reviews(response: Response, user_id: Optional[str] = None, bot_id: Optional[str] = None,
+                 cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, db: Session = Depends(get_db)):
+    """Newest reviews first, one page at a time (next page cursor in X-Next-Cursor)."""
+    query = db.query(Review, Chatbot.name).join(Chatbot, Chatbot.id == Review.chatbot_id)
+
     if bot_id:
         query = query.filter(Review.chatbot_id == bot_id)
     elif user_id:
-        query = query.join(Chatbot).filter(Chatbot.user_id == user_id)
-        
-    reviews = query.order_by(Review.created_at.desc()).all()
-    
-    result = []
-    for r in reviews:
-        bot = db.query(Chatbot).filter(Chatbot.id == r.chatbot_id).first()
-        result.append(ReviewResponse(
+        query = query.filter(Chatbot.user_id == user_id)
+
+    rows = paginate(query, Review.created_at, Review.id, cursor, page_size(limit), response)
+
+    return [
+        ReviewResponse(
             id=r.id,
             chatbot_id=r.chatbot_id,
-            chatbot_name=bot.name if bot else "Unknown",
+            chatbot_name=bot_name,
             rating=r.rating,
             comment=r.comment,
             created_at=r.created_at,
-        ))
-    return result
+        )
+        for r, bot_name in rows
+    ]
 
 
 @app.get("/api/analytics/reviews/summary")
@@ -525,26 +761,23 @@ def review_summary(user_id: Optional[str] = None, bot_id: Optional[str] = None,
 #  CONVERSATIONS & ANALYTICS
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 @app.get("/api/conversations", response_model=List[ConversationResponse])
-def list_conversations(bot_id: str = None, user_id: str = None, limit: int = 20, db: Session = Depends(get_db)):
-    query = db.query(Conversation)
+def list_conversations(response: Response, bot_id: str = None, user_id: str = None, cursor: Optional[str] = None,
+                       limit: int = DEFAULT_PAGE_SIZE, db: Session = Depends(get_db)):
+    """
+    Newest conversations first, paged on (started_at, id). updated_at would
+    move a conversation across the cursor whenever it gets a new message.
+    """
+    # Summary columns live on Conversation, so this is one query with the bot join
+    query = db.query(Conversation, Chatbot.name).join(Chatbot, Chatbot.id == Conversation.chatbot_id)
     if bot_id:
         query = query.filter(Conversation.chatbot_id == bot_id)
     if user_id:
-        query = query.join(Chatbot).filter(Chatbot.user_id == user_id)
-    
-    conversations = query.order_by(Conversation.updated_at.desc()).limit(limit).all()
+        query = query.filter(Chatbot.user_id == user_id)
 
-    result = []
-    for conv in conversations:
-        msg_count = db.query(func.count(Message.id)).filter(
-            Message.conversation_id == conv.id
-        ).scalar()
-        last_msg = db.query(Message).filter(
-            Message.conversation_id == conv.id
-        ).order_by(Message.created_at.desc()).first()
-        bot = db.query(Chatbot).filter(Chatbot.id == conv.chatbot_id).first()
-
-        result.append(ConversationResponse(
+    rows = paginate(query, Conversation.started_at, Conversation.id, cursor, page_size(limit), response)
+
+    return [
+        ConversationResponse(
             id=conv.id,
             chatbot_id=conv.chatbot_id,
             session_id=conv.session_id,
@@ -552,58 +785,76 @@ def list_conversations(bot_id: str = None, user_id: str = None, limit: int = 20,
             status=conv.status,
             started_at=conv.started_at,
             updated_at=conv.updated_at,
-            message_count=msg_count or 0,
-            last_message=last_msg.content if last_msg else None,
-            bot_name=bot.name if bot else None,
-        ))
-    return result
+            message_count=conv.message_count or 0,
+            last_message=conv.last_message_preview,
+            bot_name=bot_name,
+        )
+        for conv, bot_name in rows
+    ]
 
 
 @app.get("/api/conversations/{conv_id}", response_model=ConversationDetailResponse)
-def get_conversation(conv_id: str, db: Session = Depends(get_db)):
-    conv = db.query(Conversation).filter(Conversation.id == conv_id).first()
+def get_conversation(conv_id: str, response: Response, cursor: Optional[str] = None,
+                     limit: int = MESSAGE_PAGE_SIZE, db: Session = Depends(get_db)):
+    """
+    A conversation with one page of its messages, oldest first.
+    Pass X-Next-Cursor back as ?cursor= to read the following messages.
+    """
+    conv = db.query(Conversation).options(noload(Conversation.messages)) \
+             .filter(Conversation.id == conv_id).first()
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conv
+
+    messages = paginate(
+        db.query(Message).filter(Message.conversation_id == conv_id),
+        Message.created_at, Message.id, cursor, page_size(limit, MESSAGE_PAGE_SIZE), response,
+        descending=False,
+    )
+    return ConversationDetailResponse(
+        id=conv.id,
+        chatbot_id=conv.chatbot_id,
+        session_id=conv.session_id,
+        visitor_name=conv.visitor_name,
+        status=conv.status,
+        started_at=conv.started_at,
+        updated_at=conv.updated_at,
+        messages=[MessageResponse.model_validate(m) for m in messages],
+    )
 
 
 @app.get("/api/analytics/dashboard", response_model=DashboardStats)
 def dashboard_stats(user_id: Optional[str] = None, bot_id: Optional[str] = None, db: Session = Depends(get_db)):
     bot_query = db.query(Chatbot)
     conv_query = db.query(Conversation)
-    msg_query = db.query(Message)
-    usage_query = db.query(Usage)
-    
+    # Totals come from the daily rollups (see analytics_rollup.py)
+    stats_query = db.query(
+        func.sum(DailyStat.conversations),
+        func.sum(DailyStat.messages),
+        func.sum(DailyStat.usage),
+        func.sum(DailyStat.messages).filter(DailyStat.day == utc_day()),
+    )
+
     if bot_id:
         bot_query = bot_query.filter(Chatbot.id == bot_id)
         conv_query = conv_query.filter(Conversation.chatbot_id == bot_id)
-        msg_query = msg_query.join(Conversation).filter(Conversation.chatbot_id == bot_id)
-        usage_query = usage_query.filter(Usage.chatbot_id == bot_id)
+        stats_query = stats_query.filter(DailyStat.chatbot_id == bot_id)
     elif user_id:
         bot_query = bot_query.filter(Chatbot.user_id == user_id)
         conv_query = conv_query.join(Chatbot).filter(Chatbot.user_id == user_id)
-        msg_query = msg_query.join(Conversation).join(Chatbot).filter(Chatbot.user_id == user_id)
-        usage_query = usage_query.join(Chatbot).filter(Chatbot.user_id == user_id)
+        stats_query = stats_query.join(Chatbot).filter(Chatbot.user_id == user_id)
 
     total_bots = bot_query.with_entities(func.count(Chatbot.id)).scalar() or 0
-    total_conversations = conv_query.with_entities(func.count(Conversation.id)).scalar() or 0
-    total_messages = msg_query.with_entities(func.count(Message.id)).scalar() or 0
-    total_usage = usage_query.with_entities(func.count(Usage.id)).scalar() or 0
-    
+    total_conversations, total_messages, total_usage, messages_today = stats_query.one()
+
     active_conversations = conv_query.filter(Conversation.status == "active") \
                                      .with_entities(func.count(Conversation.id)).scalar() or 0
 
-    # Messages today
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    messages_today = msg_query.filter(Message.created_at >= today_start) \
-                              .with_entities(func.count(Message.id)).scalar() or 0
-
     return DashboardStats(
         total_bots=total_bots,
-        total_conversations=total_conversations,
-        total_messages=total_messages,
-        total_usage=total_usage,
-        messages_today=messages_today,
+        total_conversations=total_conversations or 0,
+        total_messages=total_messages or 0,
+        total_usage=total_usage or 0,
+        messages_today=messages_today or 0,
         active_conversations=active_conversations,
     )
 
@@ -611,45 +862,30 @@ def dashboard_stats(user_id: Optional[str] = None, bot_id: Optional[str] = None,
 @app.get("/api/analytics/chart", response_model=List[ChartDataPoint])
 def chart_data(days: int = 30, user_id: Optional[str] = None, bot_id: Optional[str] = None, db: Session = Depends(get_db)):
     """Return daily conversation, message & visit counts for the last N days."""
-    result = []
-    now = datetime.now(timezone.utc)
-
-    for i in range(days - 1, -1, -1):
-        day = now - timedelta(days=i)
-        day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-
-        usage_query = db.query(func.count(Usage.id)).filter(
-            Usage.created_at >= day_start,
-            Usage.created_at < day_end,
-        )
-        msg_query = db.query(func.count(Message.id)).filter(
-            Message.created_at >= day_start,
-            Message.created_at < day_end,
-        )
-        visit_query = db.query(func.count(Visit.id)).filter(
-            Visit.created_at >= day_start,
-            Visit.created_at < day_end,
-        )
-
-        if bot_id:
-            usage_query = usage_query.filter(Usage.chatbot_id == bot_id)
-            msg_query = msg_query.join(Conversation).filter(Conversation.chatbot_id == bot_id)
-            visit_query = visit_query.filter(Visit.chatbot_id == bot_id)
-        elif user_id:
-            usage_query = usage_query.join(Chatbot).filter(Chatbot.user_id == user_id)
-            msg_query = msg_query.join(Conversation).join(Chatbot).filter(Chatbot.user_id == user_id)
-            visit_query = visit_query.join(Chatbot).filter(Chatbot.user_id == user_id)
-
-        usage_count = usage_query.scalar() or 0
-        msg_count = msg_query.scalar() or 0
-        visit_count = visit_query.scalar() or 0
+    today = utc_day()
+    start = today - timedelta(days=days - 1)
+
+    query = db.query(
+        DailyStat.day,
+        func.sum(DailyStat.usage),
+        func.sum(DailyStat.messages),
+        func.sum(DailyStat.visits),
+    ).filter(DailyStat.day >= start)
+    if bot_id:
+        query = query.filter(DailyStat.chatbot_id == bot_id)
+    elif user_id:
+        query = query.join(Chatbot).filter(Chatbot.user_id == user_id)
+    rows = {day: (usage, messages, visits) for day, usage, messages, visits in query.group_by(DailyStat.day)}
 
+    result = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        usage_count, msg_count, visit_count = rows.get(day, (0, 0, 0))
         result.append(ChartDataPoint(
-            label=day_start.strftime("%b %d"),
-            usage=usage_count,
-            messages=msg_count,
-            visits=visit_count,
+            label=day.strftime("%b %d"),
+            usage=usage_count or 0,
+            messages=msg_count or 0,
+            visits=visit_count or 0,
         ))
     return result
 
@@ -657,19 +893,20 @@ def chart_data(days: int = 30, user_id: Optional[str] = None, bot_id: Optional[s
 @app.get("/api/analytics/bots", response_model=List[BotStats])
 def bot_stats(db: Session = Depends(get_db)):
     """Per-bot conversation & message stats."""
-    bots = db.query(Chatbot).all()
-    result = []
-    for bot in bots:
-        conv_count = db.query(func.count(Conversation.id)).filter(
-            Conversation.chatbot_id == bot.id
-        ).scalar() or 0
-        msg_count = db.query(func.count(Message.id)).join(Conversation).filter(
-            Conversation.chatbot_id == bot.id
-        ).scalar() or 0
-        result.append(BotStats(
-            bot_id=bot.id,
-            bot_name=bot.name,
+    rows = db.query(
+        Chatbot.id,
+        Chatbot.name,
+        func.count(Conversation.id),
+        func.coalesce(func.sum(Conversation.message_count), 0),
+    ).outerjoin(Conversation, Conversation.chatbot_id == Chatbot.id) \
+     .group_by(Chatbot.id, Chatbot.name).all()
+
+    return [
+        BotStats(
+            bot_id=bot_id,
+            bot_name=bot_name,
             conversation_count=conv_count,
             message_count=msg_count,
-        ))
-    return result
+        )
+        for bot_id, bot_name, conv_count, msg_count in rows
+    ]
@@ -0,0 +1,219 @@
+"""
+Versioned Schema Migrations
+- Each migration has a version and runs exactly once per database; applied
+  versions are recorded in schema_migrations
+- A Postgres advisory lock serializes startup across workers, so only one
+  of them applies pending migrations
+- Index migrations use CREATE INDEX CONCURRENTLY (outside a transaction) so
+  writers are not blocked; an INVALID index left by an interrupted build is
+  dropped and rebuilt
+- The first versions replace the old ad-hoc run_migrations() checks and are
+  written to be no-ops on databases that already have those columns
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py status     # list applied / pending versions
+"""
+
+import sys
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from partitions import convert_to_partitioned, is_partitioned
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary app-wide key for pg_advisory_lock
+MIGRATION_LOCK_KEY = 727_412_001
+
+
+@dataclass
+class Migration:
+    version: str
+    description: str
+    statements: List[str] = field(default_factory=list)       # run in one transaction
+    # (index name, table, "CREATE INDEX CONCURRENTLY ..." tail after ON <table>)
+    concurrent_indexes: List[Tuple[str, str, str]] = field(default_factory=list)
+    run: Optional[Callable] = None          # run(conn) after statements, same transaction
+
+
+def _partition_event_tables(conn):
+    convert_to_partitioned(
+        conn, "messages",
+        "CONSTRAINT messages_conversation_id_fkey FOREIGN KEY (conversation_id) "
+        "REFERENCES conversations (id) ON DELETE CASCADE",
+        [("ix_messages_conversation_created", "(conversation_id, created_at, id)")],
+    )
+    convert_to_partitioned(
+        conn, "visits",
+        "CONSTRAINT visits_chatbot_id_fkey FOREIGN KEY (chatbot_id) REFERENCES chatbots (id) ON DELETE CASCADE",
+        [("ix_visits_chatbot_created", "(chatbot_id, created_at)")],
+    )
+    convert_to_partitioned(
+        conn, "usage_stats",
+        "CONSTRAINT usage_stats_chatbot_id_fkey FOREIGN KEY (chatbot_id) REFERENCES chatbots (id) ON DELETE CASCADE",
+        [("ix_usage_stats_chatbot_created", "(chatbot_id, created_at)")],
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        "0001", "knowledge_documents.error_message",
+        ["ALTER TABLE knowledge_documents ADD COLUMN IF NOT EXISTS error_message TEXT"],
+    ),
+    Migration(
+        "0002", "chatbots.max_context_tokens",
+        ["ALTER TABLE chatbots ADD COLUMN IF NOT EXISTS max_context_tokens INTEGER"],
+    ),
+    Migration(
+        "0003", "document_chunks.content_tsv full-text column",
+        ["ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+         "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED"],
+        [("ix_document_chunks_content_tsv", "document_chunks", "USING gin (content_tsv)")],
+    ),
+    Migration(
+        "0004", "conversation message summary columns",
+        [
+            "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0, "
+            "ADD COLUMN IF NOT EXISTS last_message_preview TEXT, "
+            "ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP",
+            # Only conversations that were never summarized
+            """
+            UPDATE conversations c SET
+                message_count = s.message_count,
+                last_message_preview = left(s.last_content, 200),
+                last_message_at = s.last_at
+            FROM (
+                SELECT DISTINCT ON (conversation_id) conversation_id,
+                       count(*) OVER (PARTITION BY conversation_id) AS message_count,
+                       content AS last_content, created_at AS last_at
+                FROM messages
+                ORDER BY conversation_id, created_at DESC
+            ) s
+            WHERE s.conversation_id = c.id AND c.last_message_at IS NULL
+            """,
+        ],
+        [("ix_conversations_chatbot_updated", "conversations", "(chatbot_id, updated_at)")],
+    ),
+    Migration(
+        "0005", "hot-path indexes",
+        concurrent_indexes=[
+            # Widget chat: active conversation of a session
+            ("ix_conversations_chatbot_session_status", "conversations", "(chatbot_id, session_id, status)"),
+            # The messages / visits / usage_stats indexes are built by 0006 on the
+            # partitioned tables; building them here would be thrown away
+            # Review summary by rating and the paged review list
+            ("ix_reviews_chatbot_rating", "reviews", "(chatbot_id, rating)"),
+            ("ix_reviews_chatbot_created", "reviews", "(chatbot_id, created_at, id)"),
+            # Exact vector search, lexical search and snapshot loads per bot
+            ("ix_document_chunks_chatbot", "document_chunks", "(chatbot_id)"),
+        ],
+    ),
+    Migration(
+        # Also creates their hot-path indexes (transcript pages, per-bot event counts)
+        "0006", "partition messages, visits and usage_stats by month",
+        run=_partition_event_tables,
+    ),
+    Migration(
+        "0007", "chatbots.retention_days",
+        ["ALTER TABLE chatbots ADD COLUMN IF NOT EXISTS retention_days INTEGER"],
+    ),
+    Migration(
+        "0008", "chatbots.knowledge_version",
+        ["ALTER TABLE chatbots ADD COLUMN IF NOT EXISTS knowledge_version BIGINT NOT NULL DEFAULT 0"],
+    ),
+    Migration(
+        "0009", "conversation list paged on started_at",
+        # NULL keys would drop out of keyset comparisons
+        ["UPDATE conversations SET started_at = coalesce(updated_at, now() AT TIME ZONE 'utc') "
+         "WHERE started_at IS NULL"],
+        [("ix_conversations_chatbot_started", "conversations", "(chatbot_id, started_at, id)")],
+    ),
+]
+
+
+def _ensure_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(32) PRIMARY KEY, description TEXT, "
+            "applied_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'))"
+        ))
+
+
+def applied_versions(engine) -> set:
+    _ensure_table(engine)
+    with engine.connect() as conn:
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars().all())
+
+
+def _create_index_concurrently(engine, name: str, table: str, definition: str):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        valid = conn.execute(text(
+            "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name"
+        ), {"name": name}).scalar()
+        if valid:
+            return
+        if valid is False:
+            logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        if is_partitioned(conn, table):
+            # Not supported on partitioned parents; the per-partition builds are short
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}"))
+        else:
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}"))
+
+
+def _apply(engine, migration: Migration):
+    logger.info(f"Applying migration {migration.version}: {migration.description}")
+    if migration.statements or migration.run:
+        with engine.begin() as conn:
+            for statement in migration.statements:
+                conn.execute(text(statement))
+            if migration.run:
+                migration.run(conn)
+    for name, table, definition in migration.concurrent_indexes:
+        _create_index_concurrently(engine, name, table, definition)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+            {"version": migration.version, "description": migration.description},
+        )
+
+
+def apply_migrations(engine) -> List[str]:
+    """Apply pending migrations in version order. Returns the versions applied."""
+    _ensure_table(engine)
+    applied: List[str] = []
+    # Session-level lock held on its own connection while the migrations run
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            done = applied_versions(engine)
+            for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+                if migration.version in done:
+                    continue
+                _apply(engine, migration)
+                applied.append(migration.version)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    return applied
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        done = applied_versions(engine)
+        for migration in MIGRATIONS:
+            state = "applied" if migration.version in done else "pending"
+            print(f"{migration.version}  {state:8s} {migration.description}")
+    else:
+        versions = apply_migrations(engine)
+        print(f"Applied {len(versions)} migration(s): {', '.join(versions) or 'none'}")
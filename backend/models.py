@@ -4,7 +4,8 @@ load_dotenv()
 import os
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, DateTime, Text, Integer, ForeignKey, Boolean
+from sqlalchemy import Column, String, DateTime, Date, Text, Integer, BigInteger, Float, ForeignKey, Boolean, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from pgvector.sqlalchemy import Vector
 from database import Base
@@ -12,6 +13,11 @@ from database import Base
 EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
 
 
+def utc_now() -> datetime:
+    """Naive UTC for the TIMESTAMP WITHOUT TIME ZONE columns (asyncpg rejects aware values)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -19,9 +25,8 @@ class User(Base):
     name = Column(String(100), nullable=True)
     email = Column(String(100), unique=True, index=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
-                        onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
 
     def to_dict(self):
         return {
@@ -44,10 +49,13 @@ class Chatbot(Base):
     text_color = Column(String(7), default="#FFFFFF")
     icon_url = Column(Text, nullable=True)
     position = Column(String(20), default="bottom-right")
+    max_context_tokens = Column(Integer, nullable=True)  # prompt budget; None = CONTEXT_TOKEN_BUDGET
+    retention_days = Column(Integer, nullable=True)      # raw event retention; None = keep (partitions.py)
+    # Bumped with every Q&A/document change; workers compare it to drop caches (knowledge_snapshot.py)
+    knowledge_version = Column(BigInteger, nullable=False, default=0, server_default="0")
     user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
-                        onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
 
     # Relationships
     knowledge_entries = relationship("KnowledgeEntry", back_populates="chatbot",
@@ -82,7 +90,7 @@ class KnowledgeEntry(Base):
     trigger = Column(Text, nullable=False)           # keyword/phrase that triggers the response
     response = Column(Text, nullable=False)           # the bot's custom response
     is_exact_match = Column(Boolean, default=False)   # True = exact match, False = contains match
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utc_now)
 
     chatbot = relationship("Chatbot", back_populates="knowledge_entries")
 
@@ -99,7 +107,7 @@ class KnowledgeDocument(Base):
     chunk_count = Column(Integer, default=0)
     status = Column(String(20), default="processing")  # processing, ready, error
     error_message = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utc_now)
 
     chatbot = relationship("Chatbot", back_populates="knowledge_documents")
     chunks = relationship("DocumentChunk", back_populates="document",
@@ -115,10 +123,64 @@ class DocumentChunk(Base):
     chatbot_id = Column(String, ForeignKey("chatbots.id", ondelete="CASCADE"), nullable=False)
     content = Column(Text, nullable=False)
     chunk_index = Column(Integer, default=0)
-    embedding = Column(Vector(EMBEDDING_DIM))  # Configurable dimension
+    embedding = Column(Vector(EMBEDDING_DIM))  # Configurable dimension; ANN index managed by vector_index.py
+    # Full-text search vector, maintained by Postgres (see lexical_search.py)
+    content_tsv = Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(content, ''))", persisted=True))
 
     document = relationship("KnowledgeDocument", back_populates="chunks")
 
+    # Indexes are also created by migrations.py on existing databases
+    __table_args__ = (
+        Index("ix_document_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+        Index("ix_document_chunks_chatbot", "chatbot_id"),
+    )
+
+
+class IngestionJob(Base):
+    """Durable processing job of an uploaded document (see ingestion.py)."""
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    document_id = Column(String, ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=False)
+    chatbot_id = Column(String, ForeignKey("chatbots.id", ondelete="CASCADE"), nullable=False)
+    filename = Column(String(500), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")   # queued, running, done, failed
+    stage = Column(String(20), nullable=True)          # last checkpoint: extracted, embedded
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    run_after = Column(DateTime, nullable=False, default=utc_now)
+    locked_by = Column(String(100), nullable=True)     # worker holding the job
+    locked_at = Column(DateTime, nullable=True)        # heartbeat of that worker
+    created_at = Column(DateTime, default=utc_now)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_ingestion_jobs_status_run_after", "status", "run_after"),
+        Index("ix_ingestion_jobs_chatbot_status", "chatbot_id", "status"),
+        Index("ix_ingestion_jobs_finished", "finished_at"),
+    )
+
+
+class IngestionChunk(Base):
+    """Chunks of a running job, staged with their embeddings batch by batch; copied to document_chunks when done."""
+    __tablename__ = "ingestion_chunks"
+
+    job_id = Column(String, ForeignKey("ingestion_jobs.id", ondelete="CASCADE"), primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    chunk_id = Column(String, nullable=False)          # id the document_chunks row will get
+    content = Column(Text, nullable=False)
+    embedding = Column(Vector(EMBEDDING_DIM), nullable=True)
+
+
+class QueryEmbedding(Base):
+    """Persistent tier of the query embedding cache (see embedding_cache.py)."""
+    __tablename__ = "query_embeddings"
+
+    key = Column(String(64), primary_key=True)         # sha256 of model + normalized query
+    model = Column(String(100), nullable=False)
+    embedding = Column(Vector(EMBEDDING_DIM))
+    created_at = Column(DateTime, default=utc_now)
+
 
 class Conversation(Base):
     """Tracks individual chat sessions on the widget."""
@@ -129,15 +191,24 @@ class Conversation(Base):
     session_id = Column(String, nullable=False)        # unique per browser visitor session
     visitor_name = Column(String(100), default="Visitor")
     status = Column(String(20), default="active")      # active, closed
-    started_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
-                        onupdate=lambda: datetime.now(timezone.utc))
+    # Summary of the messages, kept in step by conversation_store.py
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_preview = Column(Text, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
 
     chatbot = relationship("Chatbot", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation",
                              cascade="all, delete-orphan",
                              order_by="Message.created_at")
 
+    __table_args__ = (
+        Index("ix_conversations_chatbot_updated", "chatbot_id", "updated_at"),
+        Index("ix_conversations_chatbot_session_status", "chatbot_id", "session_id", "status"),
+        Index("ix_conversations_chatbot_started", "chatbot_id", "started_at", "id"),
+    )
+
 
 class Message(Base):
     """Individual messages within a conversation."""
@@ -148,10 +219,16 @@ class Message(Base):
                              nullable=False)
     sender = Column(String(10), nullable=False)        # "user" or "bot"
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Part of the key: the table is partitioned by month on it (see partitions.py)
+    created_at = Column(DateTime, primary_key=True, default=utc_now)
 
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
 
 class Review(Base):
     """User reviews/ratings for a chatbot."""
@@ -162,10 +239,15 @@ class Review(Base):
     rating = Column(Integer, nullable=False)           # 1-5 stars
     comment = Column(Text, nullable=True)
     session_id = Column(String, nullable=True)        # to link with a session if available
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=utc_now)
 
     chatbot = relationship("Chatbot")
 
+    __table_args__ = (
+        Index("ix_reviews_chatbot_rating", "chatbot_id", "rating"),
+        Index("ix_reviews_chatbot_created", "chatbot_id", "created_at", "id"),
+    )
+
 
 class Visit(Base):
     """Tracks when the chatbot widget is loaded on a website."""
@@ -174,10 +256,15 @@ class Visit(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     chatbot_id = Column(String, ForeignKey("chatbots.id", ondelete="CASCADE"), nullable=False)
     session_id = Column(String, nullable=True)        # unique per browser visitor session
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, primary_key=True, default=utc_now)
 
     chatbot = relationship("Chatbot")
 
+    __table_args__ = (
+        Index("ix_visits_chatbot_created", "chatbot_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
 
 class Usage(Base):
     """Tracks when a user has a conversation and closes the bot."""
@@ -186,6 +273,37 @@ class Usage(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     chatbot_id = Column(String, ForeignKey("chatbots.id", ondelete="CASCADE"), nullable=False)
     session_id = Column(String, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime, primary_key=True, default=utc_now)
 
     chatbot = relationship("Chatbot")
+
+    __table_args__ = (
+        Index("ix_usage_stats_chatbot_created", "chatbot_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class DailyStat(Base):
+    """Per-bot daily analytics counters, maintained incrementally (see analytics_rollup.py)."""
+    __tablename__ = "daily_stats"
+
+    chatbot_id = Column(String, ForeignKey("chatbots.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)               # UTC day
+    visits = Column(Integer, nullable=False, default=0)
+    messages = Column(Integer, nullable=False, default=0)
+    usage = Column(Integer, nullable=False, default=0)
+    conversations = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_daily_stats_day", "day"),
+    )
+
+
+class RateLimitBucket(Base):
+    """Shared token-bucket state for the widget rate limiter (see rate_limit.py)."""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String(255), primary_key=True)        # scope:kind:value
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)         # epoch seconds of the last refill
+    allowed = Column(Boolean, default=True)            # outcome of the last take
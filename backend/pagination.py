@@ -0,0 +1,68 @@
+"""
+Keyset Pagination
+- List endpoints page on a (timestamp, id) key instead of OFFSET, so page N
+  costs the same as page 1 and rows inserted meanwhile do not shift pages
+- The timestamp must never change after insert (created_at, started_at):
+  a row whose key moves while someone pages would be skipped or repeated
+- The cursor is an opaque urlsafe token of the last row's key; the next one
+  is returned in the X-Next-Cursor response header (absent on the last page)
+"""
+
+import json
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 20
+MESSAGE_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(moment: Optional[datetime], row_id: str) -> str:
+    raw = json.dumps([moment.isoformat() if moment else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        moment, row_id = json.loads(raw)
+        return (datetime.fromisoformat(moment) if moment else None), str(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_size(limit: Optional[int], default: int = DEFAULT_PAGE_SIZE) -> int:
+    return max(1, min(limit or default, MAX_PAGE_SIZE))
+
+
+def paginate(query: Query, time_col, id_col, cursor: Optional[str], limit: int,
+             response: Response, descending: bool = True) -> List:
+    """
+    One page of query ordered by (time_col, id_col), starting after cursor.
+    Sets X-Next-Cursor when more rows follow. Rows may be entities or tuples
+    whose first element is the entity carrying the key.
+    """
+    if cursor:
+        moment, row_id = decode_cursor(cursor)
+        key = tuple_(time_col, id_col)
+        query = query.filter(key < (moment, row_id) if descending else key > (moment, row_id))
+    if descending:
+        query = query.order_by(time_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(time_col.asc(), id_col.asc())
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0] if isinstance(rows[-1], Row) else rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, time_col.key), getattr(last, id_col.key)
+        )
+    return rows
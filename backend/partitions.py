@@ -0,0 +1,313 @@
+"""
+Time Partitioning and Retention (messages, visits, usage_stats)
+- The append-only event tables are range-partitioned by month on created_at
+  (messages_y2026m01, ...), plus a DEFAULT partition as a safety net
+- Partitions for the next PARTITION_MONTHS_AHEAD months are created on
+  startup and by the daily maintenance run
+- Retention per table (RETENTION_MONTHS_*): whole monthly partitions past
+  the window are dropped, or exported to gzip CSV under ARCHIVE_DIR first
+  (RETENTION_ACTION=archive)
+- Retention per tenant (chatbots.retention_days): that bot's older rows are
+  deleted (or archived) inside the partitions that can hold them
+- Analytics read daily_stats, so charts keep their history after raw rows go
+
+Maintenance from the command line:
+    python partitions.py maintain    # create future partitions + apply retention
+"""
+
+import os
+import sys
+import gzip
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "86400"))
+RETENTION_ACTION = os.getenv("RETENTION_ACTION", "drop").lower()      # drop, archive
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+
+# Months of raw rows kept per table; 0 keeps everything
+RETENTION_MONTHS = {
+    "messages": int(os.getenv("RETENTION_MONTHS_MESSAGES", "0")),
+    "visits": int(os.getenv("RETENTION_MONTHS_VISITS", "0")),
+    "usage_stats": int(os.getenv("RETENTION_MONTHS_USAGE", "0")),
+}
+
+PARTITIONED_TABLES = ("messages", "visits", "usage_stats")
+
+# Per-tenant archive exports (psycopg2 placeholders, fed to COPY)
+TENANT_EXPORT_SQL = {
+    "messages": "SELECT m.* FROM messages m JOIN conversations c ON c.id = m.conversation_id "
+                "WHERE c.chatbot_id = %(chatbot_id)s AND m.created_at < %(cutoff)s",
+    "visits": "SELECT * FROM visits WHERE chatbot_id = %(chatbot_id)s AND created_at < %(cutoff)s",
+    "usage_stats": "SELECT * FROM usage_stats WHERE chatbot_id = %(chatbot_id)s AND created_at < %(cutoff)s",
+}
+
+# Each returns the number of rows deleted. Deleting messages also keeps the
+# conversation summary columns (conversation_store.py) in step, in the same statement
+TENANT_DELETE_SQL = {
+    "messages": """
+        WITH deleted AS (
+            DELETE FROM messages m USING conversations c WHERE c.id = m.conversation_id
+            AND c.chatbot_id = :chatbot_id AND m.created_at < :cutoff
+            RETURNING m.conversation_id
+        ), removed AS (
+            SELECT conversation_id, count(*) AS n FROM deleted GROUP BY conversation_id
+        ), summaries AS (
+            UPDATE conversations c SET
+                message_count = greatest(c.message_count - removed.n, 0),
+                last_message_preview = CASE WHEN c.message_count - removed.n > 0
+                                            THEN c.last_message_preview END,
+                last_message_at = CASE WHEN c.message_count - removed.n > 0
+                                       THEN c.last_message_at END
+            FROM removed WHERE c.id = removed.conversation_id
+        )
+        SELECT count(*) FROM deleted
+    """,
+    "visits": "WITH deleted AS (DELETE FROM visits WHERE chatbot_id = :chatbot_id AND created_at < :cutoff "
+              "RETURNING 1) SELECT count(*) FROM deleted",
+    "usage_stats": "WITH deleted AS (DELETE FROM usage_stats WHERE chatbot_id = :chatbot_id "
+                   "AND created_at < :cutoff RETURNING 1) SELECT count(*) FROM deleted",
+}
+
+# Arbitrary app-wide key so only one worker runs maintenance at a time
+MAINTENANCE_LOCK_KEY = 727_412_002
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def _partition_bounds(name: str) -> Optional[date]:
+    """Month a partition covers, parsed from its name (None for DEFAULT / foreign names)."""
+    try:
+        suffix = name.rsplit("_y", 1)[1]
+        return date(int(suffix[:4]), int(suffix[5:7]), 1)
+    except (IndexError, ValueError):
+        return None
+
+
+def is_partitioned(conn, table: str) -> bool:
+    return bool(conn.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE relname = :table AND relnamespace = 'public'::regnamespace"),
+        {"table": table},
+    ).scalar())
+
+
+def list_partitions(conn, table: str) -> List[str]:
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table ORDER BY c.relname"
+    ), {"table": table}).scalars().all())
+
+
+def _default_has_rows(conn, table: str, month: date) -> bool:
+    default = f"{table}_default"
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": default}).scalar() is None:
+        return False
+    return bool(conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end)"),
+        {"start": month, "end": add_months(month, 1)},
+    ).scalar())
+
+
+def _split_default(conn, table: str, name: str, month: date):
+    """
+    Create a month whose rows already landed in DEFAULT: Postgres refuses the
+    new partition while DEFAULT holds rows of its range, so detach DEFAULT,
+    create the month, move the rows into it and attach DEFAULT again.
+    """
+    default = f"{table}_default"
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE created_at >= :start AND created_at < :end RETURNING *) "
+        f"INSERT INTO {table} SELECT * FROM moved"
+    ), {"start": month, "end": add_months(month, 1)}).rowcount
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    logger.warning(f"Moved {moved} rows of {table} from the DEFAULT partition into {name}")
+
+
+def create_partitions(conn, table: str, first: date, last: date):
+    """
+    Monthly partitions covering [first month, last month] and the DEFAULT
+    one; rows of a missing month already in DEFAULT are moved into it.
+    """
+    existing = set(list_partitions(conn, table))
+    month = month_start(first)
+    while month <= last:
+        name = partition_name(table, month)
+        if name not in existing:
+            if _default_has_rows(conn, table, month):
+                _split_default(conn, table, name, month)
+            else:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                ))
+        month = add_months(month, 1)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+
+
+def ensure_partitions(engine):
+    """Create this month's and the next PARTITION_MONTHS_AHEAD months' partitions."""
+    this_month = month_start(datetime.now(timezone.utc).date())
+    for table in PARTITIONED_TABLES:
+        try:
+            with engine.begin() as conn:
+                if is_partitioned(conn, table):
+                    create_partitions(conn, table, this_month, add_months(this_month, PARTITION_MONTHS_AHEAD))
+        except Exception as e:
+            logger.error(f"Creating partitions for {table} failed: {e}")
+
+
+def convert_to_partitioned(conn, table: str, foreign_key: str, indexes: List[Tuple[str, str]]):
+    """
+    Rebuild a plain table as a monthly-partitioned one, copying its rows
+    (used by migrations.py; runs inside the migration's transaction and
+    locks the table while the rows are copied).
+    """
+    if is_partitioned(conn, table):
+        return
+    legacy = f"{table}_legacy"
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    conn.execute(text(f"ALTER INDEX {table}_pkey RENAME TO {legacy}_pkey"))
+    for name, _ in indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    conn.execute(text(f"UPDATE {legacy} SET created_at = now() AT TIME ZONE 'utc' WHERE created_at IS NULL"))
+
+    # The partition key has to be part of the primary key
+    conn.execute(text(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS, PRIMARY KEY (id, created_at)) "
+        f"PARTITION BY RANGE (created_at)"
+    ))
+    conn.execute(text(f"ALTER TABLE {table} ADD {foreign_key}"))
+
+    oldest = conn.execute(text(f"SELECT min(created_at) FROM {legacy}")).scalar()
+    this_month = month_start(datetime.now(timezone.utc).date())
+    first = month_start(oldest.date()) if oldest else this_month
+    create_partitions(conn, table, min(first, this_month), add_months(this_month, PARTITION_MONTHS_AHEAD))
+
+    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}"))
+    conn.execute(text(f"DROP TABLE {legacy}"))
+    for name, columns in indexes:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {columns}"))
+
+
+# ─── Retention ──────────────────────────────────────────
+
+def _archive_path(label: str) -> str:
+    """A new file per export: runs on the same day must not replace earlier archives."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    return os.path.join(ARCHIVE_DIR, f"{label}_{stamp}.csv.gz")
+
+
+def _export(conn, select_sql: str, params: Optional[dict], label: str):
+    """
+    COPY the rows of select_sql to ARCHIVE_DIR/<label>_<timestamp>.csv.gz in
+    the caller's transaction. The file is created exclusively and fsynced
+    before returning, so the caller only deletes rows that are on disk.
+    """
+    raw = conn.connection.dbapi_connection
+    with raw.cursor() as cursor:
+        query = cursor.mogrify(select_sql, params).decode()
+        with open(_archive_path(label), "xb") as f:
+            with gzip.GzipFile(fileobj=f, mode="wb") as out:
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", out)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def apply_table_retention(engine, table: str, months: int) -> List[str]:
+    """Drop (or archive, then drop) monthly partitions entirely older than the window."""
+    if months <= 0:
+        return []
+    cutoff = add_months(month_start(datetime.now(timezone.utc).date()), -months)
+    removed = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn, table):
+            return []
+        for name in list_partitions(conn, table):
+            month = _partition_bounds(name)
+            if month is None or add_months(month, 1) > cutoff:
+                continue
+            if RETENTION_ACTION == "archive":
+                _export(conn, f"SELECT * FROM {name}", None, name)
+            conn.execute(text(f"DROP TABLE {name}"))
+            removed.append(name)
+    if removed:
+        logger.info(f"Retention removed {', '.join(removed)}")
+    return removed
+
+
+def apply_tenant_retention(engine) -> int:
+    """Remove rows older than each bot's retention_days; returns rows deleted."""
+    deleted = 0
+    with engine.connect() as conn:
+        bots = conn.execute(text(
+            "SELECT id, retention_days FROM chatbots WHERE retention_days IS NOT NULL AND retention_days > 0"
+        )).all()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for bot_id, days in bots:
+        params = {"chatbot_id": bot_id, "cutoff": now - timedelta(days=days)}
+        with engine.begin() as conn:
+            for table in PARTITIONED_TABLES:
+                if RETENTION_ACTION == "archive":
+                    _export(conn, TENANT_EXPORT_SQL[table], params, f"{table}_{bot_id}")
+                deleted += conn.execute(text(TENANT_DELETE_SQL[table]), params).scalar()
+    return deleted
+
+
+def maintain(engine):
+    """Future partitions + retention, run by one worker at a time."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}).scalar():
+            return
+        try:
+            ensure_partitions(engine)
+            for table, months in RETENTION_MONTHS.items():
+                apply_table_retention(engine, table, months)
+            deleted = apply_tenant_retention(engine)
+            if deleted:
+                logger.info(f"Per-bot retention deleted {deleted} rows")
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+
+
+async def run_maintenance_loop(engine):
+    """Background task started from the app lifespan."""
+    while True:
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+        try:
+            await asyncio.to_thread(maintain, engine)
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "maintain":
+        print("usage: python partitions.py maintain")
+        sys.exit(1)
+    maintain(engine)
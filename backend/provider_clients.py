@@ -0,0 +1,142 @@
+"""
+Provider Client Registry
+- One long-lived sync and async OpenAI client per provider (OpenAI / Ollama)
+- Shared httpx connection pools with keep-alive and HTTP/2 when `h2` is installed
+- Pool limits and timeouts configurable via environment variables
+- Reports pool usage so saturation shows up before requests start queueing
+"""
+
+import os
+import threading
+import logging
+from typing import Dict, Optional
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_MAX_CONNECTIONS = int(os.getenv("PROVIDER_MAX_CONNECTIONS", "100"))
+PROVIDER_MAX_KEEPALIVE = int(os.getenv("PROVIDER_MAX_KEEPALIVE", "20"))
+PROVIDER_KEEPALIVE_EXPIRY = float(os.getenv("PROVIDER_KEEPALIVE_EXPIRY", "30"))
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "60"))
+PROVIDER_CONNECT_TIMEOUT = float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "5"))
+PROVIDER_POOL_TIMEOUT = float(os.getenv("PROVIDER_POOL_TIMEOUT", "10"))
+PROVIDER_HTTP2 = os.getenv("PROVIDER_HTTP2", "true").lower() in ("1", "true", "yes")
+
+
+def _http2_available() -> bool:
+    if not PROVIDER_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _pool_stats(http_client) -> dict:
+    """Read connection usage from httpx's underlying httpcore pool."""
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for c in connections if c.is_idle())
+    requests = list(getattr(pool, "_requests", []) or [])
+    queued = sum(1 for r in requests if getattr(r, "is_queued", lambda: False)())
+    active = len(connections) - idle
+    return {
+        "connections": len(connections),
+        "active": active,
+        "idle": idle,
+        "queued": queued,
+        "saturation": round(active / PROVIDER_MAX_CONNECTIONS, 3) if PROVIDER_MAX_CONNECTIONS else 0.0,
+    }
+
+
+class ProviderClientManager:
+    """
+    Process-wide registry of pooled provider clients.
+    `providers` maps a provider name to the keyword arguments for the
+    OpenAI constructor (api_key, base_url).
+    """
+
+    def __init__(self, providers: Dict[str, dict]):
+        self._providers = providers
+        self._lock = threading.Lock()
+        self._http2 = _http2_available()
+        self._sync: Dict[str, OpenAI] = {}
+        self._async: Dict[str, AsyncOpenAI] = {}
+
+    def _http_options(self) -> dict:
+        return {
+            # trust_env=False avoids the "proxies" error in some environments
+            "trust_env": False,
+            "http2": self._http2,
+            "limits": httpx.Limits(
+                max_connections=PROVIDER_MAX_CONNECTIONS,
+                max_keepalive_connections=PROVIDER_MAX_KEEPALIVE,
+                keepalive_expiry=PROVIDER_KEEPALIVE_EXPIRY,
+            ),
+            "timeout": httpx.Timeout(
+                PROVIDER_TIMEOUT,
+                connect=PROVIDER_CONNECT_TIMEOUT,
+                pool=PROVIDER_POOL_TIMEOUT,
+            ),
+        }
+
+    def _settings(self, provider: str) -> dict:
+        if provider not in self._providers:
+            raise ValueError(f"Unknown AI provider: {provider}")
+        return self._providers[provider]
+
+    def get(self, provider: str) -> OpenAI:
+        client = self._sync.get(provider)
+        if client is None:
+            with self._lock:
+                client = self._sync.get(provider)
+                if client is None:
+                    client = OpenAI(
+                        http_client=httpx.Client(**self._http_options()),
+                        **self._settings(provider),
+                    )
+                    self._sync[provider] = client
+        return client
+
+    def get_async(self, provider: str) -> AsyncOpenAI:
+        client = self._async.get(provider)
+        if client is None:
+            with self._lock:
+                client = self._async.get(provider)
+                if client is None:
+                    client = AsyncOpenAI(
+                        http_client=httpx.AsyncClient(**self._http_options()),
+                        **self._settings(provider),
+                    )
+                    self._async[provider] = client
+        return client
+
+    def close(self):
+        """Close the sync clients (used by worker threads and scripts)."""
+        with self._lock:
+            clients, self._sync = self._sync, {}
+        for client in clients.values():
+            client.close()
+
+    async def aclose(self):
+        """Close every pooled client. Call once on application shutdown."""
+        with self._lock:
+            clients, self._async = self._async, {}
+        for client in clients.values():
+            await client.close()
+        self.close()
+
+    def stats(self) -> dict:
+        result = {}
+        for kind, clients in (("sync", self._sync), ("async", self._async)):
+            for provider, client in list(clients.items()):
+                result.setdefault(provider, {})[kind] = _pool_stats(client._client)
+        return {
+            "http2": self._http2,
+            "max_connections": PROVIDER_MAX_CONNECTIONS,
+            "max_keepalive": PROVIDER_MAX_KEEPALIVE,
+            "providers": result,
+        }
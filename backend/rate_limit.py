@@ -0,0 +1,257 @@
+"""
+Widget Rate Limiting (token buckets)
+- Public widget endpoints are limited per client IP, per widget session and
+  per bot, each with its own bucket (capacity / refill period)
+- Runs as a FastAPI dependency, so over-limit requests get 429 Retry-After
+  before the handler touches the database or the AI provider
+- Bucket state lives in a pluggable store: "memory" (per process, default)
+  or "postgres" (rate_limit_buckets table, shared by every worker)
+- Behind a reverse proxy the client IP comes from X-Forwarded-For, read
+  right to left past the proxies in RATE_LIMIT_TRUSTED_PROXIES, so a client
+  cannot pick its own bucket by sending the header itself
+"""
+
+import os
+import math
+import ipaddress
+import time
+import random
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import text
+
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory").lower()      # memory, postgres
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+# Comma-separated proxy addresses/CIDRs; empty = only the directly connected peer
+RATE_LIMIT_TRUSTED_PROXIES = [
+    ipaddress.ip_network(cidr.strip(), strict=False)
+    for cidr in os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if cidr.strip()
+]
+
+# "<requests>/<seconds>" per key kind; empty disables that bucket
+RATE_LIMITS = {
+    "chat": {
+        "ip": os.getenv("RATE_LIMIT_CHAT_IP", "30/60"),
+        "session": os.getenv("RATE_LIMIT_CHAT_SESSION", "10/60"),
+        "bot": os.getenv("RATE_LIMIT_CHAT_BOT", "600/60"),
+    },
+    "widget": {
+        "ip": os.getenv("RATE_LIMIT_WIDGET_IP", "120/60"),
+        "session": os.getenv("RATE_LIMIT_WIDGET_SESSION", "30/60"),
+        "bot": os.getenv("RATE_LIMIT_WIDGET_BOT", "3000/60"),
+    },
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised by the limiter dependency; maps to 429 Retry-After."""
+
+    def __init__(self, scope: str, kind: str, retry_after: int):
+        super().__init__(f"{scope} rate limit exceeded for {kind}")
+        self.scope = scope
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+def parse_limit(spec: str) -> Optional[Tuple[float, float]]:
+    """'20/60' -> (capacity 20, refill 20/60 tokens per second)."""
+    if not spec:
+        return None
+    count, _, period = spec.partition("/")
+    capacity = float(count)
+    return capacity, capacity / float(period or 1)
+
+
+class MemoryBucketStore:
+    """Per-process buckets; each worker enforces its own share of the limit."""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}   # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    async def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._calls += 1
+            if self._calls % 10000 == 0:
+                self._prune(now)
+        return allowed, tokens
+
+    async def take_all(self, buckets: List[Tuple[str, float, float]]) -> Optional[Tuple[int, float]]:
+        """Take a token from each (key, capacity, rate) in order; (index, tokens) of the first refusal."""
+        for index, (key, capacity, rate) in enumerate(buckets):
+            allowed, tokens = await self.take(key, capacity, rate)
+            if not allowed:
+                return index, tokens
+        return None
+
+    def _prune(self, now: float):
+        # Idle buckets would be full again by now; forgetting them changes nothing
+        idle = 3600.0
+        for key in [k for k, (_, updated) in self._buckets.items() if now - updated > idle]:
+            del self._buckets[key]
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class PostgresBucketStore:
+    """Buckets in the rate_limit_buckets table, refilled and taken in one UPSERT."""
+
+    TAKE_SQL = text("""
+        INSERT INTO rate_limit_buckets AS b (key, tokens, updated_at, allowed)
+        VALUES (:key, :initial, :now, true)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = CASE
+                WHEN LEAST(:capacity, b.tokens + (:now - b.updated_at) * :rate) >= :cost
+                THEN LEAST(:capacity, b.tokens + (:now - b.updated_at) * :rate) - :cost
+                ELSE LEAST(:capacity, b.tokens + (:now - b.updated_at) * :rate)
+            END,
+            allowed = LEAST(:capacity, b.tokens + (:now - b.updated_at) * :rate) >= :cost,
+            updated_at = :now
+        RETURNING allowed, tokens
+    """)
+
+    async def take_all(self, buckets: List[Tuple[str, float, float]]) -> Optional[Tuple[int, float]]:
+        """
+        Take a token from each (key, capacity, rate) in order, all in one
+        transaction (one commit per request); (index, tokens) of the first refusal.
+        """
+        now = time.time()
+        refused = None
+        async with AsyncSessionLocal() as db:
+            for index, (key, capacity, rate) in enumerate(buckets):
+                row = (await db.execute(
+                    self.TAKE_SQL,
+                    {"key": key, "initial": capacity - 1.0, "capacity": capacity,
+                     "rate": rate, "cost": 1.0, "now": now}
+                )).first()
+                if not row[0]:
+                    refused = index, float(row[1])
+                    break
+            if random.random() < 0.001:
+                await db.execute(
+                    text("DELETE FROM rate_limit_buckets WHERE updated_at < :cutoff"),
+                    {"cutoff": now - 3600}
+                )
+            await db.commit()
+        return refused
+
+    def size(self) -> int:
+        return -1
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    """
+    The connecting address, or with RATE_LIMIT_TRUST_PROXY the first
+    X-Forwarded-For hop (from the right) that is not one of our proxies.
+    Entries left of it were written by the client and are ignored.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not RATE_LIMIT_TRUST_PROXY:
+        return peer
+    if RATE_LIMIT_TRUSTED_PROXIES and not _is_trusted_proxy(peer):
+        return peer
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded:
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+async def _session_id(request: Request) -> Optional[str]:
+    session_id = request.query_params.get("session_id")
+    if session_id:
+        return session_id
+    if request.method == "POST" and request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            # FastAPI has already read the body for the handler; this hits its cache
+            body = await request.json()
+        except ValueError:
+            return None
+        if isinstance(body, dict) and body.get("session_id"):
+            return str(body["session_id"])
+    return None
+
+
+class RateLimiter:
+    def __init__(self, store):
+        self.store = store
+        self.allowed = 0
+        self.rejected: Dict[str, int] = {}
+
+    async def check(self, scope: str, keys: List[Tuple[str, str]]):
+        """Take one token from each (kind, value) bucket of the scope or raise RateLimitExceeded."""
+        kinds: List[str] = []
+        buckets: List[Tuple[str, float, float]] = []
+        for kind, value in keys:
+            limit = parse_limit(RATE_LIMITS[scope][kind])
+            if limit is None or not value:
+                continue
+            kinds.append(kind)
+            buckets.append((f"{scope}:{kind}:{value}", *limit))
+        refused = await self.store.take_all(buckets) if buckets else None
+        if refused is not None:
+            index, tokens = refused
+            kind, rate = kinds[index], buckets[index][2]
+            label = f"{scope}:{kind}"
+            self.rejected[label] = self.rejected.get(label, 0) + 1
+            raise RateLimitExceeded(scope, kind, max(1, math.ceil((1.0 - tokens) / rate)))
+        self.allowed += 1
+
+    def dependency(self, scope: str):
+        """FastAPI dependency limiting a widget route by IP, session and bot."""
+        async def limit(request: Request):
+            if not RATE_LIMIT_ENABLED:
+                return
+            keys = [
+                ("ip", client_ip(request)),
+                ("session", await _session_id(request)),
+                ("bot", request.path_params.get("bot_id")),
+            ]
+            try:
+                await self.check(scope, keys)
+            except RateLimitExceeded:
+                raise
+            except Exception as e:
+                # A broken store must not take the widget down with it
+                logger.error(f"Rate limiter error: {e}")
+        return limit
+
+    def stats(self) -> dict:
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "store": RATE_LIMIT_STORE,
+            "buckets": self.store.size(),
+            "allowed": self.allowed,
+            "rejected": dict(self.rejected),
+        }
+
+
+rate_limiter = RateLimiter(PostgresBucketStore() if RATE_LIMIT_STORE == "postgres" else MemoryBucketStore())
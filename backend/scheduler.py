@@ -0,0 +1,178 @@
+"""
+LLM Admission Control
+- Caps concurrent AI replies globally (LLM_MAX_CONCURRENCY) and per bot
+  (LLM_MAX_CONCURRENCY_PER_BOT) so one busy tenant cannot exhaust the
+  provider rate limit or a local Ollama box
+- Requests over the cap wait in a bounded FIFO queue; a request whose
+  expected wait exceeds LLM_QUEUE_TIMEOUT, or that finds the queue full,
+  is rejected at once with a Retry-After hint (HTTP 429)
+- Queue depth, wait times and rejections are exposed for /api/health/stats
+"""
+
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_CONCURRENCY_PER_BOT = int(os.getenv("LLM_MAX_CONCURRENCY_PER_BOT", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+LLM_MAX_QUEUE_PER_BOT = int(os.getenv("LLM_MAX_QUEUE_PER_BOT", "20"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+
+WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """Raised when a chat turn cannot be admitted; maps to 429 Retry-After."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("chatbot_id", "future", "deadline")
+
+    def __init__(self, chatbot_id: str, future: asyncio.Future, deadline: float):
+        self.chatbot_id = chatbot_id
+        self.future = future
+        self.deadline = deadline
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int, max_per_bot: int, max_queue: int,
+                 max_queue_per_bot: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_per_bot = max_per_bot
+        self.max_queue = max_queue
+        self.max_queue_per_bot = max_queue_per_bot
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._active_by_bot: Dict[str, int] = {}
+        self._queue: Deque[_Waiter] = deque()
+        self._queued_by_bot: Dict[str, int] = {}
+        # Recent service and wait times (seconds) for Retry-After estimates and metrics
+        self._service_times: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._wait_times: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_queue_depth = 0
+
+    def _can_run(self, chatbot_id: str) -> bool:
+        return (self._active < self.max_concurrency
+                and self._active_by_bot.get(chatbot_id, 0) < self.max_per_bot)
+
+    def _grant(self, chatbot_id: str):
+        self._active += 1
+        self._active_by_bot[chatbot_id] = self._active_by_bot.get(chatbot_id, 0) + 1
+        self.admitted += 1
+
+    def _avg_service_time(self) -> float:
+        return sum(self._service_times) / len(self._service_times) if self._service_times else 2.0
+
+    def _expected_wait(self, chatbot_id: str) -> float:
+        """Rough wait for a new arrival: queued work drained by the slots it can use."""
+        service = self._avg_service_time()
+        ahead_global = len(self._queue) + 1
+        ahead_bot = self._queued_by_bot.get(chatbot_id, 0) + 1
+        return max(service * ahead_global / self.max_concurrency,
+                   service * ahead_bot / self.max_per_bot)
+
+    def _reject(self, reason: str, chatbot_id: str):
+        self.rejected += 1
+        raise AdmissionRejected(reason, max(1, math.ceil(self._expected_wait(chatbot_id))))
+
+    async def acquire(self, chatbot_id: str):
+        """Wait for a slot for this bot, or raise AdmissionRejected. Pair with release()."""
+        if self._can_run(chatbot_id):
+            self._grant(chatbot_id)
+            self._wait_times.append(0.0)
+            return
+
+        if len(self._queue) >= self.max_queue:
+            self._reject("queue full", chatbot_id)
+        if self._queued_by_bot.get(chatbot_id, 0) >= self.max_queue_per_bot:
+            self._reject("bot queue full", chatbot_id)
+        if self._service_times and self._expected_wait(chatbot_id) > self.queue_timeout:
+            # Would not be served before its deadline: fail fast instead
+            self._reject("expected wait exceeds deadline", chatbot_id)
+
+        enqueued_at = time.monotonic()
+        waiter = _Waiter(chatbot_id, asyncio.get_running_loop().create_future(),
+                         enqueued_at + self.queue_timeout)
+        self._queue.append(waiter)
+        self._queued_by_bot[chatbot_id] = self._queued_by_bot.get(chatbot_id, 0) + 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._dequeue(waiter)
+                self.timed_out += 1
+                self._reject("queue timeout", chatbot_id)
+        except asyncio.CancelledError:
+            # Client went away: give back the slot if it was granted meanwhile
+            if waiter.future.done():
+                self.release(chatbot_id)
+            else:
+                self._dequeue(waiter)
+            raise
+        self._wait_times.append(time.monotonic() - enqueued_at)
+
+    def _dequeue(self, waiter: _Waiter):
+        try:
+            self._queue.remove(waiter)
+        except ValueError:
+            return
+        self._queued_by_bot[waiter.chatbot_id] -= 1
+        if not self._queued_by_bot[waiter.chatbot_id]:
+            del self._queued_by_bot[waiter.chatbot_id]
+
+    def release(self, chatbot_id: str, service_time: Optional[float] = None):
+        self._active -= 1
+        self._active_by_bot[chatbot_id] -= 1
+        if not self._active_by_bot[chatbot_id]:
+            del self._active_by_bot[chatbot_id]
+        if service_time is not None:
+            self._service_times.append(service_time)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant freed slots to queued requests in arrival order, skipping capped bots."""
+        now = time.monotonic()
+        for waiter in list(self._queue):
+            if self._active >= self.max_concurrency:
+                break
+            if waiter.future.done() or waiter.deadline <= now:
+                continue  # its own timeout handler removes it
+            if self._can_run(waiter.chatbot_id):
+                self._dequeue(waiter)
+                self._grant(waiter.chatbot_id)
+                waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        waits: List[float] = sorted(self._wait_times)
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "max_per_bot": self.max_per_bot,
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(1000 * sum(waits) / len(waits), 1) if waits else 0.0,
+            "p95_wait_ms": round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0,
+            "avg_service_ms": round(1000 * self._avg_service_time(), 1),
+        }
+
+
+llm_scheduler = LLMScheduler(
+    LLM_MAX_CONCURRENCY, LLM_MAX_CONCURRENCY_PER_BOT, LLM_MAX_QUEUE,
+    LLM_MAX_QUEUE_PER_BOT, LLM_QUEUE_TIMEOUT,
+)
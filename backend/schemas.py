@@ -36,6 +36,8 @@ class ChatbotCreate(BaseModel):
     bubble_color: str = "#4361EE"
     text_color: str = "#FFFFFF"
     position: str = "bottom-right"
+    max_context_tokens: Optional[int] = None
+    retention_days: Optional[int] = None
 
 
 class ChatbotUpdate(BaseModel):
@@ -46,6 +48,8 @@ class ChatbotUpdate(BaseModel):
     bubble_color: Optional[str] = None
     text_color: Optional[str] = None
     position: Optional[str] = None
+    max_context_tokens: Optional[int] = None
+    retention_days: Optional[int] = None
 
 
 class ChatbotResponse(BaseModel):
@@ -59,6 +63,8 @@ class ChatbotResponse(BaseModel):
     text_color: str
     icon_url: Optional[str] = None
     position: str
+    max_context_tokens: Optional[int] = None
+    retention_days: Optional[int] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -0,0 +1,117 @@
+"""
+Semantic Answer Cache
+- Per-chatbot store of (question embedding → generated answer)
+- A new question within SEMANTIC_CACHE_THRESHOLD cosine similarity of a
+  cached one gets the stored answer without an LLM call
+- Entries are tagged with the bot's knowledge version (knowledge_snapshot.py),
+  so any change to its documents or Q&A entries invalidates them
+"""
+
+import os
+import time
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "500"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+
+
+class _BotAnswers:
+    """Cached answers of one chatbot, searched with a single matrix product."""
+
+    def __init__(self, version: int):
+        self.version = version
+        self.vectors: List[np.ndarray] = []
+        self.answers: List[str] = []
+        self.expires: List[float] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self.vectors)
+        return self._matrix
+
+    def add(self, vector: np.ndarray, answer: str, expires_at: float, max_entries: int):
+        self.vectors.append(vector)
+        self.answers.append(answer)
+        self.expires.append(expires_at)
+        if len(self.vectors) > max_entries:
+            # Oldest entries go first
+            drop = len(self.vectors) - max_entries
+            del self.vectors[:drop], self.answers[:drop], self.expires[:drop]
+        self._matrix = None
+
+
+def _unit(embedding) -> Optional[np.ndarray]:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if not norm:
+        return None
+    return vector / norm
+
+
+class SemanticCache:
+    def __init__(self, threshold: float, max_entries: int, ttl: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._bots: Dict[str, _BotAnswers] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, chatbot_id: str, embedding, version: int) -> Optional[str]:
+        bot = self._bots.get(chatbot_id)
+        query = _unit(embedding)
+        if bot is not None and bot.version < version:
+            # Answers were generated from older knowledge
+            self._bots.pop(chatbot_id, None)
+            bot = None
+        if bot is None or bot.version != version or not bot.vectors or query is None:
+            self.misses += 1
+            return None
+
+        with self._lock:
+            similarities = bot.matrix() @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold and bot.expires[best] > time.monotonic():
+                self.hits += 1
+                return bot.answers[best]
+        self.misses += 1
+        return None
+
+    def store(self, chatbot_id: str, embedding, answer: str, version: int):
+        """Cache an answer generated from the given knowledge version."""
+        vector = _unit(embedding)
+        if vector is None or not answer:
+            return
+        with self._lock:
+            bot = self._bots.get(chatbot_id)
+            if bot is not None and bot.version > version:
+                return
+            if bot is None or bot.version < version:
+                bot = self._bots[chatbot_id] = _BotAnswers(version)
+            bot.add(vector, answer, time.monotonic() + self.ttl, self.max_entries)
+
+    def drop_bot(self, chatbot_id: str):
+        with self._lock:
+            self._bots.pop(chatbot_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            "threshold": self.threshold,
+            "bots": len(self._bots),
+            "entries": sum(len(b.answers) for b in list(self._bots.values())),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+semantic_cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_TTL)
@@ -0,0 +1,104 @@
+"""
+Single-Flight Request Coalescing
+- Concurrent identical chat questions share one in-flight computation,
+  keyed by (chatbot_id, normalized message, knowledge version)
+- The computation runs as its own task and broadcasts its text deltas, so
+  streaming and non-streaming callers can join the same flight and a
+  disconnecting leader does not cancel it for the others
+- Callers still persist their own Message rows
+"""
+
+import asyncio
+import logging
+import traceback
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+from embedding_cache import normalize_query
+from knowledge_snapshot import knowledge_version
+
+logger = logging.getLogger(__name__)
+
+
+def flight_key(chatbot_id: str, user_message: str) -> tuple:
+    return (chatbot_id, normalize_query(user_message), knowledge_version(chatbot_id))
+
+
+class _Flight:
+    """Deltas produced so far by one computation, replayable by late joiners."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    def _notify(self):
+        wake, self._wake = self._wake, asyncio.Event()
+        wake.set()
+
+    def publish(self, delta: str):
+        self.parts.append(delta)
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            while i < len(self.parts):
+                yield self.parts[i]
+                i += 1
+            if self.done:
+                return
+            await self._wake.wait()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    def stream(self, key: Hashable, factory: Optional[Callable[[], AsyncIterator[str]]]) -> AsyncIterator[str]:
+        """
+        Deltas of the computation for key. factory() is only called when no
+        identical computation is in flight (pass None only after checking
+        in_flight()); it yields nothing on failure.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        return flight.subscribe()
+
+    async def _run(self, key: Hashable, flight: _Flight, factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for delta in factory():
+                flight.publish(delta)
+        except Exception as e:
+            logger.error(f"Coalesced AI response error: {e}")
+            traceback.print_exc()
+        finally:
+            flight.finish()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> dict:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_ratio": round(self.followers / total, 3) if total else 0.0,
+        }
+
+
+chat_flights = SingleFlight()
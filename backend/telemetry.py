@@ -0,0 +1,181 @@
+"""
+Widget Telemetry Ingester
+- Visit, Usage and Review rows from the public widget are buffered in memory
+  and written by a background task in multi-row INSERT batches, so widget
+  config loads and beacons return without waiting on a commit
+- Flushes every TELEMETRY_FLUSH_INTERVAL seconds, sooner once
+  TELEMETRY_BATCH_SIZE rows are waiting, and on shutdown
+- A crash loses at most the rows buffered since the last flush; failed
+  flushes are retried while the buffer stays under TELEMETRY_MAX_BUFFER
+"""
+
+import os
+import uuid
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from database import AsyncSessionLocal
+from models import Chatbot, Visit, Usage, Review, utc_now
+from analytics_rollup import RollupDelta
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "2"))
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "500"))
+TELEMETRY_MAX_BUFFER = int(os.getenv("TELEMETRY_MAX_BUFFER", "100000"))
+TELEMETRY_MAX_EVENTS = int(os.getenv("TELEMETRY_MAX_EVENTS", "20"))   # per beacon
+
+# Buffered tables, flushed in this order
+TABLES = {"visit": Visit, "usage": Usage, "review": Review}
+
+
+class TelemetryIngester:
+    def __init__(self, flush_interval: float, batch_size: int, max_buffer: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._buffers: Dict[str, List[dict]] = {kind: [] for kind in TABLES}
+        self._size = 0
+        # Endpoints record from the threadpool as well as the event loop
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+        self.recorded: Dict[str, int] = {kind: 0 for kind in TABLES}
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    # ── Recording ──
+
+    def _record(self, kind: str, row: dict) -> str:
+        row.setdefault("id", str(uuid.uuid4()))
+        row.setdefault("created_at", utc_now())
+        with self._lock:
+            if self._size >= self.max_buffer:
+                self.dropped += 1
+                return row["id"]
+            self._buffers[kind].append(row)
+            self._size += 1
+            self.recorded[kind] += 1
+            full = self._size >= self.batch_size
+        if full and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return row["id"]
+
+    def record_visit(self, chatbot_id: str, session_id: Optional[str]) -> str:
+        return self._record("visit", {"chatbot_id": chatbot_id, "session_id": session_id})
+
+    def record_usage(self, chatbot_id: str, session_id: Optional[str]) -> str:
+        return self._record("usage", {"chatbot_id": chatbot_id, "session_id": session_id})
+
+    def record_review(self, chatbot_id: str, rating: int, comment: Optional[str],
+                      session_id: Optional[str]) -> str:
+        return self._record("review", {"chatbot_id": chatbot_id, "rating": rating,
+                                       "comment": comment, "session_id": session_id})
+
+    # ── Flushing ──
+
+    def _take(self) -> Dict[str, List[dict]]:
+        with self._lock:
+            batch, self._buffers = self._buffers, {kind: [] for kind in TABLES}
+            self._size = 0
+        return batch
+
+    def _requeue(self, batch: Dict[str, List[dict]]):
+        with self._lock:
+            for kind, rows in batch.items():
+                room = self.max_buffer - self._size
+                kept = rows[:max(0, room)]
+                self._buffers[kind][:0] = kept
+                self._size += len(kept)
+                self.dropped += len(rows) - len(kept)
+
+    async def _write(self, batch: Dict[str, List[dict]]):
+        rollup = RollupDelta()
+        rollup.add_rows(batch["visit"], "visits")
+        rollup.add_rows(batch["usage"], "usage")
+        async with AsyncSessionLocal() as db:
+            for kind, model in TABLES.items():
+                if batch[kind]:
+                    await db.execute(insert(model), batch[kind])
+            await rollup.apply(db)
+            await db.commit()
+
+    async def _drop_orphans(self, batch: Dict[str, List[dict]]) -> Dict[str, List[dict]]:
+        """Rows of bots deleted since they were recorded would fail the whole batch."""
+        bot_ids = {row["chatbot_id"] for rows in batch.values() for row in rows}
+        async with AsyncSessionLocal() as db:
+            existing = set((await db.execute(
+                select(Chatbot.id).where(Chatbot.id.in_(bot_ids))
+            )).scalars().all())
+        kept = {kind: [row for row in rows if row["chatbot_id"] in existing]
+                for kind, rows in batch.items()}
+        self.dropped += sum(len(rows) for rows in batch.values()) - sum(len(rows) for rows in kept.values())
+        return kept
+
+    async def flush(self):
+        batch = self._take()
+        count = sum(len(rows) for rows in batch.values())
+        if not count:
+            return
+        try:
+            try:
+                await self._write(batch)
+            except IntegrityError:
+                batch = await self._drop_orphans(batch)
+                count = sum(len(rows) for rows in batch.values())
+                await self._write(batch)
+            self.flushes += 1
+            self.written += count
+        except Exception as e:
+            self.failed_flushes += 1
+            logger.error(f"Telemetry flush of {count} rows failed: {e}")
+            self._requeue(batch)
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        if self._flusher is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._closing = False
+            self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write whatever is buffered and stop the flusher (called on shutdown)."""
+        if self._flusher is None:
+            return
+        self._closing = True
+        self._wake.set()
+        await self._flusher
+        self._flusher = None
+        self._loop = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self._size,
+            "recorded": dict(self.recorded),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+telemetry = TelemetryIngester(TELEMETRY_FLUSH_INTERVAL, TELEMETRY_BATCH_SIZE, TELEMETRY_MAX_BUFFER)
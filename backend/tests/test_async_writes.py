@@ -0,0 +1,53 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+
+def test_async_insert_conversation_and_message(chatbot_id):
+    from database import AsyncSessionLocal, async_engine
+    from models import Conversation, Message
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                conversation = Conversation(chatbot_id=chatbot_id, session_id="s1")
+                db.add(conversation)
+                await db.flush()
+                db.add(Message(conversation_id=conversation.id, sender="user", content="hello"))
+                await db.commit()
+                return (await db.execute(
+                    select(func.count()).select_from(Message).where(Message.conversation_id == conversation.id)
+                )).scalar()
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(run()) == 1
+
+
+def test_telemetry_flush_writes_rows(chatbot_id):
+    from database import async_engine
+    from models import Visit, Usage, Review
+    from telemetry import TelemetryIngester
+
+    ingester = TelemetryIngester(flush_interval=60, batch_size=100, max_buffer=1000)
+    ingester.record_visit(chatbot_id, "s1")
+    ingester.record_usage(chatbot_id, "s1")
+    ingester.record_review(chatbot_id, 5, "great", "s1")
+
+    async def run():
+        try:
+            await ingester.flush()
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+    assert ingester.failed_flushes == 0
+    assert ingester.written == 3
+
+    from database import engine
+    with engine.connect() as conn:
+        for model in (Visit, Usage, Review):
+            count = conn.execute(
+                select(func.count()).select_from(model).where(model.chatbot_id == chatbot_id)
+            ).scalar()
+            assert count == 1, model.__tablename__
@@ -0,0 +1,79 @@
+import itertools
+
+from context_builder import build_context, count_tokens, merge_passages, select_qa
+from knowledge_snapshot import KnowledgeSnapshot
+from trigger_matcher import TriggerMatcher
+
+MODEL = "gpt-4o-mini"
+_loads = itertools.count(1)
+
+
+def snapshot(entries, max_context_tokens=None):
+    return KnowledgeSnapshot(
+        chatbot_id="bot",
+        version=1,
+        matcher=TriggerMatcher([]),
+        entries=entries,
+        document_chunks={},
+        qa_fragments=[f"Q: {t}\nA: {r}" for t, r in entries],
+        max_context_tokens=max_context_tokens,
+        loaded_at=float(next(_loads)),    # a fresh Q&A index per test
+    )
+
+
+def chunk(document_id, chunk_index, content):
+    return {"document_id": document_id, "chunk_index": chunk_index, "content": content}
+
+
+def test_adjacent_chunks_are_merged_without_their_overlap():
+    passages = merge_passages([
+        chunk("d1", 1, "four five six seven"),
+        chunk("d2", 0, "other document"),
+        chunk("d1", 0, "one two three four five"),
+        chunk("d1", 5, "far away"),
+    ], overlap=2)
+    assert passages == [
+        "one two three four five six seven",
+        "other document",
+        "far away",
+    ]
+
+
+def test_all_qa_entries_are_kept_when_they_fit():
+    snap = snapshot([("refund", "Within 30 days."), ("shipping", "Worldwide.")])
+    selected, used = select_qa(snap, "anything", 1000, MODEL)
+    assert selected == snap.qa_fragments
+    assert used == sum(count_tokens(f, MODEL) for f in snap.qa_fragments)
+
+
+def test_only_matching_qa_entries_are_kept_over_budget():
+    filler = " ".join(["lorem"] * 200)
+    snap = snapshot([
+        ("refund policy", filler),
+        ("shipping times", "Orders ship in two days."),
+        ("opening hours", filler),
+    ])
+    budget = count_tokens(snap.qa_fragments[1], MODEL) + 5
+    selected, used = select_qa(snap, "How long does shipping take?", budget, MODEL)
+    assert selected == [snap.qa_fragments[1]]
+    assert used <= budget
+
+
+def test_context_stays_within_the_budget():
+    snap = snapshot([("refund", "Within 30 days.")], max_context_tokens=300)
+    chunks = [chunk(f"d{i}", 0, " ".join([f"word{i}"] * 150)) for i in range(5)]
+    built = build_context(snap, "refund", chunks, MODEL, chunk_overlap=0)
+    assert built.truncated
+    assert built.qa_entries == 1
+    assert 0 < built.passages < 5
+    assert built.context_tokens <= 300
+
+
+def test_qa_gets_the_whole_budget_without_documents():
+    filler = " ".join(["lorem"] * 100)
+    snap = snapshot([(f"question {i}", filler) for i in range(3)])
+    budget = sum(count_tokens(f, MODEL) for f in snap.qa_fragments)
+    built = build_context(snap, "question", [], MODEL, chunk_overlap=0, budget=budget)
+    assert built.qa_entries == 3
+    assert built.passages == 0
+    assert not built.truncated
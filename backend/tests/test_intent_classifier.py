@@ -0,0 +1,48 @@
+import pytest
+
+from intent_classifier import DEFAULT_ROUTES, DEFAULT_WELCOME, IntentClassifier, route
+
+
+def classifier():
+    return IntentClassifier(DEFAULT_ROUTES, max_words=6)
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("Hi!", "greeting"),
+    ("hello there 👋", "greeting"),
+    ("Good morning", "greeting"),
+    ("thanks so much", "thanks"),
+    ("Ok thank you for your help.", "thanks"),
+    ("bye!", "goodbye"),
+    ("have a great day", "goodbye"),
+])
+def test_small_talk_is_classified(message, intent):
+    assert classifier().classify(message).name == intent
+
+
+@pytest.mark.parametrize("message", [
+    "hi, what are your opening hours?",
+    "thanks, but how do I get a refund",
+    "hello hello hello hello hello hello hello",
+    "high prices",
+    "",
+    "!!!",
+])
+def test_other_messages_go_to_rag(message):
+    assert classifier().classify(message) is None
+
+
+def test_reply_uses_the_bot_welcome_and_name():
+    c = classifier()
+    assert c.reply("hey", "Acme Bot", "Welcome to Acme!") == "Welcome to Acme!"
+    assert c.reply("hey", "Acme Bot", None) == DEFAULT_WELCOME
+    assert c.reply("bye", "Acme Bot", None) == "Goodbye! Thanks for chatting with Acme Bot."
+
+
+def test_registered_route_can_take_priority():
+    c = classifier()
+    c.register(route("hours", r"hi hours", ["9-5"]), first=True)
+    c.register(route("help", r"help", ["How can I help?"]))
+    assert c.classify("hi hours").name == "hours"
+    assert c.classify("help").name == "help"
+    assert c.stats()["matches"] == {"hours": 1, "help": 1}
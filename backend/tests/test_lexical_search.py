@@ -0,0 +1,51 @@
+import pytest
+
+from lexical_search import is_literal_lookup, lexical_terms, is_confident, is_relevant, rrf_fuse
+
+
+@pytest.mark.parametrize("query", [
+    "What is the price of SKU AB-1234?",
+    "XR-200 battery",
+    "Is model X200 in stock",
+    "order 12ab34",
+])
+def test_code_queries_are_literal_lookups(query):
+    assert is_literal_lookup(query, lexical_terms(query))
+
+
+@pytest.mark.parametrize("query", [
+    "refund policy",
+    "Do you ship to the USA?",
+    "I need help ASAP",
+    "Is it FREE",
+    "What happened in 2024",
+    "opening hours",
+    "tell me about the XR-200 battery life and warranty compared to the older models",
+])
+def test_other_queries_are_not_literal_lookups(query):
+    assert not is_literal_lookup(query, lexical_terms(query))
+
+
+def test_lexical_terms_drop_stopwords_and_duplicates():
+    assert lexical_terms("What is the price of the AB-1234 price?") == ["price", "ab", "1234"]
+
+
+def test_confident_needs_a_full_match_on_top():
+    assert is_confident([{"full_match": True}])
+    assert not is_confident([{"full_match": False}, {"full_match": True}])
+    assert not is_confident([])
+
+
+def test_relevance_of_vector_and_lexical_hits():
+    assert is_relevant({"full_match": True, "similarity": None})
+    assert is_relevant({"similarity": 0.5})
+    assert not is_relevant({"similarity": 0.2})
+    assert not is_relevant({"full_match": False, "similarity": None})
+
+
+def test_rrf_prefers_chunks_in_both_lists():
+    vector = [{"id": "a", "similarity": 0.9}, {"id": "b", "similarity": 0.8}]
+    lexical = [{"id": "b", "lexical_rank": 1.0, "full_match": True}, {"id": "c", "lexical_rank": 0.5, "full_match": False}]
+    fused = rrf_fuse(vector, lexical, top_k=2)
+    assert [c["id"] for c in fused] == ["b", "a"]
+    assert fused[0]["similarity"] == 0.8 and fused[0]["full_match"] is True
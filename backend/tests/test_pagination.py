@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, page_size
+
+
+@pytest.mark.parametrize("moment", [
+    datetime(2024, 5, 1, 12, 30, 15, 123456),
+    datetime(2024, 1, 1),
+    None,
+])
+def test_cursor_round_trip(moment):
+    cursor = encode_cursor(moment, "3f2c9a4e-id")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (moment, "3f2c9a4e-id")
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "e30", "W10"])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.parametrize("limit, expected", [
+    (None, 20),
+    (0, 20),
+    (5, 5),
+    (-3, 1),
+    (10_000, MAX_PAGE_SIZE),
+])
+def test_page_size(limit, expected):
+    assert page_size(limit) == expected
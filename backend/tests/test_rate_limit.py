@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+import rate_limit
+from rate_limit import MemoryBucketStore, RateLimiter, RateLimitExceeded, parse_limit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "time", clock)
+    return clock
+
+
+def test_parse_limit():
+    assert parse_limit("20/60") == (20.0, 20.0 / 60)
+    assert parse_limit("5") == (5.0, 5.0)
+    assert parse_limit("") is None
+
+
+def test_bucket_empties_and_refills(clock):
+    store = MemoryBucketStore()
+
+    async def take():
+        return await store.take("k", capacity=3, rate=1.0)
+
+    assert [asyncio.run(take())[0] for _ in range(4)] == [True, True, True, False]
+    clock.now += 1.5
+    assert asyncio.run(take()) == (True, 0.5)
+    assert asyncio.run(take())[0] is False
+    clock.now += 100
+    allowed, tokens = asyncio.run(take())
+    assert allowed and tokens == 2.0      # refill is capped at the capacity
+
+
+def test_take_all_stops_at_the_first_refusal(clock):
+    store = MemoryBucketStore()
+    buckets = [("a", 5, 1.0), ("b", 1, 1.0), ("c", 5, 1.0)]
+    assert asyncio.run(store.take_all(buckets)) is None
+    index, tokens = asyncio.run(store.take_all(buckets))
+    assert index == 1 and tokens == 0.0
+    # "c" was not charged by the refused request
+    assert asyncio.run(store.take("c", 5, 1.0)) == (True, 3.0)
+
+
+def test_limiter_raises_with_retry_after(clock, monkeypatch):
+    monkeypatch.setitem(rate_limit.RATE_LIMITS, "chat", {"ip": "10/60", "session": "2/60", "bot": ""})
+    limiter = RateLimiter(MemoryBucketStore())
+    keys = [("ip", "1.2.3.4"), ("session", "s1"), ("bot", "b1")]
+
+    asyncio.run(limiter.check("chat", keys))
+    asyncio.run(limiter.check("chat", keys))
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        asyncio.run(limiter.check("chat", keys))
+    assert exceeded.value.kind == "session"
+    assert exceeded.value.retry_after == 30
+    assert limiter.rejected == {"chat:session": 1}
+    assert limiter.allowed == 2
+
+    # Another session from the same address is still allowed
+    asyncio.run(limiter.check("chat", [("ip", "1.2.3.4"), ("session", "s2")]))
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from scheduler import AdmissionRejected, LLMScheduler
+
+
+def scheduler(max_concurrency=2, max_per_bot=1, max_queue=10, max_queue_per_bot=10, queue_timeout=1.0):
+    return LLMScheduler(max_concurrency, max_per_bot, max_queue, max_queue_per_bot, queue_timeout)
+
+
+def test_requests_under_the_caps_run_at_once():
+    async def run():
+        s = scheduler()
+        await s.acquire("a")
+        await s.acquire("b")
+        return s.stats()
+
+    stats = asyncio.run(run())
+    assert stats["active"] == 2
+    assert stats["queue_depth"] == 0
+
+
+def test_per_bot_cap_queues_and_release_hands_over_the_slot():
+    async def run():
+        s = scheduler()
+        await s.acquire("a")
+        waiting = asyncio.create_task(s.acquire("a"))
+        await asyncio.sleep(0)
+        assert s.stats()["queue_depth"] == 1
+        await s.acquire("b")          # another bot is not blocked by a's queue
+        s.release("a", service_time=0.01)
+        await waiting
+        return s.stats()
+
+    stats = asyncio.run(run())
+    assert stats["active"] == 2
+    assert stats["queue_depth"] == 0
+    assert stats["admitted"] == 3
+
+
+def test_full_bot_queue_is_rejected_with_retry_after():
+    async def run():
+        s = scheduler(max_queue_per_bot=1)
+        await s.acquire("a")
+        waiting = asyncio.create_task(s.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await s.acquire("a")
+        waiting.cancel()
+        return s, rejected.value
+
+    s, rejected = asyncio.run(run())
+    assert rejected.reason == "bot queue full"
+    assert rejected.retry_after >= 1
+    assert s.rejected == 1
+
+
+def test_expected_wait_over_the_deadline_fails_fast():
+    async def run():
+        s = scheduler(queue_timeout=1.0)
+        await s.acquire("a")
+        s.release("a", service_time=5.0)
+        await s.acquire("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await s.acquire("a")
+        return s, rejected.value
+
+    s, rejected = asyncio.run(run())
+    assert rejected.reason == "expected wait exceeds deadline"
+    assert rejected.retry_after == 5
+    assert s.stats()["queue_depth"] == 0
+
+
+def test_queued_request_times_out():
+    async def run():
+        s = scheduler(queue_timeout=0.05)
+        await s.acquire("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await s.acquire("a")
+        return s, rejected.value
+
+    s, rejected = asyncio.run(run())
+    assert rejected.reason == "queue timeout"
+    assert s.timed_out == 1
+    assert s.stats()["queue_depth"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        s = scheduler()
+        await s.acquire("a")
+        waiting = asyncio.create_task(s.acquire("a"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        s.release("a")
+        return s.stats()
+
+    stats = asyncio.run(run())
+    assert stats["active"] == 0
+    assert stats["queue_depth"] == 0
@@ -0,0 +1,83 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+async def collect(stream):
+    return "".join([delta async for delta in stream])
+
+
+def test_identical_requests_share_one_computation():
+    calls = 0
+
+    async def answer():
+        nonlocal calls
+        calls += 1
+        for delta in ("Hel", "lo", "!"):
+            await asyncio.sleep(0.01)
+            yield delta
+
+    async def run():
+        flights = SingleFlight()
+        streams = [flights.stream("key", answer) for _ in range(3)]
+        assert flights.in_flight("key")
+        results = await asyncio.gather(*(collect(s) for s in streams))
+        await asyncio.sleep(0)
+        return flights, results
+
+    flights, results = asyncio.run(run())
+    assert results == ["Hello!"] * 3
+    assert calls == 1
+    assert flights.stats()["leaders"] == 1
+    assert flights.stats()["followers"] == 2
+    assert not flights.in_flight("key")
+
+
+def test_late_joiner_replays_earlier_deltas():
+    async def answer():
+        yield "one "
+        await asyncio.sleep(0.02)
+        yield "two"
+
+    async def run():
+        flights = SingleFlight()
+        first = flights.stream("key", answer)
+        await asyncio.sleep(0.01)
+        late = flights.stream("key", None)
+        return await asyncio.gather(collect(first), collect(late))
+
+    assert asyncio.run(run()) == ["one two", "one two"]
+
+
+def test_leader_disconnect_does_not_cancel_the_flight():
+    async def answer():
+        yield "a"
+        await asyncio.sleep(0.02)
+        yield "b"
+
+    async def run():
+        flights = SingleFlight()
+        leader = flights.stream("key", answer)
+        follower = flights.stream("key", None)
+        assert await leader.__anext__() == "a"
+        await leader.aclose()
+        return await collect(follower)
+
+    assert asyncio.run(run()) == "ab"
+
+
+def test_failure_ends_every_stream():
+    async def answer():
+        yield "partial"
+        raise RuntimeError("provider down")
+
+    async def run():
+        flights = SingleFlight()
+        streams = [flights.stream("key", answer) for _ in range(2)]
+        results = await asyncio.gather(*(collect(s) for s in streams))
+        await asyncio.sleep(0)
+        return flights, results
+
+    flights, results = asyncio.run(run())
+    assert results == ["partial", "partial"]
+    assert not flights.in_flight("key")
@@ -0,0 +1,47 @@
+import pytest
+
+from trigger_matcher import TriggerMatcher
+
+
+ENTRIES = [
+    ("Opening hours", "We are open 9-5.", True),
+    ("refund", "Refunds take 5 days.", False),
+    ("shipping", "We ship worldwide.", False),
+    ("ship", "Ahoy.", False),
+    ("hours", "See the opening hours page.", False),
+]
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("  OPENING HOURS ", "We are open 9-5."),
+    ("what are your opening hours?", "See the opening hours page."),
+    ("How do I get a REFUND?", "Refunds take 5 days."),
+    ("do you do shipping to Canada", "We ship worldwide."),
+    ("can you ship it", "Ahoy."),
+    ("hello there", None),
+])
+def test_match(message, expected):
+    assert TriggerMatcher(ENTRIES).match(message) == expected
+
+
+def test_first_listed_contains_entry_wins():
+    matcher = TriggerMatcher([("hours", "first", False), ("opening hours", "second", False)])
+    assert matcher.match("opening hours please") == "first"
+
+
+def test_suffix_matches_are_found_through_failure_links():
+    matcher = TriggerMatcher([("abcd", "long", False), ("bc", "short", False)])
+    assert matcher.match("xabcx") == "short"
+    assert matcher.match("abcd") == "long"
+
+
+def test_exact_trigger_does_not_match_inside_a_message():
+    matcher = TriggerMatcher([("price", "It costs 10.", True)])
+    assert matcher.match("price") == "It costs 10."
+    assert matcher.match("what is the price") is None
+
+
+def test_empty_matcher():
+    matcher = TriggerMatcher([])
+    assert len(matcher) == 0
+    assert matcher.match("anything") is None
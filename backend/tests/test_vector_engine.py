@@ -0,0 +1,93 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from vector_engine import VectorEngine
+
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class FakeChunkDB:
+    """Answers the two queries VectorEngine issues from an in-memory chunk list."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks      # (id, chunk_index, document_id, embedding, content)
+        self.loads = 0
+
+    async def execute(self, statement, params):
+        if "embedding" in str(statement):
+            self.loads += 1
+            rows = sorted(self.chunks, key=lambda c: (c[2], c[1]))
+            return _Result([c[:4] for c in rows])
+        wanted = set(params["ids"])
+        return _Result([(c[0], c[4]) for c in self.chunks if c[0] in wanted])
+
+
+CHUNKS = [
+    ("a0", 0, "doc-a", [1.0, 0.0, 0.0], "apples"),
+    ("a1", 1, "doc-a", [0.9, 0.1, 0.0], "more apples"),
+    ("b0", 0, "doc-b", [0.0, 1.0, 0.0], "bananas"),
+    ("c0", 0, "doc-c", [0.0, 0.0, 2.0], "cherries"),
+]
+COUNTS = {"doc-a": 2, "doc-b": 1, "doc-c": 1}
+
+
+def test_search_ranks_by_cosine_similarity(tmp_path):
+    engine = VectorEngine(str(tmp_path), max_chunks=100, max_bots=10)
+    db = FakeChunkDB(CHUNKS)
+    results = asyncio.run(engine.search(db, "bot", COUNTS, [0.1, 0.0, 1.0], top_k=2))
+    assert [r["id"] for r in results] == ["c0", "a0"]
+    assert results[0]["content"] == "cherries"
+    assert results[0]["document_id"] == "doc-c"
+    assert results[0]["similarity"] == pytest.approx(1 / np.sqrt(1.01))
+
+
+def test_matrix_is_reused_from_memory_and_disk(tmp_path):
+    db = FakeChunkDB(CHUNKS)
+    engine = VectorEngine(str(tmp_path), max_chunks=100, max_bots=10)
+    asyncio.run(engine.search(db, "bot", COUNTS, [1.0, 0.0, 0.0], top_k=1))
+    asyncio.run(engine.search(db, "bot", COUNTS, [1.0, 0.0, 0.0], top_k=1))
+    assert db.loads == 1
+
+    other_worker = VectorEngine(str(tmp_path), max_chunks=100, max_bots=10)
+    results = asyncio.run(other_worker.search(db, "bot", COUNTS, [1.0, 0.0, 0.0], top_k=1))
+    assert db.loads == 1
+    assert other_worker.disk_loads == 1
+    assert results[0]["id"] == "a0"
+
+
+def test_remove_document_updates_the_matrix_in_place(tmp_path):
+    db = FakeChunkDB(CHUNKS)
+    engine = VectorEngine(str(tmp_path), max_chunks=100, max_bots=10)
+    asyncio.run(engine.search(db, "bot", COUNTS, [1.0, 0.0, 0.0], top_k=4))
+
+    engine.remove_document("bot", "doc-a")
+    db.chunks = [c for c in CHUNKS if c[2] != "doc-a"]
+    remaining = {"doc-b": 1, "doc-c": 1}
+    results = asyncio.run(engine.search(db, "bot", remaining, [1.0, 0.0, 0.0], top_k=4))
+    assert db.loads == 1
+    assert engine.incremental_updates == 1
+    assert sorted(r["id"] for r in results) == ["b0", "c0"]
+
+
+def test_chunks_deleted_elsewhere_are_not_returned(tmp_path):
+    db = FakeChunkDB(CHUNKS)
+    engine = VectorEngine(str(tmp_path), max_chunks=100, max_bots=10)
+    asyncio.run(engine.search(db, "bot", COUNTS, [1.0, 0.0, 0.0], top_k=4))
+
+    db.chunks = [c for c in CHUNKS if c[0] != "a0"]
+    results = asyncio.run(engine.search(db, "bot", COUNTS, [1.0, 0.0, 0.0], top_k=4))
+    assert "a0" not in [r["id"] for r in results]
+    assert results[0]["id"] == "a1"
+
+
+def test_zero_query_returns_nothing(tmp_path):
+    engine = VectorEngine(str(tmp_path), max_chunks=100, max_bots=10)
+    assert asyncio.run(engine.search(FakeChunkDB(CHUNKS), "bot", COUNTS, np.zeros(3), top_k=2)) == []
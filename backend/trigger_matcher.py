@@ -0,0 +1,99 @@
+"""
+Custom Q&A Trigger Matcher
+- Compiles a chatbot's KnowledgeEntry triggers once:
+  exact triggers into a hash map, contains triggers into an Aho–Corasick automaton
+- Matching a message is a single pass over its characters, independent of entry count
+- Built and cached per chatbot as part of its KnowledgeSnapshot (knowledge_snapshot.py)
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_NO_MATCH = float("inf")
+
+
+def normalize_trigger(value: str) -> str:
+    return value.lower().strip()
+
+
+class TriggerMatcher:
+    """
+    Matches a message against (trigger, response, is_exact_match) entries.
+    When several entries match, the one listed first wins, with exact
+    matches checked before contains matches.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, bool]]):
+        self._exact: Dict[str, str] = {}
+        self._responses: List[str] = []
+
+        # Aho–Corasick automaton: goto edges, failure links and, per state,
+        # the highest-priority (lowest index) entry ending there.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[float] = [_NO_MATCH]
+
+        for trigger, response, is_exact in entries:
+            key = normalize_trigger(trigger)
+            if is_exact:
+                self._exact.setdefault(key, response)
+            else:
+                self._add_pattern(key, len(self._responses))
+                self._responses.append(response)
+        self._build_links()
+
+    def __len__(self) -> int:
+        return len(self._exact) + len(self._responses)
+
+    def _add_pattern(self, pattern: str, priority: int):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(_NO_MATCH)
+            state = nxt
+        # An empty trigger lands on the root and therefore matches every message
+        self._best[state] = min(self._best[state], priority)
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # Inherit matches that end at the failure state (suffixes)
+                self._best[nxt] = min(self._best[nxt], self._best[self._fail[nxt]])
+                queue.append(nxt)
+
+    def match(self, message: str) -> Optional[str]:
+        """Return the response of the winning entry, or None if nothing matches."""
+        text = normalize_trigger(message)
+
+        response = self._exact.get(text)
+        if response is not None:
+            return response
+
+        if not self._responses:
+            return None
+
+        goto, fail, best_at = self._goto, self._fail, self._best
+        best = best_at[0]
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if best_at[state] < best:
+                best = best_at[state]
+                if best == 0:
+                    break
+        if best == _NO_MATCH:
+            return None
+        return self._responses[int(best)]
@@ -0,0 +1,284 @@
+"""
+In-Process Vector Search Engine
+- Holds a bot's chunk embeddings as one contiguous, unit-normalized float32
+  matrix and answers top-k with a single matrix-vector product
+- Matrices are saved as .npy files under VECTOR_ENGINE_DIR and memory-mapped,
+  so every uvicorn worker on the host shares the same pages
+- Files are keyed by a signature of the bot's {document_id: chunk_count}
+  (the same counts the knowledge snapshot carries), so a worker can tell
+  whether a file on disk matches the bot's current documents
+- delete_document updates the matrix incrementally instead of reloading
+  every chunk from Postgres; documents added by the ingestion workers
+  change the signature, so the next search reloads the bot once
+- Other workers learn about changes through the shared knowledge version
+  (knowledge_snapshot.py), which drops their in-memory matrix
+- Only ids and positions are kept in memory; the top-k chunk texts are read
+  from Postgres per search, so a chunk deleted elsewhere is never returned
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+VECTOR_ENGINE = os.getenv("VECTOR_ENGINE", "auto").lower()   # auto, numpy, sql
+NUMPY_ENGINE_MAX_CHUNKS = int(os.getenv("NUMPY_ENGINE_MAX_CHUNKS", "5000"))
+NUMPY_ENGINE_MAX_BOTS = int(os.getenv("NUMPY_ENGINE_MAX_BOTS", "1000"))
+VECTOR_ENGINE_DIR = os.getenv(
+    "VECTOR_ENGINE_DIR", os.path.join(os.path.dirname(__file__), "vector_store")
+)
+
+
+def corpus_signature(document_chunks: Dict[str, int]) -> str:
+    digest = hashlib.sha1()
+    for document_id in sorted(document_chunks):
+        digest.update(f"{document_id}:{document_chunks[document_id]}\x02".encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class BotMatrix:
+    signature: str
+    matrix: np.ndarray          # (n, dim) float32, rows normalized; may be a read-only memmap
+    ids: List[str]
+    document_ids: List[str]
+    chunk_indexes: List[int]
+
+
+def _normalize_rows(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorEngine:
+    def __init__(self, directory: str, max_chunks: int, max_bots: int):
+        self.directory = directory
+        self.max_chunks = max_chunks
+        self.max_bots = max_bots
+        # chatbot_id -> BotMatrix; most recently used last
+        self._bots: "OrderedDict[str, BotMatrix]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.loads = 0
+        self.disk_loads = 0
+        self.incremental_updates = 0
+
+    def handles(self, chunk_count: int) -> bool:
+        if VECTOR_ENGINE == "sql" or chunk_count == 0:
+            return False
+        if VECTOR_ENGINE == "numpy":
+            return True
+        return chunk_count <= self.max_chunks
+
+    # ─── Files ───────────────────────────────────────────
+
+    def _paths(self, chatbot_id: str, signature: str):
+        base = os.path.join(self.directory, chatbot_id, signature)
+        return base + ".npy", base + ".json"
+
+    def _write(self, chatbot_id: str, entry: BotMatrix) -> BotMatrix:
+        """Save the matrix, drop the bot's older files and return a memory-mapped copy."""
+        bot_dir = os.path.join(self.directory, chatbot_id)
+        os.makedirs(bot_dir, exist_ok=True)
+        npy_path, meta_path = self._paths(chatbot_id, entry.signature)
+        meta = {
+            "ids": entry.ids,
+            "document_ids": entry.document_ids,
+            "chunk_indexes": entry.chunk_indexes,
+        }
+        # Write to temp files and rename so other workers never map a partial file
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(npy_path + tmp_suffix, "wb") as f:
+            np.save(f, np.ascontiguousarray(entry.matrix, dtype=np.float32))
+        with open(meta_path + tmp_suffix, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + tmp_suffix, meta_path)
+        os.replace(npy_path + tmp_suffix, npy_path)
+
+        for name in os.listdir(bot_dir):
+            if not name.startswith(entry.signature) and not name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(bot_dir, name))
+                except OSError:
+                    pass  # Still mapped elsewhere on platforms that lock open files
+        return self._read(chatbot_id, entry.signature) or entry
+
+    def _read(self, chatbot_id: str, signature: str) -> Optional[BotMatrix]:
+        npy_path, meta_path = self._paths(chatbot_id, signature)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(npy_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if matrix.shape[0] != len(meta["ids"]):
+            return None
+        return BotMatrix(signature, matrix, meta["ids"], meta["document_ids"], meta["chunk_indexes"])
+
+    def _remember(self, chatbot_id: str, entry: BotMatrix):
+        with self._lock:
+            self._bots[chatbot_id] = entry
+            self._bots.move_to_end(chatbot_id)
+            while len(self._bots) > self.max_bots:
+                self._bots.popitem(last=False)
+
+    # ─── Loading ─────────────────────────────────────────
+
+    async def _get(self, db: AsyncSession, chatbot_id: str, document_chunks: Dict[str, int]) -> BotMatrix:
+        signature = corpus_signature(document_chunks)
+        with self._lock:
+            entry = self._bots.get(chatbot_id)
+            if entry is not None and entry.signature == signature:
+                self._bots.move_to_end(chatbot_id)
+                return entry
+
+        # Another worker may already have written it
+        entry = await asyncio.to_thread(self._read, chatbot_id, signature)
+        if entry is not None:
+            self.disk_loads += 1
+            self._remember(chatbot_id, entry)
+            return entry
+
+        rows = (await db.execute(
+            text("""
+                SELECT id, chunk_index, document_id, embedding
+                FROM document_chunks
+                WHERE chatbot_id = :chatbot_id
+                ORDER BY document_id, chunk_index
+            """),
+            {"chatbot_id": chatbot_id}
+        )).all()
+        loaded = BotMatrix(
+            signature=corpus_signature(self._count(row[2] for row in rows)),
+            matrix=_normalize_rows([row[3] for row in rows]) if rows else np.zeros((0, 0), dtype=np.float32),
+            ids=[row[0] for row in rows],
+            document_ids=[row[2] for row in rows],
+            chunk_indexes=[int(row[1] or 0) for row in rows],
+        )
+        self.loads += 1
+        if rows:
+            loaded = await asyncio.to_thread(self._write, chatbot_id, loaded)
+        self._remember(chatbot_id, loaded)
+        return loaded
+
+    @staticmethod
+    def _count(document_ids) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for document_id in document_ids:
+            counts[document_id] = counts.get(document_id, 0) + 1
+        return counts
+
+    # ─── Search ──────────────────────────────────────────
+
+    async def search(
+        self,
+        db: AsyncSession,
+        chatbot_id: str,
+        document_chunks: Dict[str, int],
+        query_embedding,
+        top_k: int
+    ) -> List[dict]:
+        """Top-k chunks by cosine similarity, in the same shape as search_similar_chunks()."""
+        entry = await self._get(db, chatbot_id, document_chunks)
+        self.searches += 1
+        if not entry.ids:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        similarities = entry.matrix @ (query / norm)
+
+        k = min(top_k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        top_ids = [entry.ids[i] for i in top]
+        contents = dict((await db.execute(
+            text("SELECT id, content FROM document_chunks WHERE id = ANY(:ids)"),
+            {"ids": top_ids}
+        )).all())
+        return [
+            {
+                "id": entry.ids[i],
+                "content": contents[entry.ids[i]],
+                "chunk_index": entry.chunk_indexes[i],
+                "document_id": entry.document_ids[i],
+                "similarity": float(similarities[i]),
+            }
+            for i in top
+            if entry.ids[i] in contents     # deleted since the matrix was built
+        ]
+
+    # ─── Incremental maintenance ─────────────────────────
+
+    def remove_document(self, chatbot_id: str, document_id: str):
+        """Drop a deleted document's rows from the bot's loaded matrix."""
+        with self._lock:
+            entry = self._bots.get(chatbot_id)
+        if entry is None or document_id not in entry.document_ids:
+            return
+        keep = [i for i, d in enumerate(entry.document_ids) if d != document_id]
+        if not keep:
+            self.drop_bot(chatbot_id)
+            return
+        document_ids = [entry.document_ids[i] for i in keep]
+        updated = BotMatrix(
+            signature=corpus_signature(self._count(document_ids)),
+            matrix=np.asarray(entry.matrix)[keep],
+            ids=[entry.ids[i] for i in keep],
+            document_ids=document_ids,
+            chunk_indexes=[entry.chunk_indexes[i] for i in keep],
+        )
+        self._replace(chatbot_id, updated)
+
+    def _replace(self, chatbot_id: str, updated: BotMatrix):
+        try:
+            updated = self._write(chatbot_id, updated)
+        except OSError as e:
+            logger.warning(f"Vector engine write failed for {chatbot_id}: {e}")
+        self.incremental_updates += 1
+        self._remember(chatbot_id, updated)
+
+    def forget(self, chatbot_id: str):
+        """Drop the in-memory matrix; the next search checks the signature again."""
+        with self._lock:
+            self._bots.pop(chatbot_id, None)
+
+    def drop_bot(self, chatbot_id: str):
+        with self._lock:
+            self._bots.pop(chatbot_id, None)
+        shutil.rmtree(os.path.join(self.directory, chatbot_id), ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            bots = list(self._bots.values())
+        return {
+            "mode": VECTOR_ENGINE,
+            "max_chunks": self.max_chunks,
+            "bots": len(bots),
+            "chunks": sum(len(b.ids) for b in bots),
+            "searches": self.searches,
+            "loads": self.loads,
+            "disk_loads": self.disk_loads,
+            "incremental_updates": self.incremental_updates,
+        }
+
+
+vector_engine = VectorEngine(VECTOR_ENGINE_DIR, NUMPY_ENGINE_MAX_CHUNKS, NUMPY_ENGINE_MAX_BOTS)
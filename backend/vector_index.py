@@ -0,0 +1,200 @@
+"""
+Vector Index Management (pgvector ANN)
+- Creates and maintains an HNSW or IVFFlat index on document_chunks.embedding
+- Per-query recall settings (hnsw.ef_search / ivfflat.probes)
+- Chooses exact or approximate search per bot from its corpus size: small
+  bots get an exact scan of their own chunks, large ones use the index
+
+Maintenance from the command line:
+    python vector_index.py create     # build the configured index if missing or invalid
+    python vector_index.py rebuild    # REINDEX CONCURRENTLY (e.g. IVFFlat after heavy growth)
+    python vector_index.py drop
+"""
+
+import os
+import sys
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()   # hnsw, ivfflat, none
+VECTOR_INDEX_AUTO_CREATE = os.getenv("VECTOR_INDEX_AUTO_CREATE", "true").lower() in ("1", "true", "yes")
+VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "auto").lower()  # auto, exact, ann
+ANN_MIN_CHUNKS = int(os.getenv("ANN_MIN_CHUNKS", "2000"))
+
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+# auto = relaxed_order on pgvector >= 0.8 (keeps scanning when the chatbot_id filter
+# drops candidates), off on older versions; or set relaxed_order / strict_order / off
+HNSW_ITERATIVE_SCAN = os.getenv("HNSW_ITERATIVE_SCAN", "auto").lower()
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "0"))                  # 0 = derive from row count
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+
+# Arbitrary app-wide key so only one worker builds the index
+VECTOR_INDEX_LOCK_KEY = 727_412_003
+
+INDEX_NAMES = {
+    "hnsw": "ix_document_chunks_embedding_hnsw",
+    "ivfflat": "ix_document_chunks_embedding_ivfflat",
+}
+
+
+def _ivfflat_lists(conn) -> int:
+    if IVFFLAT_LISTS > 0:
+        return IVFFLAT_LISTS
+    rows = conn.execute(text("SELECT COUNT(*) FROM document_chunks")).scalar() or 0
+    # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond
+    lists = rows // 1000 if rows <= 1_000_000 else int(rows ** 0.5)
+    return max(lists, 10)
+
+
+def create_index_sql(conn, index_type: str) -> str:
+    name = INDEX_NAMES[index_type]
+    if index_type == "hnsw":
+        options = f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+    else:
+        options = f"WITH (lists = {_ivfflat_lists(conn)})"
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+        f"ON document_chunks USING {index_type} (embedding vector_cosine_ops) {options}"
+    )
+
+
+def ensure_vector_index(engine):
+    """
+    Build the configured ANN index if it is missing or INVALID (left by an
+    interrupted build). Non-blocking for writers, but it can take long on a
+    large corpus: the app runs it in a background thread, and only one
+    worker at a time builds.
+    """
+    if VECTOR_INDEX_TYPE not in INDEX_NAMES:
+        return
+    if VECTOR_INDEX_TYPE == "hnsw" and EMBEDDING_DIM > 2000:
+        logger.warning(f"HNSW indexes support up to 2000 dimensions; EMBEDDING_DIM is {EMBEDDING_DIM}")
+        return
+    name = INDEX_NAMES[VECTOR_INDEX_TYPE]
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": VECTOR_INDEX_LOCK_KEY}).scalar():
+            return  # Another worker is on it
+        try:
+            valid = conn.execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"
+            ), {"name": name}).scalar()
+            if valid:
+                return
+            if valid is False:
+                logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            logger.info(f"Building vector index {name}")
+            conn.execute(text(create_index_sql(conn, VECTOR_INDEX_TYPE)))
+            logger.info(f"Vector index {name} is ready")
+        except Exception as e:
+            logger.error(f"Vector index creation failed: {e}")
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": VECTOR_INDEX_LOCK_KEY})
+
+
+def rebuild_vector_index(engine):
+    if VECTOR_INDEX_TYPE not in INDEX_NAMES:
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"REINDEX INDEX CONCURRENTLY {INDEX_NAMES[VECTOR_INDEX_TYPE]}"))
+
+
+def drop_vector_index(engine):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in INDEX_NAMES.values():
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def use_ann(chunk_count: int) -> bool:
+    """Approximate search only pays off once a bot has enough chunks."""
+    if VECTOR_INDEX_TYPE not in INDEX_NAMES or VECTOR_SEARCH_MODE == "exact":
+        return False
+    if VECTOR_SEARCH_MODE == "ann":
+        return True
+    return chunk_count >= ANN_MIN_CHUNKS
+
+
+_iterative_scan: Optional[str] = None      # HNSW_ITERATIVE_SCAN resolved against the server
+
+
+async def iterative_scan_mode(db: AsyncSession) -> str:
+    global _iterative_scan
+    if _iterative_scan is None:
+        if HNSW_ITERATIVE_SCAN != "auto":
+            _iterative_scan = HNSW_ITERATIVE_SCAN
+        else:
+            version = (await db.execute(
+                text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            )).scalar() or "0"
+            parts = tuple(int(p) for p in version.split(".")[:2] if p.isdigit())
+            _iterative_scan = "relaxed_order" if parts >= (0, 8) else "off"
+    return _iterative_scan
+
+
+async def apply_search_settings(db: AsyncSession, top_k: int):
+    """Set recall knobs for the current transaction only."""
+    mode = await iterative_scan_mode(db)
+    iterative = mode in ("relaxed_order", "strict_order")
+    if VECTOR_INDEX_TYPE == "hnsw":
+        await db.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(HNSW_EF_SEARCH), int(top_k))}"))
+        if iterative:
+            await db.execute(text(f"SET LOCAL hnsw.iterative_scan = {mode}"))
+    elif VECTOR_INDEX_TYPE == "ivfflat":
+        await db.execute(text(f"SET LOCAL ivfflat.probes = {int(IVFFLAT_PROBES)}"))
+        if iterative:
+            await db.execute(text(f"SET LOCAL ivfflat.iterative_scan = {mode}"))
+
+
+def search_sql(exact: bool) -> str:
+    """
+    Nearest-chunk query for one bot. The distance is computed once and
+    reused for ordering. The exact variant materializes the bot's chunks
+    first so the planner cannot route it through the ANN index.
+    """
+    distance = f"embedding <=> CAST(:query_embedding AS vector({EMBEDDING_DIM}))"
+    if exact:
+        return f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT id, content, chunk_index, document_id, {distance} AS distance
+                FROM document_chunks
+                WHERE chatbot_id = :chatbot_id
+            )
+            SELECT id, content, chunk_index, document_id, distance
+            FROM candidates
+            ORDER BY distance
+            LIMIT :top_k
+        """
+    return f"""
+        SELECT id, content, chunk_index, document_id, {distance} AS distance
+        FROM document_chunks
+        WHERE chatbot_id = :chatbot_id
+        ORDER BY distance
+        LIMIT :top_k
+    """
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "create"
+    if command == "create":
+        ensure_vector_index(engine)
+    elif command == "rebuild":
+        rebuild_vector_index(engine)
+    elif command == "drop":
+        drop_vector_index(engine)
+    else:
+        print(f"Unknown command: {command} (expected create, rebuild or drop)")
+        sys.exit(1)
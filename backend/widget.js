@@ -453,13 +453,43 @@
     let reviewSubmitted = false;
     let hasConvo = false;
 
+    // ─── Telemetry: events are batched into one beacon ────────
+    let pendingEvents = [];
+    let flushScheduled = false;
+
+    function flushEvents() {
+      flushScheduled = false;
+      if (pendingEvents.length === 0) return;
+      const url = `${baseUrl}/api/widget/events/${chatbotId}`;
+      // text/plain keeps the beacon a simple CORS request (no preflight)
+      const body = JSON.stringify({ session_id: sessionId, events: pendingEvents });
+      pendingEvents = [];
+      if (navigator.sendBeacon && navigator.sendBeacon(url, body)) return;
+      fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "text/plain" },
+        body,
+        keepalive: true,
+      }).catch((err) => console.error("Error sending events:", err));
+    }
+
+    function queueEvent(event) {
+      pendingEvents.push(event);
+      if (!flushScheduled) {
+        flushScheduled = true;
+        setTimeout(flushEvents, 0);
+      }
+    }
+
+    // Deliver anything still queued when the visitor leaves the page
+    window.addEventListener("pagehide", flushEvents);
+    document.addEventListener("visibilitychange", () => {
+      if (document.visibilityState === "hidden") flushEvents();
+    });
+
     function recordUsage() {
       if (!hasConvo) return;
-      fetch(`${baseUrl}/api/widget/usage/${chatbotId}`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ session_id: sessionId }),
-      }).catch((err) => console.error("Error recording usage:", err));
+      queueEvent({ type: "usage" });
       hasConvo = false; // Reset for next time they open/chat
     }
 
@@ -528,33 +558,20 @@
 
       const comment = ratingComment.value.trim();
 
-      fetch(`${baseUrl}/api/widget/review/${chatbotId}`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          rating: currentRating,
-          comment: comment,
-          session_id: sessionId,
-        }),
-      })
-        .then(() => {
-          recordUsage();
-          reviewSubmitted = true;
-          ratingScreen.innerHTML = `
+      // Review and usage go out together in the next beacon
+      queueEvent({ type: "review", rating: currentRating, comment: comment });
+      recordUsage();
+      reviewSubmitted = true;
+      ratingScreen.innerHTML = `
           <div style="color: #05CD99; font-size: 48px; margin-bottom: 20px;">✓</div>
           <h4>Thank you!</h4>
           <p>Your review has been submitted.</p>
         `;
-          setTimeout(() => {
-            chatWindow.classList.remove("open");
-            trigger.style.display = "flex";
-            isOpen = false;
-          }, 2000);
-        })
-        .catch((err) => {
-          console.error("Error submitting review:", err);
-          alert("Something went wrong. Please try again.");
-        });
+      setTimeout(() => {
+        chatWindow.classList.remove("open");
+        trigger.style.display = "flex";
+        isOpen = false;
+      }, 2000);
     });
 
     skipRatingBtn.addEventListener("click", () => {
@@ -581,21 +598,101 @@
       messagesEl.appendChild(typing);
       scrollToBottom();
 
-      fetch(`${baseUrl}/api/widget/chat/${chatbotId}`, {
+      // Server answers 429 when the bot is overloaded
+      const busyReply =
+        "We're getting a lot of messages right now. Please try again in a few seconds.";
+
+      if (!window.ReadableStream || !window.TextDecoder) {
+        fetch(`${baseUrl}/api/widget/chat/${chatbotId}`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ message: text, session_id: sessionId }),
+        })
+          .then((res) => (res.status === 429 ? { reply: busyReply } : res.json()))
+          .then((data) => {
+            typing.remove();
+            addMessage(data.reply, "bot");
+            if (data.session_id) sessionId = data.session_id;
+          })
+          .catch(() => {
+            typing.remove();
+            addMessage("Sorry, something went wrong. Please try again.", "bot");
+          });
+        return;
+      }
+
+      // Stream tokens into a bot bubble as the server emits them
+      let botMsg = null;
+      fetch(`${baseUrl}/api/widget/chat/${chatbotId}/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ message: text, session_id: sessionId }),
       })
-        .then((res) => res.json())
-        .then((data) => {
+        .then((res) => {
+          if (res.status === 429) {
+            botMsg = addMessage(busyReply, "bot");
+            return;
+          }
+          if (!res.ok || !res.body) throw new Error("Chat request failed");
+          return readEventStream(res.body, (event, data) => {
+            if (event === "meta" && data.session_id) {
+              sessionId = data.session_id;
+            } else if (event === "token") {
+              if (!botMsg) {
+                typing.remove();
+                botMsg = addMessage("", "bot");
+              }
+              botMsg.textContent += data.delta;
+              scrollToBottom();
+            } else if (event === "done" && botMsg) {
+              botMsg.textContent = data.reply;
+            }
+          });
+        })
+        .then(() => {
           typing.remove();
-          addMessage(data.reply, "bot");
-          if (data.session_id) sessionId = data.session_id;
         })
         .catch(() => {
           typing.remove();
-          addMessage("Sorry, something went wrong. Please try again.", "bot");
+          if (!botMsg) {
+            addMessage("Sorry, something went wrong. Please try again.", "bot");
+          }
+        });
+    }
+
+    // Parse a text/event-stream body, calling onEvent(event, data) per event
+    function readEventStream(body, onEvent) {
+      const reader = body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      function dispatch(raw) {
+        let event = "message";
+        let data = "";
+        raw.split("\n").forEach((line) => {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        });
+        if (data) onEvent(event, JSON.parse(data));
+      }
+
+      function pump() {
+        return reader.read().then(({ done, value }) => {
+          if (done) {
+            if (buffer.trim()) dispatch(buffer);
+            return;
+          }
+          buffer += decoder.decode(value, { stream: true });
+          let idx;
+          while ((idx = buffer.indexOf("\n\n")) !== -1) {
+            dispatch(buffer.slice(0, idx));
+            buffer = buffer.slice(idx + 2);
+          }
+          return pump();
         });
+      }
+
+      return pump();
     }
 
     sendBtn.addEventListener("click", sendMessage);
@@ -610,6 +707,7 @@
       msg.textContent = text;
       messagesEl.appendChild(msg);
       scrollToBottom();
+      return msg;
     }
 
     function scrollToBottom() {
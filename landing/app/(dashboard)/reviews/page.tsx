@@ -1,6 +1,6 @@
 "use client";
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import DashboardHeader from "@/components/DashboardHeader";
 import { Star, MessageSquare, Bot, Calendar } from "lucide-react";
 import styles from "./reviews.module.css";
@@ -19,12 +19,29 @@ interface Review {
 export default function ReviewsPage() {
   const [reviews, setReviews] = useState<Review[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const sentinelRef = useRef<HTMLDivElement>(null);
 
   useEffect(() => {
     fetchReviews();
   }, []);
 
-  async function fetchReviews() {
+  // Infinite scroll: load the next page when the sentinel comes into view
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel || !nextCursor) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting && !loadingMore) {
+        fetchReviews(nextCursor);
+      }
+    });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [nextCursor, loadingMore]);
+
+  async function fetchReviews(cursor?: string) {
+    if (cursor) setLoadingMore(true);
     try {
       const storedUser = localStorage.getItem("user");
       let userId = "";
@@ -32,13 +49,18 @@ export default function ReviewsPage() {
         const user = JSON.parse(storedUser);
         userId = user.id;
       }
-      const res = await fetch(`${API_URL}/api/reviews?user_id=${userId}`);
+      const cursorParam = cursor ? `&cursor=${encodeURIComponent(cursor)}` : "";
+      const res = await fetch(
+        `${API_URL}/api/reviews?user_id=${userId}&limit=24${cursorParam}`,
+      );
       const data = await res.json();
-      setReviews(data);
+      setReviews((prev) => (cursor ? [...prev, ...data] : data));
+      setNextCursor(res.headers.get("X-Next-Cursor"));
     } catch (err) {
       console.error("Failed to fetch reviews:", err);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   }
 
@@ -78,7 +100,8 @@ export default function ReviewsPage() {
       <div className={styles.content}>
         <div className={styles.topBar}>
           <h2>
-            {reviews.length} Review{reviews.length !== 1 ? "s" : ""}
+            {reviews.length}
+            {nextCursor ? "+" : ""} Review{reviews.length !== 1 ? "s" : ""}
           </h2>
         </div>
 
@@ -129,6 +152,12 @@ export default function ReviewsPage() {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div ref={sentinelRef} className={styles.loading}>
+            {loadingMore && <div className={styles.spinner} />}
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,6 +1,6 @@
 "use client";
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import styles from "./RecentConversations.module.css";
 
 const getApiUrl = () => {
@@ -38,35 +38,57 @@ function timeAgo(dateStr: string): string {
 export default function RecentConversations({ botId }: { botId?: string }) {
   const [conversations, setConversations] = useState<Conversation[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const sentinelRef = useRef<HTMLDivElement>(null);
 
-  useEffect(() => {
-    async function fetchConversations() {
+  async function fetchConversations(cursor?: string) {
+    if (cursor) {
+      setLoadingMore(true);
+    } else {
       setLoading(true);
-      try {
-        const storedUser = localStorage.getItem("user");
-        let userId = "";
-        if (storedUser) {
-          const user = JSON.parse(storedUser);
-          userId = user.id;
-        }
-
-        const url = botId
-          ? `${getApiUrl()}/api/conversations?limit=10&bot_id=${botId}`
-          : `${getApiUrl()}/api/conversations?limit=10&user_id=${userId}`;
-
-        const res = await fetch(url);
-        const data = await res.json();
-        setConversations(data);
-      } catch (err) {
-        console.error("Failed to fetch conversations:", err);
-      } finally {
-        setLoading(false);
+    }
+    try {
+      const storedUser = localStorage.getItem("user");
+      let userId = "";
+      if (storedUser) {
+        const user = JSON.parse(storedUser);
+        userId = user.id;
       }
+
+      const filter = botId ? `bot_id=${botId}` : `user_id=${userId}`;
+      const cursorParam = cursor ? `&cursor=${encodeURIComponent(cursor)}` : "";
+      const res = await fetch(
+        `${getApiUrl()}/api/conversations?limit=10&${filter}${cursorParam}`,
+      );
+      const data = await res.json();
+      setConversations((prev) => (cursor ? [...prev, ...data] : data));
+      setNextCursor(res.headers.get("X-Next-Cursor"));
+    } catch (err) {
+      console.error("Failed to fetch conversations:", err);
+    } finally {
+      setLoading(false);
+      setLoadingMore(false);
     }
+  }
 
+  useEffect(() => {
     fetchConversations();
   }, [botId]);
 
+  // Infinite scroll: load older conversations when the sentinel comes into view
+  useEffect(() => {
+    const sentinel = sentinelRef.current;
+    if (!sentinel || !nextCursor) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting && !loadingMore) {
+        fetchConversations(nextCursor);
+      }
+    });
+    observer.observe(sentinel);
+    return () => observer.disconnect();
+  }, [nextCursor, loadingMore]);
+
   if (loading) {
     return (
       <div className={styles.container}>
@@ -147,6 +169,19 @@ export default function RecentConversations({ botId }: { botId?: string }) {
           ))}
         </tbody>
       </table>
+      {nextCursor && (
+        <div
+          ref={sentinelRef}
+          style={{
+            color: "var(--text-muted)",
+            fontSize: "0.85rem",
+            textAlign: "center",
+            padding: "12px",
+          }}
+        >
+          {loadingMore ? "Loading..." : ""}
+        </div>
+      )}
     </div>
   );
 }
@@ -6,6 +6,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'Backend
 
 from database import SessionLocal
 from models import Chatbot, Visit, Conversation, Message, User
+from analytics_rollup import RollupDelta
 from datetime import datetime, timedelta, timezone
 import random
 import uuid
@@ -22,6 +23,8 @@ def seed_data():
         print(f"Seeding data for chatbot: {bot.name} ({bot.id})")
 
         now = datetime.now(timezone.utc)
+        # daily_stats counters for the rows below, written in the same commit
+        rollup = RollupDelta()
         
         for i in range(7):
             day = now - timedelta(days=i)
@@ -35,6 +38,7 @@ def seed_data():
                     created_at=visit_time
                 )
                 db.add(visit)
+                rollup.add(bot.id, visit_time, "visits")
             
             # Random conversations (between 5 and 20)
             conv_count = random.randint(5, 20)
@@ -49,6 +53,7 @@ def seed_data():
                 )
                 db.add(conv)
                 db.flush() # To get conv.id
+                rollup.add(bot.id, conv_time, "conversations")
 
                 # Add some messages to each conversation
                 msg_count = random.randint(2, 6)
@@ -61,7 +66,12 @@ def seed_data():
                         created_at=msg_time
                     )
                     db.add(msg)
+                    rollup.add(bot.id, msg_time, "messages")
+                conv.message_count = msg_count
+                conv.last_message_preview = msg.content
+                conv.last_message_at = msg_time
 
+        rollup.apply_sync(db)
         db.commit()
         print("Successfully seeded analytics data for the last 7 days.")
 
@@ -6,6 +6,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'Backend
 
 from database import SessionLocal
 from models import Chatbot, Visit, Conversation, Message, User, Usage
+from analytics_rollup import RollupDelta
 from datetime import datetime, timedelta, timezone
 import random
 import uuid
@@ -22,6 +23,8 @@ def seed_data():
         print(f"Seeding data for {len(bots)} chatbots...")
 
         now = datetime.now(timezone.utc)
+        # daily_stats counters for the rows below, written in the same commit
+        rollup = RollupDelta()
         
         for bot in bots:
             print(f"Seeding {bot.name} ({bot.id})...")
@@ -37,6 +40,7 @@ def seed_data():
                         created_at=visit_time
                     )
                     db.add(visit)
+                    rollup.add(bot.id, visit_time, "visits")
                 
                 # Random conversations and usage
                 conv_count = random.randint(2, 10)
@@ -50,6 +54,7 @@ def seed_data():
                         created_at=conv_time + timedelta(minutes=10) # closed later
                     )
                     db.add(usage)
+                    rollup.add(bot.id, usage.created_at, "usage")
 
                     conv = Conversation(
                         chatbot_id=bot.id,
@@ -60,6 +65,7 @@ def seed_data():
                     )
                     db.add(conv)
                     db.flush()
+                    rollup.add(bot.id, conv_time, "conversations")
 
                     msg_count = random.randint(2, 4)
                     for j in range(msg_count):
@@ -71,7 +77,12 @@ def seed_data():
                             created_at=msg_time
                         )
                         db.add(msg)
+                        rollup.add(bot.id, msg_time, "messages")
+                    conv.message_count = msg_count
+                    conv.last_message_preview = msg.content
+                    conv.last_message_at = msg_time
 
+        rollup.apply_sync(db)
         db.commit()
         print("Successfully seeded analytics data for all bots for the last 7 days.")
 